@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartment', '0002_auto_20210629_1431'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apartment',
+            name='charge',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='powersupply',
+            name='billed_counter',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0006_meter_readings'),
+        ('apartment', '0003_billing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyConsumption',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('index_counter', models.IntegerField()),
+                ('consumption', models.IntegerField(default=0)),
+                ('apartment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apartment.apartment')),
+                ('supply', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apartment.powersupply')),
+                ('utility', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='building.utility')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MeterReading',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('index_counter', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('supply', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apartment.powersupply')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='monthlyconsumption',
+            index=models.Index(fields=['apartment', 'period'], name='apartment_m_apartme_37bbc0_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyconsumption',
+            constraint=models.UniqueConstraint(fields=('supply', 'period'), name='unique_supply_period'),
+        ),
+        migrations.AddIndex(
+            model_name='meterreading',
+            index=models.Index(fields=['supply', 'period'], name='apartment_m_supply__999e0e_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apartment', '0004_meter_readings'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='apartment',
+            constraint=models.UniqueConstraint(fields=('building', 'number_id'), name='unique_building_apartment_number'),
+        ),
+        migrations.AddConstraint(
+            model_name='mutualutility',
+            constraint=models.UniqueConstraint(fields=('apartment', 'utility'), name='unique_apartment_mutual_utility'),
+        ),
+        migrations.AddConstraint(
+            model_name='powersupply',
+            constraint=models.UniqueConstraint(fields=('apartment', 'utility'), name='unique_apartment_power_supply'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apartment', '0005_lookup_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApartmentSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('apartment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='apartment.apartment')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
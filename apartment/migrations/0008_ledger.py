@@ -0,0 +1,89 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:20
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_ledgers(apps, schema_editor):
+    """
+    Carries the debt of every apartment over to its ledger as an opening adjustment.
+    """
+    Apartment = apps.get_model('apartment', 'Apartment')
+    LedgerEntry = apps.get_model('apartment', 'LedgerEntry')
+
+    opened = []
+    for apartment_id, debt in Apartment.objects.exclude(debt=0).values_list('id', 'debt').iterator():
+        balance = Decimal(str(debt)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        opened.append(LedgerEntry(
+            apartment_id=apartment_id, kind='adjustment', amount=balance, balance=balance, note='Opening balance',
+        ))
+    LedgerEntry.objects.bulk_create(opened, batch_size=500)
+    Apartment.objects.bulk_update(
+        [Apartment(id=entry.apartment_id, balance=entry.balance) for entry in opened], ['balance'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('apartment', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('charge', 'Charge'), ('payment', 'Payment'), ('adjustment', 'Adjustment')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('period', models.DateField(blank=True, null=True)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='apartment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='apartment.apartment'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='apartment',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='apartment',
+            name='charge',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='debt',
+        ),
+        migrations.RemoveField(
+            model_name='apartment',
+            name='payment_status',
+        ),
+        migrations.AddIndex(
+            model_name='apartment',
+            index=models.Index(fields=['building', '-balance', 'id'], name='apartment_building_balance'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['apartment', 'id'], name='apartment_l_apartme_a8ca12_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(kind='charge'), fields=('apartment', 'period'), name='unique_apartment_charge'),
+        ),
+    ]
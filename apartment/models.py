@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from building.models import CustomUser, Building, Utility
 
@@ -32,15 +33,44 @@ class Apartment(models.Model):
     tenant          = models.OneToOneField(Tenant, null=True, blank=True, on_delete=models.SET_NULL)
     surface_area    = models.IntegerField(blank=True, null=True)
     num_of_persons  = models.PositiveIntegerField(default=0)
-    payment_status  = models.BooleanField(default=True, null=True, choices=PAYMENT_STATUS)
-    debt            = models.FloatField(default=0)
+
+    # sum of the apartment's ledger entries, written only by building.ledger (positive: owed)
+    balance         = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    # amount billed for the last month by the billing engine
+    charge          = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     # define a second type of id - to avoid collision with db id if multiple buildings are created
     number_id       = models.IntegerField()
+    updated_at      = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # also serves the (building, number_id) lookups
+            models.UniqueConstraint(fields=['building', 'number_id'], name='unique_building_apartment_number'),
+        ]
+        indexes = [
+            # the payments page lists the apartments of a building by balance, largest debt first
+            models.Index(fields=['building', '-balance', 'id'], name='apartment_building_balance'),
+        ]
 
     def __str__(self):
         return f"<Apartment {self.number_id}[{self.building}]>"
 
+    @property
+    def debt(self):
+        """
+        Amount the apartment owes: its balance, unless it paid in advance.
+        """
+        return max(self.balance, Decimal('0.00'))
+
+    @property
+    def payment_status(self):
+        return self.balance <= 0
+
+    def get_payment_status_display(self):
+        return dict(self.PAYMENT_STATUS)[self.payment_status]
+
 
 class MutualUtility(models.Model):
     """
@@ -50,6 +80,11 @@ class MutualUtility(models.Model):
     apartment   = models.ForeignKey(Apartment, null=True, on_delete=models.CASCADE)
     utility     = models.ForeignKey(Utility, null=True, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['apartment', 'utility'], name='unique_apartment_mutual_utility'),
+        ]
+
 
 class PowerSupply(models.Model):
     """
@@ -65,7 +100,127 @@ class PowerSupply(models.Model):
     apartment       = models.ForeignKey(Apartment, null=True, on_delete=models.CASCADE)
     utility         = models.ForeignKey(Utility, null=True, on_delete=models.CASCADE)
     index_counter   = models.IntegerField(default=0, null=True)
+
+    # index of the counter at the last billing run
+    billed_counter  = models.IntegerField(default=0)
     status          = models.BooleanField(default=False, null=True, blank=True, choices=STATUS)
+    updated_at      = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['apartment', 'utility'], name='unique_apartment_power_supply'),
+        ]
 
     def __str__(self):
-        return f"<{self.utility.name}[Apartment {self.apartment.number_id}]>"
\ No newline at end of file
+        return f"<{self.utility.name}[Apartment {self.apartment.number_id}]>"
+
+
+class MeterReading(models.Model):
+    """
+    Append-only history of the readings of an apartment's counter (power supply).
+    A period can hold several readings (e.g. corrections); the latest one is the valid reading.
+    """
+
+    supply          = models.ForeignKey(PowerSupply, on_delete=models.CASCADE)
+    period          = models.DateField()
+    index_counter   = models.IntegerField()
+    created_at      = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['supply', 'period']),
+        ]
+
+    def __str__(self):
+        return f"<Reading {self.index_counter}[{self.supply_id}, {self.period}]>"
+
+
+class MonthlyConsumption(models.Model):
+    """
+    Monthly rollup of the meter readings: the index an apartment's counter had at the end of the period
+    and the consumption since the previous period. Range queries over an apartment's history read
+    this table instead of scanning the raw readings.
+    """
+
+    supply          = models.ForeignKey(PowerSupply, on_delete=models.CASCADE)
+    apartment       = models.ForeignKey(Apartment, on_delete=models.CASCADE)
+    utility         = models.ForeignKey(Utility, on_delete=models.CASCADE)
+    period          = models.DateField()
+    index_counter   = models.IntegerField()
+    consumption     = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['supply', 'period'], name='unique_supply_period'),
+        ]
+        indexes = [
+            models.Index(fields=['apartment', 'period']),
+        ]
+
+    def __str__(self):
+        return f"<Consumption {self.consumption}[{self.supply_id}, {self.period}]>"
+
+
+class ApartmentSnapshot(models.Model):
+    """
+    Read-optimized copy of everything the tenant dashboard shows about an apartment: the apartment,
+    its building, its tenant, its power supplies and their latest readings, stored as one JSON document.
+    The row is refreshed by the signals in `building.signals` and by the bulk operations, so a tenant
+    page costs a single lookup by user.
+    """
+
+    apartment   = models.OneToOneField(Apartment, on_delete=models.CASCADE, related_name='snapshot')
+    user        = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL)
+    data        = models.JSONField(default=dict)
+    updated_at  = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"<Snapshot {self.apartment_id}>"
+
+
+class LedgerEntry(models.Model):
+    """
+    Entry of the payments ledger of an apartment: the charge billed for a month, a payment
+    (negative amount) or a manual adjustment. The ledger is append-only, a wrong entry is
+    corrected by a new one. `balance` is the balance of the apartment right after the entry.
+    """
+
+    CHARGE      = 'charge'
+    PAYMENT     = 'payment'
+    ADJUSTMENT  = 'adjustment'
+
+    KINDS = (
+        (CHARGE, 'Charge'),
+        (PAYMENT, 'Payment'),
+        (ADJUSTMENT, 'Adjustment'),
+    )
+
+    apartment       = models.ForeignKey(Apartment, on_delete=models.CASCADE)
+    kind            = models.CharField(max_length=10, choices=KINDS)
+    amount          = models.DecimalField(max_digits=12, decimal_places=2)
+    balance         = models.DecimalField(max_digits=12, decimal_places=2)
+
+    # billed month of a charge
+    period          = models.DateField(null=True, blank=True)
+    note            = models.CharField(max_length=200, blank=True)
+    created_by      = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at      = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # a month is billed once
+            models.UniqueConstraint(
+                fields=['apartment', 'period'], condition=models.Q(kind='charge'), name='unique_apartment_charge',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['apartment', 'id']),
+        ]
+
+    def __str__(self):
+        return f"<{self.get_kind_display()} {self.amount}[{self.apartment_id}]>"
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Ledger entries cannot be changed, post a correcting entry instead.")
+        super().save(*args, **kwargs)
@@ -1,3 +1,95 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from building.billing import bill_buildings
+from building.models import CustomUser, Building, Utility
+from apartment.models import Tenant, ApartmentSnapshot, PowerSupply
 
-# Create your tests here.
+
+def create_tenant_apartment(number_id=2):
+    admin = CustomUser.objects.create_user(username='admin', password='secret-pass-123')
+    building = Building.objects.create(
+        admin=admin, street_name='Main', street_number=7, city='Timisoara', county='Timis',
+        postal_code='300720', apartments_capacity=2,
+    )
+    user = CustomUser.objects.create_user(username='tenant', password='secret-pass-123')
+    apartment = building.apartment_set.get(number_id=number_id)
+    apartment.tenant = Tenant.objects.create(user=user, first_name='Ana', email='ana@example.com')
+    apartment.num_of_persons = 2
+    apartment.save()
+    return apartment
+
+
+class TenantDashboardTests(TestCase):
+
+    def test_dashboard_shows_the_tenant_apartment(self):
+        apartment = create_tenant_apartment()
+        self.client.force_login(apartment.tenant.user)
+
+        response = self.client.get(reverse('apartment:apt_dashboard'))
+
+        self.assertEqual(response.context['apartment']['number_id'], 2)
+        self.assertEqual(len(response.context['supplies']), 4)
+        self.assertContains(response, 'Str. Main Nr. 7')
+        self.assertContains(response, 'ana@example.com')
+
+    def test_user_without_apartment(self):
+        user = CustomUser.objects.create_user(username='tenant', password='secret-pass-123')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('apartment:apt_dashboard'))
+        self.assertContains(response, 'No apartment is assigned')
+
+    def test_anonymous_user_is_redirected(self):
+        response = self.client.get(reverse('apartment:apt_dashboard'))
+        self.assertRedirects(response, reverse('building:login'))
+
+
+class ApartmentSnapshotTests(TestCase):
+
+    def snapshot(self, apartment):
+        return ApartmentSnapshot.objects.get(apartment=apartment).data
+
+    def test_dashboard_reads_a_single_row(self):
+        apartment = create_tenant_apartment()
+        self.client.force_login(apartment.tenant.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('apartment:apt_dashboard'))
+
+        # session, user and snapshot
+        self.assertEqual(len(queries), 3)
+
+    def test_snapshot_follows_the_supplies(self):
+        apartment = create_tenant_apartment()
+        supply = apartment.powersupply_set.get(utility__name='Gas Power')
+        supply.status, supply.index_counter = True, 42
+        supply.save()
+
+        gas = [item for item in self.snapshot(apartment)['supplies'] if item['utility'] == 'Gas Power'][0]
+        self.assertEqual((gas['status'], gas['index_counter']), (True, 42))
+        self.assertEqual(gas['readings'][0]['index_counter'], 42)
+
+    def test_snapshot_follows_the_bulk_billing(self):
+        apartment = create_tenant_apartment()
+        Utility.objects.create(name='Cleaning', util_type='Mutual', tax_or_wage=30, building=apartment.building)
+
+        bill_buildings([apartment.building_id])
+
+        self.assertEqual((self.snapshot(apartment)['charge'], self.snapshot(apartment)['debt']), ('15.00', '15.00'))
+
+    def test_snapshot_follows_the_tenant(self):
+        apartment = create_tenant_apartment()
+        user = apartment.tenant.user
+        Tenant.objects.filter(id=apartment.tenant_id).first().delete()
+
+        snapshot = ApartmentSnapshot.objects.get(apartment=apartment)
+        self.assertIsNone(snapshot.user_id)
+        self.assertIsNone(snapshot.data['tenant'])
+        self.assertIsNone(ApartmentSnapshot.objects.filter(user=user).first())
+
+    def test_building_can_be_deleted(self):
+        apartment = create_tenant_apartment()
+        apartment.building.delete()
+        self.assertFalse(ApartmentSnapshot.objects.exists())
@@ -1,9 +1,47 @@
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from building.documents import accessible_documents
+from building.snapshots import tenant_snapshot
 
 
-def TenantDashboardPage(request):
-    return render(request, 'apartment/menu/tenant_dashboard.html')
+def get_user_id(request):
+    """
+    Returns the id of the logged user, or None. Loading the user reads the session from the database,
+    so async views call it through `sync_to_async`.
+    """
+    return request.user.pk
+
+
+async def TenantDashboardPage(request):
+    """
+    Defined view that renders the apartment of the logged tenant, its building, its power supplies
+    and their latest readings, all read from the apartment's snapshot with a single lookup.
+    """
+
+    user_id = await sync_to_async(get_user_id)(request)
+    if user_id is None:
+        return redirect('building:login')
+
+    snapshot = await sync_to_async(tenant_snapshot)(user_id)
+
+    context = {
+        'apartment': snapshot,
+        'building': snapshot['building'] if snapshot else None,
+        'tenant': snapshot['tenant'] if snapshot else None,
+        'supplies': snapshot['supplies'] if snapshot else [],
+    }
+
+    return await sync_to_async(render)(request, 'apartment/menu/tenant_dashboard.html', context)
 
 
 def TenantDocumentsPage(request):
-    return render(request, 'apartment/menu/tenant_documents.html')
\ No newline at end of file
+    """
+    Defined view that lists the documents of the logged tenant's apartment and the ones shared
+    with the whole building.
+    """
+
+    if not request.user.is_authenticated:
+        return redirect('building:login')
+
+    documents = accessible_documents(request.user).select_related('apartment', 'file').order_by('-id')
+    return render(request, 'apartment/menu/tenant_documents.html', {'documents': documents})
@@ -1,8 +1,30 @@
 from django.contrib import admin
 from .models import *
+from .provisioning import provision_buildings
+
+
+@admin.register(Building)
+class BuildingAdmin(admin.ModelAdmin):
+    actions = ['provision']
+
+    def provision(self, request, queryset):
+        """
+        Creates the apartments, utilities and counters missing from the selected buildings.
+        """
+        provision_buildings(queryset)
+        self.message_user(request, f"Provisioned {len(queryset)} building(s).")
+
+    provision.short_description = "Provision missing apartments & utilities"
 
 
 admin.site.register(CustomUser)
-admin.site.register(Building)
 admin.site.register(Utility)
-admin.site.register(MainUtil)
\ No newline at end of file
+admin.site.register(MainUtil)
+admin.site.register(BuildingStats)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'building', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('result', 'error', 'attempts', 'worker', 'started_at', 'finished_at')
@@ -0,0 +1,367 @@
+"""
+Building blocks of the JSON API.
+
+Every exposed model is described by an `ApiResource`: the fields a client may read (`?fields=`
+selects a subset, loaded with `.only()`), the fields it may write and the unique ordering used
+for keyset pagination. Pages are read with `WHERE (ordering) > (cursor) ORDER BY ordering LIMIT n`,
+so the cost of a page does not grow with its position in the result set, unlike OFFSET pagination.
+
+The ETag of a response is derived from the version of the cached tables of the buildings it covers
+(see `building.cache`), which every write bumps, so unchanged data is answered with a 304 without
+querying it.
+"""
+
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from building.cache import get_tables_version, touch_buildings
+from building.imports import IMPORT_CHUNK_SIZE, apply_chunk
+from building.models import Building, Utility, MainUtil
+from building.readings import record_main_readings
+from building.snapshots import refresh_buildings_snapshots
+from building.stats import refresh_buildings_stats
+from apartment.models import Apartment, LedgerEntry, PowerSupply
+
+
+# rows per page when the client does not ask for a limit, and the largest page it can ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# largest number of rows accepted by a bulk PATCH
+MAX_BULK_ITEMS = 5000
+
+
+class ApiError(Exception):
+    """
+    Raised by the API helpers for an invalid request, answered with a 400 response.
+    """
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors
+
+
+class ApiResource:
+    """
+    Describes how a model is exposed by the API.
+
+    fields:     dict of API field name -> model attribute (foreign keys are exposed as ids)
+    writable:   API fields a client may change with PATCH
+    ordering:   unique model fields used for the keyset pagination
+    scope:      lookup from the model to the building, limiting the rows to the user's buildings
+    derived:    dict of model property -> model field it is computed from
+    """
+
+    def __init__(self, name, model, fields, writable, ordering, scope, derived=None):
+        self.name       = name
+        self.model      = model
+        self.fields     = fields
+        self.writable   = writable
+        self.ordering   = ordering
+        self.scope      = scope
+        self.derived    = derived or {}
+
+    def queryset(self, building_ids):
+        return self.model.objects.filter(**{f'{self.scope}__in': building_ids})
+
+    def select_fields(self, requested):
+        """
+        Returns the API fields of a `?fields=` value (every field by default).
+        """
+
+        if not requested:
+            return list(self.fields)
+
+        selected = [field.strip() for field in requested.split(',') if field.strip()]
+        unknown = [field for field in selected if field not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown fields: {', '.join(unknown)}.")
+        return selected
+
+    def only(self, queryset, selected):
+        """
+        Restricts the loaded columns to the selected fields and the ones needed for pagination.
+        """
+        attributes = (self.fields[field] for field in selected)
+        return queryset.only(*{self.derived.get(attribute, attribute) for attribute in attributes}, *self.ordering)
+
+    def serialize(self, instance, selected):
+        return {field: getattr(instance, self.fields[field]) for field in selected}
+
+
+BUILDINGS = ApiResource(
+    'buildings', Building,
+    fields={
+        'id': 'id', 'street_name': 'street_name', 'street_number': 'street_number', 'city': 'city',
+        'county': 'county', 'postal_code': 'postal_code', 'apartments_capacity': 'apartments_capacity',
+        'has_elevator': 'has_elevator', 'billed_period': 'billed_period',
+    },
+    writable=('street_name', 'street_number', 'city', 'county', 'postal_code', 'has_elevator'),
+    ordering=('id', ),
+    scope='id',
+)
+
+APARTMENTS = ApiResource(
+    'apartments', Apartment,
+    fields={
+        'id': 'id', 'building': 'building_id', 'number_id': 'number_id', 'tenant': 'tenant_id',
+        'surface_area': 'surface_area', 'num_of_persons': 'num_of_persons', 'payment_status': 'payment_status',
+        'debt': 'debt', 'balance': 'balance', 'charge': 'charge',
+    },
+    # the balance only changes through the ledger (payments are posted to /payments/)
+    writable=('surface_area', 'num_of_persons'),
+    ordering=('building_id', 'number_id'),
+    scope='building_id',
+    derived={'payment_status': 'balance', 'debt': 'balance'},
+)
+
+LEDGER = ApiResource(
+    'ledger', LedgerEntry,
+    fields={
+        'id': 'id', 'apartment': 'apartment_id', 'kind': 'kind', 'amount': 'amount', 'balance': 'balance',
+        'period': 'period', 'note': 'note', 'created_at': 'created_at',
+    },
+    writable=(),
+    ordering=('apartment_id', 'id'),
+    scope='apartment__building_id',
+)
+
+UTILITIES = ApiResource(
+    'utilities', Utility,
+    fields={
+        'id': 'id', 'building': 'building_id', 'name': 'name', 'util_type': 'util_type', 'provider': 'provider',
+        'contract_starts': 'contract_starts', 'contract_ends': 'contract_ends', 'tax_or_wage': 'tax_or_wage',
+        'tax_type': 'tax_type',
+    },
+    writable=('name', 'provider', 'contract_starts', 'contract_ends', 'tax_or_wage', 'tax_type'),
+    ordering=('building_id', 'id'),
+    scope='building_id',
+)
+
+SUPPLIES = ApiResource(
+    'supplies', PowerSupply,
+    fields={
+        'id': 'id', 'apartment': 'apartment_id', 'utility': 'utility_id', 'index_counter': 'index_counter',
+        'billed_counter': 'billed_counter', 'status': 'status',
+    },
+    writable=('index_counter', 'status'),
+    ordering=('apartment_id', 'utility_id'),
+    scope='apartment__building_id',
+)
+
+MAIN_COUNTERS = ApiResource(
+    'main-counters', MainUtil,
+    fields={
+        'id': 'id', 'utility': 'util_id', 'index_counter': 'index_counter', 'billed_counter': 'billed_counter',
+    },
+    writable=('index_counter', ),
+    ordering=('util_id', ),
+    scope='util__building_id',
+)
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    """
+    Returns the ordering values stored in a cursor.
+    """
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise ApiError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != size:
+        raise ApiError("Invalid cursor.")
+    return values
+
+
+def cursor_values(resource, cursor):
+    """
+    Returns the ordering values of a resource's cursor, checked against the types of their fields,
+    since a client can send any cursor.
+    """
+
+    values = decode_cursor(cursor, len(resource.ordering))
+    try:
+        values = [
+            resource.model._meta.get_field(field).to_python(value) for field, value in zip(resource.ordering, values)
+        ]
+    except ValidationError:
+        raise ApiError("Invalid cursor.")
+    if None in values:
+        raise ApiError("Invalid cursor.")
+    return values
+
+
+def after_cursor(ordering, values):
+    """
+    Returns the condition selecting the rows that come after the given ordering values:
+    (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    """
+
+    condition = Q()
+    for position, field in enumerate(ordering):
+        equal = {previous: values[index] for index, previous in enumerate(ordering[:position])}
+        condition |= Q(**equal, **{f'{field}__gt': values[position]})
+    return condition
+
+
+def page_size(limit):
+    if not limit:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ApiError("The limit must be a number.")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate(resource, queryset, cursor, limit):
+    """
+    Returns one page of the queryset, in the resource's ordering, and the cursor of the next page
+    (None on the last page).
+    """
+
+    queryset = queryset.order_by(*resource.ordering)
+    if cursor:
+        queryset = queryset.filter(after_cursor(resource.ordering, cursor_values(resource, cursor)))
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], field) for field in resource.ordering)
+
+
+def etag_for(request, building_ids):
+    """
+    Returns the ETag of a GET request over the given buildings: it changes whenever one of the
+    buildings changes (or the request itself does).
+    """
+    versions = [get_tables_version(building_id) for building_id in sorted(building_ids)]
+    digest = hashlib.sha1(f"{request.user.pk}|{request.get_full_path()}|{versions}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def parse_period(period):
+    """
+    Returns the month of a 'YYYY-MM' value, or None (the current month) when it is empty.
+    """
+    if not period:
+        return None
+    try:
+        return datetime.datetime.strptime(str(period), '%Y-%m').date()
+    except ValueError:
+        raise ApiError("The period must be given as YYYY-MM.")
+
+
+def is_integer(value):
+    # JSON true / false are parsed as bools, which Python counts as the integers 1 / 0
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_items(items, current, fields):
+    """
+    Validates the items of a bulk PATCH against the current index of every row in scope.
+    Returns the list of (id, item); raises an `ApiError` listing every invalid item.
+    """
+
+    if not isinstance(items, list) or not items:
+        raise ApiError("Expected a non-empty list of items.")
+    if len(items) > MAX_BULK_ITEMS:
+        raise ApiError(f"At most {MAX_BULK_ITEMS} items can be sent at once.")
+
+    valid, errors = [], []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not is_integer(item.get('id')) or item['id'] not in current:
+            errors.append({'item': position, 'error': "Unknown id."})
+            continue
+
+        unknown = set(item) - {'id', *fields}
+        index = item.get('index_counter')
+        status = item.get('status')
+        if unknown:
+            errors.append({'item': position, 'error': f"Unknown fields: {', '.join(sorted(unknown))}."})
+        elif index is not None and (not is_integer(index) or index < (current[item['id']] or 0)):
+            errors.append({'item': position, 'error': "The index must be a number, not lower than the current index."})
+        elif status is not None and not isinstance(status, bool):
+            errors.append({'item': position, 'error': "The status must be true or false."})
+        else:
+            valid.append((item['id'], item))
+
+    if errors:
+        raise ApiError("Invalid items.", errors)
+    return valid
+
+
+@transaction.atomic
+def bulk_update_supplies(building_ids, items, period=None):
+    """
+    Applies new indexes and statuses to power supplies of the given buildings, recording the
+    indexes in the readings history. Returns the number of updated supplies.
+    """
+
+    ids = [item.get('id') for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+    supplies = {
+        supply_id: (index, building_id) for supply_id, index, building_id in PowerSupply.objects.filter(
+            apartment__building_id__in=building_ids, id__in=ids
+        ).values_list('id', 'index_counter', 'apartment__building_id')
+    }
+    valid = validate_items(items, {supply_id: index for supply_id, (index, _) in supplies.items()},
+                           ('index_counter', 'status'))
+
+    for start in range(0, len(valid), IMPORT_CHUNK_SIZE):
+        chunk = valid[start:start + IMPORT_CHUNK_SIZE]
+        apply_chunk(
+            {supply_id: item['index_counter'] for supply_id, item in chunk if item.get('index_counter') is not None},
+            {supply_id: item['status'] for supply_id, item in chunk if item.get('status') is not None},
+            period,
+        )
+
+    # bulk updates bypass the signals that maintain the snapshots and invalidate the cached tables
+    updated = {supplies[supply_id][1] for supply_id, _ in valid}
+    refresh_buildings_snapshots(updated)
+    touch_buildings(*updated)
+    return len(valid)
+
+
+@transaction.atomic
+def bulk_update_main_counters(building_ids, items, period=None):
+    """
+    Applies new indexes to main counters of the given buildings, recording them in the readings
+    history. Returns the number of updated counters.
+    """
+
+    ids = [item.get('id') for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+    counters = {
+        counter_id: (index, building_id) for counter_id, index, building_id in MainUtil.objects.filter(
+            util__building_id__in=building_ids, id__in=ids
+        ).values_list('id', 'index_counter', 'util__building_id')
+    }
+    valid = validate_items(items, {counter_id: index for counter_id, (index, _) in counters.items()},
+                           ('index_counter', ))
+    readings = [(counter_id, item['index_counter']) for counter_id, item in valid if item.get('index_counter') is not None]
+
+    # bulk updates do not set the auto_now timestamps
+    now = timezone.now()
+    MainUtil.objects.bulk_update(
+        [MainUtil(id=counter_id, index_counter=index, updated_at=now) for counter_id, index in readings],
+        ['index_counter', 'updated_at'], batch_size=IMPORT_CHUNK_SIZE,
+    )
+    record_main_readings(readings, period)
+
+    # bulk updates bypass the signals that maintain the stats rows and invalidate the cached tables
+    updated = {counters[counter_id][1] for counter_id, _ in valid}
+    refresh_buildings_stats(updated)
+    touch_buildings(*updated)
+    return len(valid)
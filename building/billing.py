@@ -0,0 +1,163 @@
+"""
+Monthly billing engine.
+
+Charges are computed for whole batches of buildings at once: every table involved is read with a
+single `values_list` query per batch, the charges are computed in memory column by column and the
+results are written back with `bulk_update`. No query is issued per apartment. The charge of every
+apartment is posted to its ledger (see `building.ledger`), which updates its balance.
+
+For each building the monthly charge of an apartment is made of:
+    * individual utilities: the consumption of the apartment's counter since the last billing,
+      multiplied by the utility's tax, plus a share of the common loss (main counter consumption
+      minus the consumption of all apartment counters);
+    * mutual utilities: a share of the utility's monthly wage.
+Shares are split by the number of persons (tax type 'Per Person') or equally between apartments.
+Charges are computed in Decimal and rounded so they add up to the building's total, to the cent.
+"""
+
+from collections import defaultdict
+from decimal import Decimal, ROUND_DOWN
+from django.db import transaction
+from django.utils import timezone
+from building.cache import forget_admin_buildings, touch_buildings
+from building.ledger import CENT, ZERO, post_entries, to_amount
+from building.models import Building, Utility, MainUtil
+from building.periods import billing_period
+from building.snapshots import refresh_buildings_snapshots
+from building.stats import refresh_buildings_stats
+from apartment.models import Apartment, LedgerEntry, PowerSupply
+
+
+# number of rows written by a single UPDATE statement
+UPDATE_BATCH_SIZE = 500
+
+
+def split_shares(amount, persons, per_person):
+    """
+    Splits an amount between apartments, by number of persons or equally.
+    Falls back to an equal split when nobody lives in the building.
+    """
+    weights = persons if per_person and sum(persons) else [1] * len(persons)
+    total = sum(weights)
+    return [amount * weight / total for weight in weights] if total else []
+
+
+def compute_building_charges(apartments, utilities, supplies, main_counters):
+    """
+    Computes the monthly charge of every apartment of one building.
+
+    apartments:     list of (apartment id, number of persons)
+    utilities:      list of (utility id, util type, tax or wage, tax type)
+    supplies:       dict of utility id -> dict of apartment id -> counter consumption
+    main_counters:  dict of utility id -> main counter consumption
+
+    Returns the list of charges (Decimal amounts), in the order of `apartments`.
+    """
+
+    positions   = {apartment_id: position for position, (apartment_id, _) in enumerate(apartments)}
+    persons     = [num_of_persons for _, num_of_persons in apartments]
+    charges     = [ZERO] * len(apartments)
+
+    for util_id, util_type, tax, per_person in utilities:
+        # taxes are stored as floats, their decimal representation is the intended value
+        tax = Decimal(str(tax or 0))
+        if not tax:
+            continue
+
+        if util_type == 'Individual':
+            consumption = supplies.get(util_id, {})
+            for apartment_id, used in consumption.items():
+                charges[positions[apartment_id]] += used * tax
+
+            # what the main counter measured and no apartment counter did
+            loss = main_counters.get(util_id, 0) - sum(consumption.values())
+            amount = max(loss, 0) * tax
+        else:
+            amount = tax
+
+        for position, share in enumerate(split_shares(amount, persons, per_person)):
+            charges[position] += share
+
+    # charges are rounded down to the cent and the cents left over from the building's total go to the
+    # apartment with the largest charge, so the charges add up to the total
+    rounded = [charge.quantize(CENT, rounding=ROUND_DOWN) for charge in charges]
+    if rounded:
+        largest = max(range(len(charges)), key=charges.__getitem__)
+        rounded[largest] += to_amount(sum(charges)) - sum(rounded)
+    return rounded
+
+
+@transaction.atomic
+def bill_buildings(building_ids, period=None):
+    """
+    Bills the given buildings for a month and returns the number of billed apartments.
+    Buildings already billed for that month are skipped, so a run can safely be repeated.
+    """
+
+    period = billing_period(period)
+    admins = dict(Building.objects.filter(id__in=building_ids).exclude(
+        billed_period__gte=period
+    ).values_list('id', 'admin_id'))
+    building_ids = list(admins)
+
+    if not building_ids:
+        return 0
+
+    utilities = defaultdict(list)
+    for util_id, building_id, util_type, tax, per_person in Utility.objects.filter(
+        building_id__in=building_ids
+    ).values_list('id', 'building_id', 'util_type', 'tax_or_wage', 'tax_type'):
+        utilities[building_id].append((util_id, util_type, tax, per_person))
+
+    apartments = defaultdict(list)
+    for apartment_id, building_id, num_of_persons in Apartment.objects.filter(
+        building_id__in=building_ids
+    ).order_by('id').values_list('id', 'building_id', 'num_of_persons'):
+        apartments[building_id].append((apartment_id, num_of_persons))
+
+    # consumption of every counter since the last billing run
+    supplies, supply_indexes = defaultdict(lambda: defaultdict(dict)), []
+    for supply_id, building_id, apartment_id, util_id, index, billed in PowerSupply.objects.filter(
+        apartment__building_id__in=building_ids
+    ).values_list('id', 'apartment__building_id', 'apartment_id', 'utility_id', 'index_counter', 'billed_counter'):
+        index = index or 0
+        supplies[building_id][util_id][apartment_id] = max(index - billed, 0)
+        supply_indexes.append(PowerSupply(id=supply_id, billed_counter=index))
+
+    main_counters, main_indexes = defaultdict(dict), []
+    for counter_id, building_id, util_id, index, billed in MainUtil.objects.filter(
+        util__building_id__in=building_ids
+    ).values_list('id', 'util__building_id', 'util_id', 'index_counter', 'billed_counter'):
+        index = index or 0
+        main_counters[building_id][util_id] = max(index - billed, 0)
+        main_indexes.append(MainUtil(id=counter_id, billed_counter=index))
+
+    billed, entries = [], []
+    for building_id in building_ids:
+        building_apartments = apartments[building_id]
+        charges = compute_building_charges(
+            building_apartments, utilities[building_id], supplies[building_id], main_counters[building_id]
+        )
+        for (apartment_id, _), charge in zip(building_apartments, charges):
+            charge = to_amount(charge)
+            billed.append(Apartment(id=apartment_id, charge=charge))
+            entries.append(LedgerEntry(apartment_id=apartment_id, kind=LedgerEntry.CHARGE, amount=charge, period=period))
+
+    # bulk updates do not set the auto_now timestamps
+    now = timezone.now()
+    for row in (*billed, *supply_indexes, *main_indexes):
+        row.updated_at = now
+
+    Apartment.objects.bulk_update(billed, ['charge', 'updated_at'], batch_size=UPDATE_BATCH_SIZE)
+    post_entries(entries)
+    PowerSupply.objects.bulk_update(supply_indexes, ['billed_counter', 'updated_at'], batch_size=UPDATE_BATCH_SIZE)
+    MainUtil.objects.bulk_update(main_indexes, ['billed_counter', 'updated_at'], batch_size=UPDATE_BATCH_SIZE)
+    Building.objects.filter(id__in=building_ids).update(billed_period=period, updated_at=now)
+
+    # bulk updates bypass the signals that maintain the stats rows, the snapshots, the cached tables
+    # and the cached buildings of the admins (holding the billed period)
+    refresh_buildings_stats(building_ids)
+    refresh_buildings_snapshots(building_ids)
+    touch_buildings(*building_ids)
+    forget_admin_buildings(*set(admins.values()))
+    return len(billed)
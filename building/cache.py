@@ -0,0 +1,159 @@
+import time
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+from building.models import Building, Utility, MainUtil
+from apartment.models import Apartment, PowerSupply
+
+
+# how long the buildings of an admin are kept between requests
+BUILDING_CACHE_TIMEOUT = 60 * 15
+
+
+def admin_buildings_key(user_id):
+    return f'building:admin:{user_id}:buildings'
+
+
+def get_admin_buildings(user):
+    """
+    Returns the buildings administrated by the given user, oldest first.
+    The list is cached by user id across requests and invalidated by the building signals.
+    """
+
+    if not user.is_authenticated:
+        return []
+
+    key = admin_buildings_key(user.pk)
+    buildings = cache.get(key)
+    if buildings is None:
+        buildings = list(Building.objects.filter(admin_id=user.pk).order_by('id'))
+        cache.set(key, buildings, BUILDING_CACHE_TIMEOUT)
+    return buildings
+
+
+def get_admin_building(user, building_id=None):
+    """
+    Returns the building of the given user with the given id, or his first building when the id
+    is missing or belongs to another admin. Returns None for users without buildings.
+    """
+
+    buildings = get_admin_buildings(user)
+    selected = next((building for building in buildings if building.id == building_id), None)
+    return selected or next(iter(buildings), None)
+
+
+def forget_admin_buildings(*user_ids):
+    """
+    Drops the cached buildings of the given admins.
+    """
+    cache.delete_many([admin_buildings_key(user_id) for user_id in user_ids if user_id is not None])
+
+
+# how long a rendered table fragment is kept; versioned keys make older fragments unreachable anyway
+TABLES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def tables_version_key(building_id):
+    return f'building:{building_id}:tables-version'
+
+
+def get_tables_version(building_id):
+    """
+    Returns the current version of the building's cached tables. A missing version is recreated
+    from the clock, so fragments cached under an evicted version are never served again.
+    """
+
+    key = tables_version_key(building_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def touch_buildings(*building_ids):
+    """
+    Invalidates the cached tables of the given buildings and records them as modified now.
+    Called from the model signals and by bulk operations that bypass them.
+    """
+
+    building_ids = [building_id for building_id in building_ids if building_id is not None]
+    cache.delete_many([tables_version_key(building_id) for building_id in building_ids])
+    now = timezone.now()
+    cache.set_many({last_modified_key(building_id): now for building_id in building_ids}, None)
+
+
+# rows shown on the admin pages and the lookup from each of them to its building
+LAST_MODIFIED_SOURCES = (
+    (Apartment, 'building_id'),
+    (Utility, 'building_id'),
+    (PowerSupply, 'apartment__building_id'),
+    (MainUtil, 'util__building_id'),
+)
+
+
+def last_modified_key(building_id):
+    return f'building:{building_id}:last-modified'
+
+
+def building_last_modified(building_id):
+    """
+    Returns the latest `updated_at` of the building and of its rows shown on the admin pages,
+    read with a single query (one aggregate subquery per table).
+    """
+
+    latest = [
+        Subquery(model.objects.filter(**{lookup: OuterRef('id')}).values(lookup).annotate(
+            last=Max('updated_at')
+        ).values('last'))
+        for model, lookup in LAST_MODIFIED_SOURCES
+    ]
+    timestamps = Building.objects.filter(id=building_id).values_list('updated_at', *latest).first() or ()
+    return max(filter(None, timestamps), default=timezone.now())
+
+
+def get_last_modified(building_id):
+    """
+    Returns when the building or one of its rows last changed. The time is kept in the cache by
+    `touch_buildings` (which also covers deleted rows); a missing one is recomputed from the
+    `updated_at` columns.
+    """
+
+    key = last_modified_key(building_id)
+    last_modified = cache.get(key)
+    if last_modified is None:
+        last_modified = building_last_modified(building_id)
+        cache.add(key, last_modified, None)
+        last_modified = cache.get(key, last_modified)
+    return last_modified
+
+
+def tables_cache_context(building):
+    """
+    Returns the template context used by the `{% cache %}` blocks of the building tables.
+    """
+    return {
+        'tables_version': get_tables_version(building.id),
+        'tables_cache_timeout': TABLES_CACHE_TIMEOUT,
+    }
+
+
+def tables_cached(fragment_name, building, context):
+    """
+    Tells whether a table fragment of the building is cached under the version of the given context,
+    so the views can skip loading the rows of a fragment that will not be rendered.
+    """
+    key = make_template_fragment_key(fragment_name, [building.id, context['tables_version']])
+    return key in cache
+
+
+def tables_cache_state(fragment_name, building):
+    """
+    Returns the template context of the building's cached tables and whether the given fragment is
+    cached under it. Async views call it with `sync_to_async`, so both cache lookups block a thread
+    instead of the event loop.
+    """
+    context = tables_cache_context(building)
+    return context, tables_cached(fragment_name, building, context)
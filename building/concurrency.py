@@ -0,0 +1,49 @@
+"""
+Helpers for the async views.
+
+The ORM of this Django version is synchronous only, so the async views run their queries
+through `sync_to_async`. Independent queries are run concurrently, each in a worker thread
+with its own database connection, and awaited together.
+"""
+
+import asyncio
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.db import connection, close_old_connections
+
+
+def run_loader(loader):
+    """
+    Runs a loader in a worker thread and releases the thread's connection afterwards
+    (unless persistent connections are enabled with CONN_MAX_AGE).
+    """
+    try:
+        return loader()
+    finally:
+        close_old_connections()
+
+
+def run_in_transaction(loaders):
+    """
+    Runs the loaders one after another when called inside a transaction and returns their results,
+    otherwise returns None. Other connections cannot see the uncommitted rows of the transaction
+    (ATOMIC_REQUESTS, tests), so its queries must stay on the request's connection.
+    """
+    if connection.in_atomic_block:
+        return [loader() for loader in loaders]
+    return None
+
+
+async def gather_queries(*loaders):
+    """
+    Runs the given loaders (blocking callables querying the database) concurrently
+    and returns their results, in order.
+    """
+
+    results = await sync_to_async(run_in_transaction)(loaders)
+    if results is not None:
+        return results
+
+    return await asyncio.gather(*(
+        sync_to_async(partial(run_loader, loader), thread_sensitive=False)() for loader in loaders
+    ))
@@ -0,0 +1,67 @@
+"""
+Conditional GET for the admin pages.
+
+A page is described by validators derived from its building: an ETag built from the version of
+the building's cached tables (bumped by every write, see `building.cache`) and the time the building
+last changed. A browser (or a reverse proxy revalidating on its behalf) that sends them back with
+If-None-Match / If-Modified-Since gets a 304 before the view runs its queries or renders its templates.
+
+Responses are marked `private, no-cache`: they are stored per user and revalidated on every visit.
+"""
+
+import hashlib
+from calendar import timegm
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from building.cache import get_admin_buildings, get_tables_version, get_last_modified
+from building.middleware import get_current_building
+
+
+def page_validators(request, building):
+    """
+    Returns the (ETag, Last-Modified timestamp) of an admin page of the given building.
+    The ETag also covers the user, the buildings listed by the building switcher and the CSRF cookie
+    the forms of the page were rendered with.
+    """
+
+    digest = hashlib.sha1('|'.join(map(str, (
+        request.user.pk,
+        request.get_full_path(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        building.id,
+        [managed.id for managed in get_admin_buildings(request.user)],
+        get_tables_version(building.id),
+    ))).encode()).hexdigest()
+    return f'"{digest}"', timegm(get_last_modified(building.id).utctimetuple())
+
+
+def conditional_page(view):
+    """
+    Decorates an async admin page so that unchanged pages are answered with a 304.
+    Requests without a building (or other than GET/HEAD) always run the view.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        building = None
+        if request.method in ('GET', 'HEAD'):
+            building = await sync_to_async(get_current_building)(request)
+        if building is None:
+            return await view(request, *args, **kwargs)
+
+        etag, last_modified = await sync_to_async(page_validators)(request, building)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie', ))
+        return response
+
+    return wrapper
@@ -0,0 +1,14 @@
+from functools import partial
+from building.cache import get_admin_buildings
+from building.middleware import get_current_building
+
+
+def buildings(request):
+    """
+    Adds the buildings of the logged user and the selected one, shown by the building switcher.
+    Both are resolved lazily, only by the templates that render the switcher.
+    """
+    return {
+        'managed_buildings': partial(get_admin_buildings, request.user),
+        'selected_building': partial(get_current_building, request),
+    }
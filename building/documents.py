@@ -0,0 +1,400 @@
+"""
+Storage of the building and apartment documents.
+
+The content of every file is stored once under DOCUMENTS_ROOT, named after its SHA-256 (`StoredFile`),
+and shared by all the documents holding the same bytes. Files are received either as a regular form
+upload or in chunks through an `UploadSession`, which lets a client resume an interrupted upload.
+Uploads, downloads and hashing go through fixed size buffers, so large files are never read
+into memory as a whole.
+
+Thumbnails of the PDF documents are rendered on first request with `pdftoppm` (poppler-utils) and
+kept next to the files; a placeholder is served when the tool is missing or fails.
+
+Abandoned uploads and the files no document holds any more are removed by the clean_documents command.
+"""
+
+import datetime
+import hashlib
+import mimetypes
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import suppress
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.html import escape
+from building.models import Document, StoredFile, UploadSession
+from apartment.models import Apartment
+
+
+# size of the buffers files are copied, hashed and served with
+BUFFER_SIZE = 64 * 1024
+
+# largest chunk accepted by one request of an upload session
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+# content types shown in the browser; the others are only downloaded, as opaque bytes, since a
+# document (e.g. HTML or SVG) would otherwise run its scripts on the site's origin
+INLINE_CONTENT_TYPES = ('application/pdf', 'image/png', 'image/jpeg')
+
+# width of the thumbnails, in pixels
+THUMBNAIL_WIDTH = 256
+
+# seconds given to pdftoppm to render a thumbnail
+THUMBNAIL_TIMEOUT = 20
+
+# seconds after which an unfinished upload, or a stored file no document holds, is removed
+ABANDONED_AFTER = 60 * 60 * 24
+
+# stored files deleted per query by the cleanup
+CLEANUP_BATCH_SIZE = 500
+
+PLACEHOLDER_THUMBNAIL = (
+    f'<svg xmlns="http://www.w3.org/2000/svg" width="{THUMBNAIL_WIDTH}" height="{THUMBNAIL_WIDTH * 4 // 3}">'
+    '<rect width="100%" height="100%" fill="#f1f3f5"/>'
+    '<text x="50%" y="50%" text-anchor="middle" font-family="sans-serif" font-size="32" fill="#868e96">{label}</text>'
+    '</svg>'
+)
+
+
+class UploadError(Exception):
+    """
+    Raised for an upload that cannot be accepted; `status` is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def documents_path(*parts):
+    return os.path.join(settings.DOCUMENTS_ROOT, *parts)
+
+
+def blob_path(sha256):
+    return os.path.join('blobs', sha256[:2], sha256)
+
+
+def guess_content_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 of a file, read one buffer at a time.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def store_file(temporary_path, name, sha256=None):
+    """
+    Moves a complete file into the store, unless the same content is stored already (the temporary
+    file is then deleted). Returns its `StoredFile`.
+    """
+
+    sha256 = sha256 or file_digest(temporary_path)
+    stored = StoredFile.objects.filter(sha256=sha256).first()
+    if stored is not None:
+        os.remove(temporary_path)
+        return stored
+
+    path = blob_path(sha256)
+    os.makedirs(os.path.dirname(documents_path(path)), exist_ok=True)
+    size = os.path.getsize(temporary_path)
+    os.replace(temporary_path, documents_path(path))
+    try:
+        # a concurrent upload of the same content may have stored it first, with the same path
+        with transaction.atomic():
+            return StoredFile.objects.create(sha256=sha256, size=size, content_type=guess_content_type(name), path=path)
+    except IntegrityError:
+        return StoredFile.objects.get(sha256=sha256)
+
+
+def store_upload(upload, name=None):
+    """
+    Stores a file received by a form (a Django `UploadedFile`), hashing it while it is copied.
+    """
+
+    os.makedirs(documents_path('uploads'), exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=documents_path('uploads'), delete=False) as target:
+        for chunk in upload.chunks(BUFFER_SIZE):
+            digest.update(chunk)
+            target.write(chunk)
+    return store_file(target.name, name or upload.name, digest.hexdigest())
+
+
+def create_document(building, stored, name, kind=Document.OTHER, apartment=None, period=None, user=None):
+    return Document.objects.create(
+        building=building, apartment=apartment, kind=kind, name=name, file=stored, period=period,
+        uploaded_by=user if user and user.is_authenticated else None,
+    )
+
+
+def upload_part_path(session):
+    return documents_path('uploads', f'{session.token}.part')
+
+
+def start_upload(building, name, size, kind=Document.OTHER, apartment=None, sha256='', user=None):
+    """
+    Opens an upload session. A file announced with the SHA-256 of content the user can already read
+    is not uploaded again: its document is created right away and returned instead of a session.
+    Content stored for other users is uploaded again, so knowing its SHA-256 does not give access to it.
+    """
+
+    if size <= 0:
+        raise UploadError("Empty files cannot be uploaded.")
+    if sha256 and user is not None:
+        stored = StoredFile.objects.filter(
+            sha256=sha256, size=size, document__in=accessible_documents(user)
+        ).first()
+        if stored is not None:
+            return create_document(building, stored, name, kind, apartment, user=user)
+
+    session = UploadSession.objects.create(
+        building=building, apartment=apartment, kind=kind, name=name, size=size, sha256=sha256,
+        uploaded_by=user if user and user.is_authenticated else None,
+    )
+    os.makedirs(documents_path('uploads'), exist_ok=True)
+    open(upload_part_path(session), 'wb').close()
+    return session
+
+
+def parse_content_range(header, size):
+    """
+    Returns the (first, last) bytes of a chunk described by a `Content-Range: bytes first-last/size` header.
+    """
+
+    try:
+        unit, _, rest = header.partition(' ')
+        span, _, total = rest.partition('/')
+        first, last = (int(value) for value in span.split('-'))
+        total = int(total)
+    except ValueError:
+        raise UploadError("Expected a 'Content-Range: bytes first-last/size' header.")
+    if unit != 'bytes' or total != size or not 0 <= first <= last < size:
+        raise UploadError("The Content-Range does not match the upload.")
+    if last - first + 1 > MAX_CHUNK_SIZE:
+        raise UploadError(f"Chunks are limited to {MAX_CHUNK_SIZE} bytes.", status=413)
+    return first, last
+
+
+def receive_chunk(session_id, content_range, stream):
+    """
+    Appends a chunk, read from the request stream, to the upload. The chunk must start where the
+    received bytes end (the client resumes from `received`). The last chunk completes the upload
+    and creates its document. Returns the session.
+    """
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(id=session_id)
+        if session.document_id:
+            raise UploadError("The upload is complete.", status=409)
+
+        first, last = parse_content_range(content_range, session.size)
+        if first != session.received:
+            raise UploadError(f"Expected the chunk starting at byte {session.received}.", status=409)
+
+        expected = last - first + 1
+        with open(upload_part_path(session), 'r+b') as target:
+            target.seek(first)
+            written = 0
+            # one byte more than expected is asked for, to detect a chunk longer than its range
+            for block in iter(lambda: stream.read(min(BUFFER_SIZE, expected - written + 1)), b''):
+                written += len(block)
+                if written > expected:
+                    break
+                target.write(block)
+            if written != expected:
+                # drop the partial chunk, the client sends it again
+                target.truncate(first)
+                raise UploadError(f"Expected {expected} bytes, the chunk does not match its Content-Range.")
+
+        session.received = last + 1
+        verified = session.received < session.size or complete_upload(session)
+        session.save()
+
+    if not verified:
+        raise UploadError("The uploaded content does not match its SHA-256, the upload starts over.", status=422)
+    return session
+
+
+def complete_upload(session):
+    """
+    Stores the file of a complete upload and creates its document. A file that does not match the
+    announced SHA-256 is dropped and the session starts over; returns False in that case.
+    """
+
+    path = upload_part_path(session)
+    sha256 = file_digest(path)
+    if session.sha256 and session.sha256 != sha256:
+        open(path, 'wb').close()
+        session.received = 0
+        return False
+
+    stored = store_file(path, session.name, sha256)
+    session.document = create_document(
+        session.building, stored, session.name, session.kind, session.apartment, user=session.uploaded_by,
+    )
+    return True
+
+
+def parse_range(header, size):
+    """
+    Returns the (first, last) bytes requested by a single `Range: bytes=...` header, None for a
+    header that is missing or asks for several ranges (the whole file is then served).
+    Raises ValueError for a range that cannot be satisfied.
+    """
+
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length <= 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+def read_range(path, first, last):
+    """
+    Yields the bytes first..last of a file, one buffer at a time.
+    """
+
+    with open(path, 'rb') as source:
+        source.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            block = source.read(min(BUFFER_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def thumbnail_path(stored):
+    """
+    Returns the path of the PNG thumbnail of a stored PDF, rendering it on first use, or None when
+    the file is not a PDF or cannot be rendered.
+    """
+
+    if stored.content_type != 'application/pdf':
+        return None
+
+    path = documents_path('thumbnails', f'{stored.sha256}.png')
+    if os.path.exists(path):
+        return path
+
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        return None
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as workdir:
+        prefix = os.path.join(workdir, 'page')
+        try:
+            subprocess.run(
+                [pdftoppm, '-png', '-singlefile', '-f', '1', '-l', '1', '-scale-to-x', str(THUMBNAIL_WIDTH),
+                 '-scale-to-y', '-1', documents_path(stored.path), prefix],
+                check=True, capture_output=True, timeout=THUMBNAIL_TIMEOUT,
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        # concurrent requests render the same thumbnail, the last one replaces the file atomically
+        os.replace(f'{prefix}.png', path)
+    return path
+
+
+def placeholder_thumbnail(document):
+    label = os.path.splitext(document.name)[1].lstrip('.').upper()[:4] or 'FILE'
+    return PLACEHOLDER_THUMBNAIL.replace('{label}', escape(label))
+
+
+def accessible_documents(user):
+    """
+    Returns the documents the given user may read: those of the buildings he administrates and,
+    for a tenant, those of his apartment and the ones shared with his whole building.
+    """
+
+    if not user.is_authenticated:
+        return Document.objects.none()
+
+    visible = Q(building__admin=user)
+    apartment = Apartment.objects.filter(tenant__user=user).values('id', 'building_id').first()
+    if apartment:
+        visible |= Q(apartment_id=apartment['id']) | Q(apartment__isnull=True, building_id=apartment['building_id'])
+    return Document.objects.filter(visible)
+
+
+def remove_file(path):
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def clean_uploads(abandoned_after=ABANDONED_AFTER):
+    """
+    Removes the upload sessions not resumed for `abandoned_after` seconds, and the files of the
+    uploads directory as old that no remaining session is writing (their partial files, temporary
+    files of interrupted form uploads and invoice runs). Returns the number of sessions removed.
+    """
+
+    cutoff = timezone.now() - datetime.timedelta(seconds=abandoned_after)
+    abandoned = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+    UploadSession.objects.filter(id__in=[session.id for session in abandoned]).delete()
+    for session in abandoned:
+        remove_file(upload_part_path(session))
+
+    directory = documents_path('uploads')
+    if os.path.isdir(directory):
+        active = {f'{token}.part' for token in UploadSession.objects.values_list('token', flat=True)}
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name not in active and entry.stat().st_mtime < cutoff.timestamp():
+                remove_file(entry.path)
+    return len(abandoned)
+
+
+def clean_stored_files(abandoned_after=ABANDONED_AFTER):
+    """
+    Removes the stored files no document holds any more (deleted documents, replaced invoices)
+    together with their blobs and thumbnails. Files stored in the last `abandoned_after` seconds
+    are kept, their document may be on its way. Returns the number of files removed.
+    """
+
+    cutoff = timezone.now() - datetime.timedelta(seconds=abandoned_after)
+    orphans = list(StoredFile.objects.filter(document__isnull=True, created_at__lt=cutoff).values_list('id', flat=True))
+
+    removed = 0
+    for start in range(0, len(orphans), CLEANUP_BATCH_SIZE):
+        with transaction.atomic():
+            # a document may have been created for one of them meanwhile
+            files = list(StoredFile.objects.select_for_update().filter(
+                id__in=orphans[start:start + CLEANUP_BATCH_SIZE], document__isnull=True
+            ).values_list('id', 'sha256', 'path'))
+            StoredFile.objects.filter(id__in=[file_id for file_id, _, _ in files]).delete()
+
+        # the content may have been stored again since, under the same path
+        stored_again = set(StoredFile.objects.filter(sha256__in=[sha256 for _, sha256, _ in files]).values_list(
+            'sha256', flat=True
+        ))
+        for _, sha256, path in files:
+            if sha256 not in stored_again:
+                remove_file(documents_path(path))
+                remove_file(documents_path('thumbnails', f'{sha256}.png'))
+        removed += len(files)
+    return removed
@@ -1,7 +1,9 @@
+from decimal import Decimal
+from django import forms
 from django.forms import ModelForm
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
-from .models import Building, Utility, MainUtil
+from .models import Building, Utility, MainUtil, Document
 
 UserModel = get_user_model()
 
@@ -41,4 +43,37 @@ class UpdateUtilityForm(ModelForm):
 class UpdateMainUtil(ModelForm):
     class Meta:
         model = MainUtil
-        fields = ['index_counter']
\ No newline at end of file
+        fields = ['index_counter']
+
+
+class ImportReadingsForm(forms.Form):
+    FORMATS = (
+        ('', 'Detect from file name'),
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    )
+
+    file        = forms.FileField()
+    file_format = forms.ChoiceField(choices=FORMATS, required=False)
+    period      = forms.DateField(required=False, help_text="Any day of the month of the readings.")
+
+
+class UploadDocumentForm(forms.Form):
+    file        = forms.FileField()
+    kind        = forms.ChoiceField(choices=Document.KINDS, initial=Document.OTHER)
+    apartment   = forms.ModelChoiceField(queryset=None, required=False, empty_label="Whole building")
+
+    def __init__(self, building, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['apartment'].queryset = building.apartment_set.order_by('number_id')
+
+
+
+class RecordPaymentForm(forms.Form):
+    apartment   = forms.ModelChoiceField(queryset=None)
+    amount      = forms.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    note        = forms.CharField(max_length=200, required=False)
+
+    def __init__(self, building, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['apartment'].queryset = building.apartment_set.all()
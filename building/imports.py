@@ -0,0 +1,228 @@
+"""
+Bulk import of apartment counter readings from CSV or JSON Lines files.
+
+Rows are read one by one from the stream (the file is never loaded in memory), validated against
+a lookup of the building's power supplies loaded with a single query, and written in chunks with
+`bulk_update` plus a bulk insert in the readings history.
+
+Each row holds the apartment `number_id`, the utility name, the new index and optionally the
+supply status, e.g. for CSV:
+
+    apartment,utility,index,status
+    12,Cold Water,5230,active
+"""
+
+import csv
+import json
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+from building.cache import touch_buildings
+from building.documents import documents_path
+from building.readings import record_readings
+from building.snapshots import refresh_buildings_snapshots
+from apartment.models import PowerSupply
+
+
+# number of rows validated before they are written to the database
+IMPORT_CHUNK_SIZE = 1000
+
+# rows with errors beyond this number are counted but not described
+MAX_REPORTED_ERRORS = 100
+
+STATUS_VALUES = {
+    'active': True, 'true': True, '1': True, 'yes': True,
+    'disabled': False, 'false': False, '0': False, 'no': False,
+}
+
+FORMATS = ('csv', 'jsonl')
+
+
+def import_storage():
+    """
+    Returns the storage of the uploaded files waiting for their import job. It lies under
+    DOCUMENTS_ROOT, which is not served, since the files hold the tenants' readings.
+    """
+    return FileSystemStorage(location=documents_path('imports'))
+
+
+class ReadingError(ValueError):
+    """
+    Raised when a row of the imported file cannot be applied.
+    """
+
+
+class ImportReport:
+    """
+    Outcome of an import: number of applied rows and the errors of the rejected ones.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        """
+        Returns the report as a JSON serializable dict, stored as the result of an import job.
+        """
+        return {'imported': self.imported, 'rejected': self.rejected, 'errors': self.errors}
+
+    @classmethod
+    def from_dict(cls, data):
+        report = cls()
+        report.imported = data['imported']
+        report.rejected = data['rejected']
+        report.errors = [tuple(error) for error in data['errors']]
+        return report
+
+    def __str__(self):
+        return f"{self.imported} readings imported, {self.rejected} rows rejected"
+
+
+def guess_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+
+
+def iter_rows(stream, file_format):
+    """
+    Yields (line number, row dict) from a text stream. Malformed JSON lines are yielded as None.
+    """
+
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip().lower(): value for key, value in row.items() if key}
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, {str(key).lower(): value for key, value in row.items()} if isinstance(row, dict) else None
+
+
+def supply_lookup(building):
+    """
+    Returns a dict of (apartment number_id, lowercase utility name) -> (power supply id, current index)
+    for every power supply of the building.
+    """
+    return {
+        (number_id, name.lower()): (supply_id, index or 0)
+        for supply_id, number_id, name, index in PowerSupply.objects.filter(
+            apartment__building=building
+        ).values_list('id', 'apartment__number_id', 'utility__name', 'index_counter')
+        if name
+    }
+
+
+def parse_row(row, lookup):
+    """
+    Validates one row and returns (power supply id, new index, new status or None).
+    Raises `ReadingError` when the row cannot be applied.
+    """
+
+    if row is None:
+        raise ReadingError("Malformed line.")
+
+    try:
+        number_id = int(str(row.get('apartment', '')).strip())
+    except ValueError:
+        raise ReadingError(f"Invalid apartment number {row.get('apartment')!r}.")
+
+    utility = str(row.get('utility') or '').strip()
+    supply = lookup.get((number_id, utility.lower()))
+    if supply is None:
+        raise ReadingError(f"Apartment {number_id} has no utility named {utility!r}.")
+    supply_id, current_index = supply
+
+    try:
+        index = int(str(row.get('index', '')).strip())
+    except ValueError:
+        raise ReadingError(f"Invalid index {row.get('index')!r}.")
+    if index < current_index:
+        raise ReadingError(f"Index {index} is lower than the current index {current_index}.")
+
+    status = row.get('status')
+    if status is not None and str(status).strip() != '':
+        status = STATUS_VALUES.get(str(status).strip().lower())
+        if status is None:
+            raise ReadingError(f"Invalid status {row.get('status')!r}.")
+    else:
+        status = None
+
+    # later rows of the same supply are validated against this one
+    lookup[(number_id, utility.lower())] = (supply_id, index)
+    return supply_id, index, status
+
+
+def apply_chunk(indexes, statuses, period):
+    """
+    Writes a chunk of validated rows: current indexes and statuses of the power supplies
+    and the readings history. Bulk updates do not set the auto_now timestamps, so they are written here.
+    """
+
+    now = timezone.now()
+    PowerSupply.objects.bulk_update(
+        [PowerSupply(id=supply_id, index_counter=index, updated_at=now) for supply_id, index in indexes.items()],
+        ['index_counter', 'updated_at']
+    )
+    PowerSupply.objects.bulk_update(
+        [PowerSupply(id=supply_id, status=status, updated_at=now) for supply_id, status in statuses.items()],
+        ['status', 'updated_at']
+    )
+    record_readings(indexes.items(), period)
+
+
+@transaction.atomic
+def import_readings(building, stream, file_format='csv', period=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Imports the readings of a text stream into the building's power supplies.
+    Valid rows are applied, invalid ones are reported; returns an `ImportReport`.
+    """
+
+    if file_format not in FORMATS:
+        raise ValueError(f"Unsupported format {file_format!r}.")
+
+    report = ImportReport()
+    lookup = supply_lookup(building)
+    indexes, statuses = {}, {}
+
+    line_number = 0
+    try:
+        for line_number, row in iter_rows(stream, file_format):
+            try:
+                supply_id, index, status = parse_row(row, lookup)
+            except ReadingError as error:
+                report.add_error(line_number, str(error))
+                continue
+
+            indexes[supply_id] = index
+            if status is not None:
+                statuses[supply_id] = status
+            report.imported += 1
+
+            if len(indexes) >= chunk_size:
+                apply_chunk(indexes, statuses, period)
+                indexes, statuses = {}, {}
+    except (UnicodeDecodeError, csv.Error) as error:
+        # the rest of the file cannot be read, the rows read so far are kept
+        report.add_error(line_number + 1, f"Unreadable file, the import stopped here: {error}")
+
+    if indexes:
+        apply_chunk(indexes, statuses, period)
+
+    # bulk updates bypass the signals that maintain the snapshots and invalidate the cached tables
+    if report.imported:
+        refresh_buildings_snapshots([building.id])
+        touch_buildings(building.id)
+
+    return report
@@ -0,0 +1,147 @@
+"""
+Rendering of the monthly invoices as PDF files.
+
+This module does not import Django: the invoices are rendered by worker processes (see
+`building.invoices`) that receive plain data prefetched by the parent process and never touch
+the database. Pages are written with the standard Helvetica fonts, which every PDF reader has,
+so no font is embedded and no PDF library is needed.
+
+The output only depends on the invoice data (no creation date is written), so an invoice that is
+rendered again with unchanged data has the same bytes and is stored once.
+"""
+
+import hashlib
+import tempfile
+import unicodedata
+
+
+# A4 page, in points
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+MARGIN = 50
+
+# x of the columns of the utilities table
+COLUMNS = (MARGIN, 230, 340, 450)
+
+LINE_HEIGHT = 16
+
+
+def pdf_text(text):
+    """
+    Escapes a text for a PDF string in the WinAnsi encoding of the standard fonts. Letters with
+    diacritics that encoding lacks (e.g. the Romanian ș and ț) lose their marks.
+    """
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', str(text)) if not unicodedata.combining(char)
+    )
+    text = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('cp1252', errors='replace')
+
+
+def amount(value):
+    return f"{value:,.2f}"
+
+
+def pdf_document(content):
+    """
+    Returns the bytes of a one page PDF drawing the given content stream.
+    """
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+        b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content),
+    ]
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+
+    # cross-reference table: the byte offset of every object
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+class Page:
+    """
+    Content stream of a page, written from the top down.
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, x, text, size=10, bold=False):
+        self.commands.append(b'BT /F%d %d Tf %d %d Td (%s) Tj ET' % (2 if bold else 1, size, x, self.y, pdf_text(text)))
+
+    def row(self, values, bold=False):
+        for x, value in zip(COLUMNS, values):
+            self.text(x, value, bold=bold)
+        self.skip()
+
+    def rule(self):
+        self.commands.append(b'%d %d m %d %d l S' % (MARGIN, self.y + 12, PAGE_WIDTH - MARGIN, self.y + 12))
+
+    def skip(self, lines=1):
+        self.y -= LINE_HEIGHT * lines
+
+    def content(self):
+        return b'\n'.join(self.commands)
+
+
+def render_invoice(invoice):
+    """
+    Returns the PDF of an invoice, given as the dict built by `building.invoices.invoice_data`.
+    Invoices with more utilities than a page holds are not expected (a building has a handful).
+    """
+
+    page = Page()
+    page.text(MARGIN, f"Invoice {invoice['number']}", size=18, bold=True)
+    page.skip(2)
+    page.text(MARGIN, f"Period: {invoice['period']:%B %Y}")
+    page.skip()
+    page.text(MARGIN, invoice['address'])
+    page.skip()
+    page.text(MARGIN, f"Apartment {invoice['apartment']}, {invoice['persons']} person(s)")
+    page.skip()
+    if invoice['tenant']:
+        page.text(MARGIN, f"Tenant: {invoice['tenant']}")
+        page.skip()
+
+    page.skip()
+    page.row(('Utility', 'Type', 'Consumption', 'Tariff'), bold=True)
+    page.rule()
+    for name, util_type, consumption, tariff, split in invoice['lines']:
+        page.row((name, util_type, '-' if consumption is None else consumption, f"{amount(tariff)} {split}"))
+
+    page.skip()
+    page.rule()
+    page.row(('Previous balance', '', '', amount(invoice['previous_balance'])))
+    page.row(('Charge of the month', '', '', amount(invoice['charge'])))
+    page.row(('Total due', '', '', amount(invoice['total'])), bold=True)
+
+    return pdf_document(page.content())
+
+
+def render_invoice_files(directory, invoices):
+    """
+    Renders invoices into new files of the given directory. Runs in the worker processes.
+    Returns (apartment id, path, sha256, size) of every invoice.
+    """
+
+    rendered = []
+    for invoice in invoices:
+        content = render_invoice(invoice)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.pdf', delete=False) as target:
+            target.write(content)
+        rendered.append((invoice['apartment_id'], target.name, hashlib.sha256(content).hexdigest(), len(content)))
+    return rendered
@@ -0,0 +1,176 @@
+"""
+Monthly invoices of the apartments, stored as documents.
+
+Invoices are generated for whole batches of buildings: the parent process reads the buildings,
+apartments, utilities, monthly consumption and ledger charges of a batch with one query per table, builds one plain
+dict per invoice and hands them in chunks to a pool of worker processes, which render the PDFs
+(`building.invoice_pdf`) without touching the database. The rendered files are moved into the
+documents store and their `Document` rows written in bulk, one chunk at a time, as the chunks come back.
+
+Only the apartments charged for the period get an invoice. Its balances are read from the charge entry
+of the ledger (the balance right after the charge), so payments collected later do not change an
+invoice generated again. Generating the invoices of a period again replaces them.
+"""
+
+import multiprocessing
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from django.db import transaction
+from building.documents import blob_path, documents_path, guess_content_type
+from building.invoice_pdf import render_invoice_files
+from building.models import Building, Document, StoredFile, Utility
+from building.periods import billing_period
+from apartment.models import Apartment, LedgerEntry, MonthlyConsumption
+
+
+# invoices rendered per task of a worker process
+INVOICE_CHUNK_SIZE = 100
+
+# buildings whose data is read at a time
+BUILDINGS_BATCH_SIZE = 200
+
+ADDRESS_FIELDS = ('street_name', 'street_number', 'city', 'county', 'postal_code')
+
+
+def invoice_name(period, number_id):
+    return f"invoice-{period:%Y-%m}-apartment-{number_id}.pdf"
+
+
+def invoice_data(building_ids, period):
+    """
+    Returns the data of the invoices of the given buildings for a period, one dict per charged
+    apartment, read with one query per table. Buildings not billed for the period are left out.
+    """
+
+    buildings = {values['id']: values for values in Building.objects.filter(
+        id__in=building_ids, billed_period=period
+    ).values('id', *ADDRESS_FIELDS)}
+    if not buildings:
+        return []
+
+    # utilities without a tariff are not billed (see `compute_building_charges`)
+    utilities = defaultdict(list)
+    for util_id, building_id, name, util_type, tariff, per_person in Utility.objects.filter(
+        building_id__in=buildings, tax_or_wage__gt=0
+    ).order_by('id').values_list('id', 'building_id', 'name', 'util_type', 'tax_or_wage', 'tax_type'):
+        utilities[building_id].append((util_id, name, util_type, tariff, per_person))
+
+    consumption = defaultdict(int)
+    for apartment_id, util_id, used in MonthlyConsumption.objects.filter(
+        apartment__building_id__in=buildings, period=period
+    ).values_list('apartment_id', 'utility_id', 'consumption'):
+        consumption[apartment_id, util_id] += used
+
+    charges = {apartment_id: (amount, balance) for apartment_id, amount, balance in LedgerEntry.objects.filter(
+        apartment__building_id__in=buildings, kind=LedgerEntry.CHARGE, period=period
+    ).values_list('apartment_id', 'amount', 'balance')}
+
+    invoices = []
+    for apartment in Apartment.objects.filter(building_id__in=buildings).order_by('building_id', 'number_id').values(
+        'id', 'building_id', 'number_id', 'num_of_persons', 'tenant__first_name', 'tenant__last_name'
+    ):
+        # apartments created after the billing run were not charged for the period
+        if apartment['id'] not in charges:
+            continue
+        charge, balance = charges[apartment['id']]
+        building = buildings[apartment['building_id']]
+        lines = []
+        for util_id, name, util_type, tariff, per_person in utilities[apartment['building_id']]:
+            if util_type == 'Individual':
+                lines.append((name, util_type, consumption[apartment['id'], util_id], tariff, 'per unit'))
+            else:
+                lines.append((name, util_type, None, tariff, 'per person' if per_person else 'per apartment'))
+
+        invoices.append({
+            'apartment_id': apartment['id'],
+            'building_id': apartment['building_id'],
+            'name': invoice_name(period, apartment['number_id']),
+            'number': f"{period:%Y%m}-{apartment['id']}",
+            'period': period,
+            'address': (f"{building['street_name']} {building['street_number']}, {building['city']}, "
+                        f"{building['county']} {building['postal_code']}"),
+            'apartment': apartment['number_id'],
+            'persons': apartment['num_of_persons'],
+            'tenant': ' '.join(filter(None, (apartment['tenant__first_name'], apartment['tenant__last_name']))),
+            'lines': lines,
+            'charge': charge,
+            'previous_balance': balance - charge,
+            'total': balance,
+        })
+    return invoices
+
+
+@transaction.atomic
+def store_invoices(invoices, rendered, period):
+    """
+    Moves rendered invoices into the documents store and replaces the invoice documents of their
+    apartments for the period, with a fixed number of queries for the whole chunk.
+    """
+
+    existing = set(StoredFile.objects.filter(sha256__in=[sha256 for _, _, sha256, _ in rendered]).values_list(
+        'sha256', flat=True
+    ))
+    new_files = {}
+    for apartment_id, path, sha256, size in rendered:
+        if sha256 in existing or sha256 in new_files:
+            os.remove(path)
+            continue
+        target = blob_path(sha256)
+        os.makedirs(os.path.dirname(documents_path(target)), exist_ok=True)
+        os.replace(path, documents_path(target))
+        new_files[sha256] = StoredFile(sha256=sha256, size=size, content_type=guess_content_type(path), path=target)
+
+    # a concurrent run may have stored the same content first, with the same path
+    StoredFile.objects.bulk_create(new_files.values(), ignore_conflicts=True)
+    files = dict(StoredFile.objects.filter(sha256__in=[sha256 for _, _, sha256, _ in rendered]).values_list(
+        'sha256', 'id'
+    ))
+
+    apartment_ids = [apartment_id for apartment_id, _, _, _ in rendered]
+    Document.objects.filter(kind=Document.INVOICE, period=period, apartment_id__in=apartment_ids).delete()
+    Document.objects.bulk_create([
+        Document(
+            building_id=invoices[apartment_id]['building_id'], apartment_id=apartment_id, kind=Document.INVOICE,
+            name=invoices[apartment_id]['name'], file_id=files[sha256], period=period,
+        )
+        for apartment_id, _, sha256, _ in rendered
+    ])
+    return len(rendered)
+
+
+def generate_invoices(building_ids, period=None, workers=None, chunk_size=INVOICE_CHUNK_SIZE):
+    """
+    Renders and stores the invoices of the given buildings for a month across `workers` processes
+    (the number of CPUs by default, 0 renders in this process). Returns the number of invoices.
+    """
+
+    period = billing_period(period)
+    building_ids = list(building_ids)
+    directory = documents_path('uploads')
+    os.makedirs(directory, exist_ok=True)
+
+    pool = None
+    if workers != 0:
+        # the workers are started fresh rather than forked from a process holding database
+        # connections (and, in run_jobs, other threads); they only import `building.invoice_pdf`
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    count = 0
+    try:
+        for start in range(0, len(building_ids), BUILDINGS_BATCH_SIZE):
+            invoices = invoice_data(building_ids[start:start + BUILDINGS_BATCH_SIZE], period)
+            chunks = [invoices[position:position + chunk_size] for position in range(0, len(invoices), chunk_size)]
+            results = pool.map(render_invoice_files, repeat(directory), chunks) if pool else map(
+                render_invoice_files, repeat(directory), chunks
+            )
+
+            by_apartment = {invoice['apartment_id']: invoice for invoice in invoices}
+            # chunks are stored as they come back, while the workers render the next ones
+            for rendered in results:
+                count += store_invoices(by_apartment, rendered, period)
+    finally:
+        if pool:
+            pool.shutdown()
+    return count
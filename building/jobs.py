@@ -0,0 +1,182 @@
+"""
+Database-backed background jobs.
+
+Jobs are rows of the `Job` model, so the queue needs no broker and works on any database.
+Web requests enqueue a job and return immediately; the `run_jobs` management command runs
+a pool of worker threads that claim the pending jobs and execute their handler.
+
+A job is claimed with a conditional UPDATE (`status = pending` -> `running`): when several
+workers race for the same row only one of them updates it, so every job runs once.
+Failed jobs are retried up to `MAX_ATTEMPTS` times, after a delay that doubles with every attempt.
+Jobs left running by a dead worker are put back in the queue by `requeue_stale_jobs`, which the
+workers call periodically.
+"""
+
+import datetime
+import io
+import traceback
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from building.billing import bill_buildings
+from building.cache import touch_buildings
+from building.imports import import_readings, import_storage
+from building.invoices import generate_invoices
+from building.models import Job
+from building.provisioning import provision_building
+
+
+# number of attempts before a job is marked as failed
+MAX_ATTEMPTS = 3
+
+# seconds before the first retry of a failed job, doubled with every further attempt
+RETRY_DELAY = 30
+
+# number of pending jobs a worker tries to claim before looking again
+CLAIM_WINDOW = 10
+
+# handlers of the job kinds, registered with the `job_handler` decorator
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """
+    Registers the decorated function as the handler of a job kind. The handler receives
+    the job and returns a JSON serializable result.
+    """
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def enqueue(kind, building=None, **payload):
+    """
+    Adds a job to the queue and returns it.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}.")
+    return Job.objects.create(kind=kind, building=building, payload=payload)
+
+
+def pending_job(building, kind):
+    """
+    Returns the pending or running job of the given kind for the building, if any.
+    """
+    return Job.objects.filter(
+        building=building, kind=kind, status__in=(Job.PENDING, Job.RUNNING)
+    ).order_by('id').first()
+
+
+def claim_job(worker):
+    """
+    Marks the oldest pending job as running for the given worker and returns it,
+    or returns None when the queue is empty.
+    """
+
+    candidates = Job.objects.filter(status=Job.PENDING, run_after__lte=timezone.now()).order_by('id').values_list(
+        'id', flat=True
+    )
+    for job_id in candidates[:CLAIM_WINDOW]:
+        claimed = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, worker=worker, started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        # another worker claimed the job first
+        if claimed:
+            return Job.objects.select_related('building').get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """
+    Runs the handler of a claimed job and stores its result or its error.
+    """
+
+    try:
+        job.result = JOB_HANDLERS[job.kind](job)
+        job.status = Job.DONE
+        job.error = ''
+    except Exception:
+        job.error = traceback.format_exc()
+        job.status = Job.PENDING if job.attempts < MAX_ATTEMPTS else Job.FAILED
+        job.run_after = timezone.now() + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (job.attempts - 1))
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'run_after', 'finished_at'])
+
+    # pages showing the job of a building (e.g. the provisioning banner) must not be answered with a 304
+    touch_buildings(job.building_id)
+    return job
+
+
+def run_pending_jobs(worker='inline', limit=None):
+    """
+    Runs pending jobs one after another until the queue is empty (or `limit` jobs ran)
+    and returns the number of jobs that ran.
+    """
+
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job(worker)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+
+        # worker threads keep their own connection, drop it if it became unusable
+        close_old_connections()
+    return count
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Puts back in the queue the jobs running for longer than `timeout` seconds, left behind by a
+    worker that was stopped or crashed; those out of attempts are marked as failed instead.
+    Returns the number of jobs requeued.
+    """
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=timezone.now() - datetime.timedelta(seconds=timeout))
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=Job.FAILED, error='The worker running the job stopped.', finished_at=timezone.now(),
+    )
+    return stale.update(status=Job.PENDING)
+
+
+@job_handler('provision_building')
+def run_provisioning(job):
+    provision_building(job.building)
+    return {'apartments': job.building.apartment_set.count()}
+
+
+@job_handler('bill_buildings')
+def run_billing(job):
+    period = job.payload.get('period')
+    period = datetime.date.fromisoformat(period) if period else None
+    return {'apartments': bill_buildings(job.payload['building_ids'], period)}
+
+
+@job_handler('generate_invoices')
+def run_invoices(job):
+    period = job.payload.get('period')
+    period = datetime.date.fromisoformat(period) if period else None
+    return {'invoices': generate_invoices(job.payload['building_ids'], period, job.payload.get('workers'))}
+
+
+@job_handler('import_readings')
+def run_import(job):
+    period = job.payload.get('period')
+    period = datetime.date.fromisoformat(period) if period else None
+    path = job.payload['path']
+    storage = import_storage()
+
+    try:
+        with storage.open(path, 'rb') as upload:
+            stream = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+            report = import_readings(job.building, stream, job.payload['file_format'], period)
+    except Exception:
+        # the uploaded file is kept while the job can be retried, and removed once it failed for good
+        if job.attempts >= MAX_ATTEMPTS:
+            storage.delete(path)
+        raise
+
+    storage.delete(path)
+    return report.as_dict()
@@ -0,0 +1,111 @@
+"""
+Payments ledger of the apartments.
+
+Every amount an apartment is charged or pays is appended to its ledger as a `LedgerEntry`; entries
+are never changed. The balance of every apartment (the sum of its entries) is materialized in
+`Apartment.balance` and written in the same transaction as the entries, with the apartment rows
+locked, so concurrent postings cannot lose an update. The debt and payment status of an apartment
+are derived from its balance, nothing else stores them.
+
+Amounts are Decimals rounded to the cent, so balances do not accumulate rounding errors.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from building.cache import touch_buildings
+from building.snapshots import refresh_apartment_snapshots
+from building.stats import refresh_buildings_stats
+from apartment.models import Apartment, LedgerEntry
+
+
+CENT = Decimal('0.01')
+
+ZERO = Decimal('0.00')
+
+# amounts fit in 12 digits, 2 of them decimals
+MAX_AMOUNT = Decimal('10000000000.00')
+
+# number of rows written by a single INSERT or UPDATE statement
+LEDGER_BATCH_SIZE = 500
+
+
+def to_amount(value):
+    """
+    Returns a number (float, int, string or Decimal) as an amount rounded to the cent.
+    """
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@transaction.atomic
+def post_entries(entries):
+    """
+    Appends unsaved ledger entries and updates the balances of their apartments, with a fixed
+    number of queries for the whole list. Returns the new balances by apartment id.
+
+    The stats, snapshots and cached tables of the apartments are left to the caller, which
+    usually refreshes them once for a batch of buildings.
+    """
+
+    entries = list(entries)
+    if not entries:
+        return {}
+
+    # apartments are locked in the same order by every posting, so postings cannot deadlock
+    balances = dict(Apartment.objects.select_for_update().filter(
+        id__in={entry.apartment_id for entry in entries}
+    ).order_by('id').values_list('id', 'balance'))
+
+    for entry in entries:
+        entry.amount = to_amount(entry.amount)
+        balances[entry.apartment_id] += entry.amount
+        entry.balance = balances[entry.apartment_id]
+
+    if len(entries) == 1:
+        # a single entry is saved on its own, so its id is known on every database
+        entries[0].save()
+    else:
+        LedgerEntry.objects.bulk_create(entries, batch_size=LEDGER_BATCH_SIZE)
+
+    # bulk updates do not set the auto_now timestamps
+    now = timezone.now()
+    Apartment.objects.bulk_update(
+        [Apartment(id=apartment_id, balance=balance, updated_at=now) for apartment_id, balance in balances.items()],
+        ['balance', 'updated_at'], batch_size=LEDGER_BATCH_SIZE,
+    )
+    return balances
+
+
+@transaction.atomic
+def record_payment(apartment, amount, user=None, note=''):
+    """
+    Records a payment collected from an apartment and returns its ledger entry.
+    """
+
+    amount = to_amount(amount)
+    if not 0 < amount < MAX_AMOUNT:
+        raise ValueError(f"A payment must be a positive amount below {MAX_AMOUNT}.")
+
+    entry = LedgerEntry(
+        apartment_id=apartment.id, kind=LedgerEntry.PAYMENT, amount=-amount, note=note,
+        created_by=user if user and user.is_authenticated else None,
+    )
+    apartment.balance = post_entries([entry])[apartment.id]
+
+    # the balance was written in bulk, without the signals that maintain these
+    refresh_buildings_stats([apartment.building_id])
+    refresh_apartment_snapshots([apartment.id])
+    touch_buildings(apartment.building_id)
+    return entry
+
+
+def ledger_balances(apartment_ids):
+    """
+    Returns the balances of the given apartments computed from their entries, by apartment id,
+    to check them against the materialized balances.
+    """
+
+    return dict(LedgerEntry.objects.filter(apartment_id__in=apartment_ids).values('apartment_id').annotate(
+        total=Sum('amount'),
+    ).order_by().values_list('apartment_id', 'total'))
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+from building.models import CustomUser
+from building.management.commands.benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the throughput of the async pages (admin dashboard, settings, apartments and tenant "
+        "dashboard) served by the WSGI handler and by the ASGI handler, under concurrent load. "
+        "Runs against the current database, see the seed_data command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per mode.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight at the same time.")
+        parser.add_argument('--cold', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--output', help="Path of the JSON report.")
+
+    def handle(self, *args, **options):
+        # the test clients send their requests to the 'testserver' host
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        admin = CustomUser.objects.filter(building__isnull=False).order_by('id').first()
+        tenant = CustomUser.objects.filter(tenant__apartment__isnull=False).order_by('id').first()
+        if admin is None or tenant is None:
+            raise CommandError("No building or tenant found, seed the database first (manage.py seed_data).")
+
+        # (session cookies, url) of every benchmarked page
+        admin_cookies, tenant_cookies = self.login(admin), self.login(tenant)
+        pages = [
+            (admin_cookies, reverse('building:admin_dashboard')),
+            (admin_cookies, reverse('building:admin_settings')),
+            (admin_cookies, reverse('building:admin_apartments')),
+            (tenant_cookies, reverse('apartment:apt_dashboard')),
+        ]
+        self.requests = [pages[number % len(pages)] for number in range(options['requests'])]
+        self.cold = options['cold']
+
+        report = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'cache': 'cold' if options['cold'] else 'warm',
+            'wsgi': self.summarize(*self.run_wsgi(options['concurrency'])),
+            'asgi': self.summarize(*asyncio.run(self.run_asgi(options['concurrency']))),
+        }
+
+        self.stdout.write(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for mode in ('wsgi', 'asgi'):
+            stats = report[mode]
+            self.stdout.write(
+                f"{mode:<8}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.cookies
+
+    def check_response(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f"{url} answered {response.status_code}.")
+
+    def run_wsgi(self, concurrency):
+        """
+        Sends the requests through the WSGI handler from a pool of threads.
+        """
+
+        def send(page):
+            cookies, url = page
+            client = Client()
+            client.cookies = cookies
+            if self.cold:
+                cache.clear()
+
+            started = time.perf_counter()
+            self.check_response(client.get(url), url)
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(send, self.requests))
+        return timings, time.perf_counter() - started
+
+    async def run_asgi(self, concurrency):
+        """
+        Sends the requests through the ASGI handler from concurrent tasks of one event loop.
+        """
+
+        slots = asyncio.Semaphore(concurrency)
+
+        async def send(page):
+            cookies, url = page
+            client = AsyncClient()
+            client.cookies = cookies
+            async with slots:
+                if self.cold:
+                    cache.clear()
+
+                started = time.perf_counter()
+                self.check_response(await client.get(url), url)
+                return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(send(page) for page in self.requests))
+        return timings, time.perf_counter() - started
+
+    def summarize(self, timings, elapsed):
+        return {
+            'throughput': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+        }
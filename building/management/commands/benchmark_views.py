@@ -0,0 +1,171 @@
+import json
+import platform
+import statistics
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from building.models import CustomUser, Building
+from apartment.models import PowerSupply
+
+
+class Rollback(Exception):
+    """
+    Raised to roll back the writes of a benchmark run.
+    """
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(share * (len(values) - 1))))]
+
+
+def summarize(timings, queries):
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries_max': max(queries),
+        'queries_mean': round(statistics.mean(queries), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the admin views through the Django test client against the current database "
+        "(see the seed_data command) and writes latency percentiles and query counts per view "
+        "into a JSON report. Writes made by the benchmark are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Requests per view.")
+        parser.add_argument('--buildings', type=int, default=5, help="Number of buildings the requests rotate over.")
+        parser.add_argument('--capacity', type=int, default=40, help="Apartments of the buildings created by the benchmark.")
+        parser.add_argument('--cold', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--output', help="Path of the JSON report.")
+        parser.add_argument('--compare', help="Path of a previous JSON report to compare with.")
+
+    def handle(self, *args, **options):
+        admins = list(CustomUser.objects.filter(
+            building__isnull=False
+        ).distinct().order_by('id')[:options['buildings']])
+        if not admins:
+            raise CommandError("No building found, seed the database first (manage.py seed_data).")
+
+        # the pages show the first building of each admin until another one is selected
+        self.buildings = {}
+        for building in Building.objects.filter(admin__in=admins).order_by('-id'):
+            self.buildings[building.admin_id] = building
+
+        self.client = Client(SERVER_NAME='localhost')
+        self.options = options
+
+        views = {}
+        try:
+            with transaction.atomic():
+                views['DashboardPage'] = self.measure(admins, lambda admin: self.client.get(reverse('building:admin_dashboard')))
+                views['SettingsPage'] = self.measure(admins, lambda admin: self.client.get(reverse('building:admin_settings')))
+                views['ApartmentsPage'] = self.measure(admins, lambda admin: self.client.get(reverse('building:admin_apartments')))
+                views['PortfolioPage'] = self.measure(admins, lambda admin: self.client.get(reverse('building:admin_portfolio')))
+                views['UpdateUtilityStatus'] = self.measure(admins, self.update_status)
+                views['UpdateSupplyStatuses'] = self.measure(admins, self.update_statuses)
+                views['CreateResidentialBuilding'] = self.measure_creation()
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'cache': 'cold' if options['cold'] else 'warm',
+            'views': views,
+        }
+
+        self.print_report(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+    def request(self, send, admin):
+        if self.options['cold']:
+            cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = send(admin)
+            elapsed = (time.perf_counter() - started) * 1000
+
+        if response.status_code >= 400:
+            raise CommandError(f"{response.request['PATH_INFO']} answered {response.status_code}.")
+        return elapsed, len(queries)
+
+    def measure(self, admins, send):
+        timings, queries = [], []
+        for number in range(self.options['requests']):
+            admin = admins[number % len(admins)]
+            self.client.force_login(admin)
+            elapsed, count = self.request(send, admin)
+            timings.append(elapsed)
+            queries.append(count)
+        return summarize(timings, queries)
+
+    def update_status(self, admin):
+        """
+        Posts the supply status grid of the admin's first apartment, toggling every status.
+        """
+
+        apartment = self.buildings[admin.id].apartment_set.order_by('number_id').first()
+        disabled = apartment.powersupply_set.exclude(status=True).values_list('id', flat=True)
+
+        url = reverse('building:update_main_utils-status', args=[apartment.id])
+        return self.client.post(url, {'status': list(disabled)})
+
+    def update_statuses(self, admin):
+        """
+        Posts the building-wide supply status grid, toggling every status of the building.
+        """
+
+        disabled = PowerSupply.objects.filter(
+            apartment__building=self.buildings[admin.id]
+        ).exclude(status=True).values_list('id', flat=True)
+        return self.client.post(reverse('building:update_supplies-status'), {'status': list(disabled)})
+
+    def measure_creation(self):
+        """
+        Creates new buildings through the registration form, one fresh admin per request.
+        """
+
+        timings, queries = [], []
+        for number in range(self.options['requests']):
+            admin = CustomUser.objects.create(username=f"benchmark-{time.time_ns()}-{number}")
+            self.client.force_login(admin)
+            elapsed, count = self.request(lambda admin: self.client.post(reverse('building:create-residential'), {
+                'street_name': 'Benchmark', 'street_number': number + 1, 'city': 'Timisoara', 'county': 'Timis',
+                'postal_code': '300000', 'apartments_capacity': self.options['capacity'], 'has_elevator': 'on',
+            }), admin)
+            timings.append(elapsed)
+            queries.append(count)
+        return summarize(timings, queries)
+
+    def print_report(self, report, compare):
+        previous = {}
+        if compare:
+            with open(compare) as previous_report:
+                previous = json.load(previous_report)['views']
+
+        self.stdout.write(f"{'view':<28}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>10}")
+        for name, stats in report['views'].items():
+            line = (f"{name:<28}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                    f"{stats['queries_max']:>10}")
+            if name in previous:
+                before = previous[name]
+                line += (f"   p95 {stats['p95_ms'] - before['p95_ms']:+.2f} ms, "
+                         f"queries {stats['queries_max'] - before['queries_max']:+d}")
+            self.stdout.write(line)
@@ -0,0 +1,151 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from building.api import ApiError, bulk_update_supplies
+from building.models import CustomUser, Building
+from building.management.commands.benchmark_views import percentile
+from apartment.models import PowerSupply
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the concurrent write throughput of building creation and readings updates against "
+        "the configured database (see residential_cms/database.py). Run it once per database mode "
+        "(SQLite, Postgres with and without persistent connections, pooled Postgres) and compare the "
+        "reports. The buildings created by the benchmark are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent writers.")
+        parser.add_argument('--operations', type=int, default=25, help="Writes per thread and per kind.")
+        parser.add_argument('--capacity', type=int, default=20, help="Apartments of the created buildings.")
+        parser.add_argument('--keep', action='store_true', help="Keep the buildings created by the benchmark.")
+        parser.add_argument('--output', help="Path of the JSON report.")
+        parser.add_argument('--compare', help="Path of a previous JSON report to compare with.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.prefix = f"bench-writes-{time.time_ns()}"
+
+        # buildings whose readings are updated, created before the clock starts
+        self.readings_buildings = [self.create_building(f'setup-{number}') for number in range(2)]
+        try:
+            report = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'mode': self.describe_mode(),
+                'threads': options['threads'],
+                'writes': {
+                    'create_building': self.run(lambda thread, number: self.create_building(f'{thread}-{number}')),
+                    'update_readings': self.run(self.update_readings),
+                },
+            }
+        finally:
+            if not options['keep']:
+                CustomUser.objects.filter(username__startswith=self.prefix).delete()
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+    def describe_mode(self):
+        settings_dict = connection.settings_dict
+        mode = {
+            'vendor': connection.vendor,
+            'engine': settings_dict['ENGINE'],
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': bool(settings_dict.get('CONN_HEALTH_CHECKS')),
+            'pooled': settings_dict['ENGINE'].endswith('_pool'),
+        }
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                mode['journal_mode'] = cursor.fetchone()[0]
+        return mode
+
+    def create_building(self, suffix):
+        """
+        Creates an admin and its building, provisioned in the same transaction.
+        """
+        with transaction.atomic():
+            admin = CustomUser.objects.create(username=f'{self.prefix}-{suffix}')
+            return Building.objects.create(
+                admin=admin, street_name='Benchmark', street_number=1, city='Timisoara', county='Timis',
+                postal_code='300000', apartments_capacity=self.options['capacity'],
+            )
+
+    def update_readings(self, thread, number):
+        """
+        Raises the indexes of the supplies of a random apartment, as sent by the bulk readings API.
+        """
+        building = random.choice(self.readings_buildings)
+        supplies = PowerSupply.objects.filter(
+            apartment__building=building, apartment__number_id=random.randint(1, self.options['capacity'])
+        ).values_list('id', 'index_counter')
+        items = [{'id': supply_id, 'index_counter': (index or 0) + 1} for supply_id, index in supplies]
+        bulk_update_supplies([building.id], items)
+
+    def run(self, write):
+        """
+        Runs the writes from concurrent threads. Connections are released after every write, as at
+        the end of a request, so the connection settings (CONN_MAX_AGE, pool) of the mode apply.
+        """
+
+        def work(thread):
+            timings, errors = [], 0
+            try:
+                for number in range(self.options['operations']):
+                    started = time.perf_counter()
+                    try:
+                        write(thread, number)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    except (DatabaseError, ApiError):
+                        # locked database, or an index lowered by a concurrent writer of the same apartment
+                        errors += 1
+                    if not connection.in_atomic_block:
+                        close_old_connections()
+            finally:
+                if threads > 1:
+                    connection.close()
+            return timings, errors
+
+        threads = self.options['threads']
+        started = time.perf_counter()
+        if threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                results = list(pool.map(work, range(threads)))
+        else:
+            # a single writer runs in the main thread (and its transaction, e.g. in the tests)
+            results = [work(0)]
+        elapsed = time.perf_counter() - started
+
+        timings = [timing for thread_timings, _ in results for timing in thread_timings]
+        if not timings:
+            raise CommandError("Every write failed.")
+        return {
+            'writes': len(timings),
+            'errors': sum(errors for _, errors in results),
+            'throughput': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+        }
+
+    def print_report(self, report):
+        previous = {}
+        if self.options['compare']:
+            with open(self.options['compare']) as previous_report:
+                previous = json.load(previous_report)['writes']
+
+        self.stdout.write(", ".join(f"{key}: {value}" for key, value in report['mode'].items()))
+        self.stdout.write(f"{'write':<20}{'writes/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'errors':>8}")
+        for name, stats in report['writes'].items():
+            line = (f"{name:<20}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                    f"{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+            if name in previous:
+                line += f"   {stats['throughput'] - previous[name]['throughput']:+.1f} writes/s"
+            self.stdout.write(line)
@@ -0,0 +1,50 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from building.billing import bill_buildings, billing_period
+from building.jobs import enqueue
+from building.models import Building
+
+
+class Command(BaseCommand):
+    help = "Computes the monthly charges of every apartment, in batches of buildings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help="Billed month as YYYY-MM (defaults to the current month).")
+        parser.add_argument('--building', type=int, action='append', dest='buildings',
+                            help="Id of a building to bill (can be repeated). Defaults to every building.")
+        parser.add_argument('--chunk-size', type=int, default=200, help="Number of buildings billed per batch.")
+        parser.add_argument('--background', action='store_true',
+                            help="Enqueue one job per batch for the run_jobs workers instead of billing right away.")
+
+    def handle(self, *args, **options):
+        try:
+            period = datetime.datetime.strptime(options['period'], '%Y-%m').date() if options['period'] else None
+        except ValueError:
+            raise CommandError("The period must be given as YYYY-MM.")
+        period = billing_period(period)
+
+        buildings = Building.objects.order_by('id')
+        if options['buildings']:
+            buildings = buildings.filter(id__in=options['buildings'])
+        building_ids = list(buildings.values_list('id', flat=True))
+
+        chunk_size = options['chunk_size']
+        if options['background']:
+            for start in range(0, len(building_ids), chunk_size):
+                enqueue('bill_buildings', building_ids=building_ids[start:start + chunk_size], period=period.isoformat())
+            self.stdout.write(self.style.SUCCESS(
+                f"Enqueued the billing of {len(building_ids)} buildings for {period:%Y-%m} "
+                f"in {-(-len(building_ids) // chunk_size)} job(s)."
+            ))
+            return
+
+        started = time.perf_counter()
+        apartments = 0
+        for start in range(0, len(building_ids), chunk_size):
+            apartments += bill_buildings(building_ids[start:start + chunk_size], period)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Billed {apartments} apartments of {len(building_ids)} buildings for {period:%Y-%m} in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from building.documents import ABANDONED_AFTER, clean_stored_files, clean_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes the abandoned uploads with their partial files and the stored files no document holds "
+        "any more (deleted documents, replaced invoices). Meant to run periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--abandoned-after', type=int, default=ABANDONED_AFTER,
+                            help="Seconds after which an unfinished upload or an unused stored file is removed.")
+
+    def handle(self, *args, **options):
+        if options['abandoned_after'] < 0:
+            raise CommandError("The delay cannot be negative.")
+
+        sessions = clean_uploads(options['abandoned_after'])
+        files = clean_stored_files(options['abandoned_after'])
+        self.stdout.write(self.style.SUCCESS(f"Removed {sessions} abandoned upload(s) and {files} unused file(s)."))
@@ -0,0 +1,76 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from building.models import Building, Utility, MainUtil
+from apartment.models import Apartment, PowerSupply
+
+
+class Command(BaseCommand):
+    help = "Prints the query plan and the latency of the hot lookup paths of the views."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Number of buildings to create before measuring.")
+        parser.add_argument('--capacity', type=int, default=10, help="Apartments per seeded building.")
+        parser.add_argument('--repeat', type=int, default=200, help="Number of runs of each query.")
+
+    def seed(self, count, capacity):
+        started = time.perf_counter()
+        offset = Building.objects.count()
+        with transaction.atomic():
+            # every building is provisioned by its post_save signal
+            for number in range(count):
+                Building.objects.create(street_name='Benchmark', street_number=offset + number + 1,
+                                        apartments_capacity=capacity, has_elevator=number % 2 == 0)
+        self.stdout.write(f"Seeded {count} buildings in {time.perf_counter() - started:.1f}s.")
+
+    def lookups(self):
+        """
+        Returns the hot lookups as (name, queryset), using random existing rows as parameters.
+        """
+
+        supply = PowerSupply.objects.order_by('?').select_related('apartment').first()
+        if supply is None:
+            raise CommandError("The database is empty, run with --seed.")
+        apartment = supply.apartment
+        building_id = apartment.building_id
+        apartment_ids = list(Apartment.objects.filter(building_id=building_id).values_list('id', flat=True))
+
+        return [
+            ('apartment by (building, number_id)',
+             Apartment.objects.filter(building_id=building_id, number_id=apartment.number_id)),
+            ('apartments of a building by number_id',
+             Apartment.objects.filter(building_id=building_id).order_by('number_id')),
+            ('utilities by (building, util_type)',
+             Utility.objects.filter(building_id=building_id, util_type='Individual')),
+            ('power supply by (apartment, utility)',
+             PowerSupply.objects.filter(apartment_id=apartment.id, utility_id=supply.utility_id)),
+            ('power supplies of a building (prefetch)',
+             PowerSupply.objects.filter(apartment_id__in=apartment_ids)),
+            ('main counters by util__building',
+             MainUtil.objects.filter(util__building_id=building_id)),
+        ]
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['capacity'])
+
+        self.stdout.write(
+            f"{connection.vendor}: {Building.objects.count()} buildings, {Apartment.objects.count()} apartments, "
+            f"{PowerSupply.objects.count()} power supplies"
+        )
+
+        for name, queryset in self.lookups():
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f"mean {statistics.mean(timings):.3f} ms, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.3f} ms, max {timings[-1]:.3f} ms"
+            )
@@ -0,0 +1,61 @@
+import datetime
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from building.billing import billing_period
+from building.invoices import INVOICE_CHUNK_SIZE, generate_invoices
+from building.jobs import enqueue
+from building.models import Building
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the monthly PDF invoice of every apartment of the billed buildings across a pool of "
+        "worker processes and stores them as documents."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', help="Invoiced month as YYYY-MM (defaults to the current month).")
+        parser.add_argument('--building', type=int, action='append', dest='buildings',
+                            help="Id of a building to invoice (can be repeated). Defaults to every building.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help="Worker processes rendering the invoices (0 renders in this process).")
+        parser.add_argument('--chunk-size', type=int, default=INVOICE_CHUNK_SIZE,
+                            help="Number of invoices rendered per worker task.")
+        parser.add_argument('--background', action='store_true',
+                            help="Enqueue a job for the run_jobs workers instead of generating right away.")
+
+    def handle(self, *args, **options):
+        try:
+            period = datetime.datetime.strptime(options['period'], '%Y-%m').date() if options['period'] else None
+        except ValueError:
+            raise CommandError("The period must be given as YYYY-MM.")
+        period = billing_period(period)
+        if options['workers'] < 0 or options['chunk_size'] < 1:
+            raise CommandError("The number of workers cannot be negative and a chunk holds at least one invoice.")
+
+        buildings = Building.objects.order_by('id')
+        if options['buildings']:
+            buildings = buildings.filter(id__in=options['buildings'])
+        building_ids = list(buildings.values_list('id', flat=True))
+
+        if options['background']:
+            enqueue('generate_invoices', building_ids=building_ids, period=period.isoformat(), workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Enqueued the invoices of {len(building_ids)} buildings for {period:%Y-%m}."
+            ))
+            return
+
+        unbilled = buildings.exclude(billed_period=period).count()
+        if unbilled:
+            self.stdout.write(self.style.WARNING(
+                f"{unbilled} building(s) are not billed for {period:%Y-%m} and get no invoices (run bill_buildings first)."
+            ))
+
+        started = time.perf_counter()
+        invoices = generate_invoices(building_ids, period, options['workers'], options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {invoices} invoices for {period:%Y-%m} in {elapsed:.2f}s "
+            f"({invoices / elapsed if elapsed else 0:.1f} invoices/s, {options['workers']} worker(s))."
+        ))
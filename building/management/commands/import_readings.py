@@ -0,0 +1,35 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from building.imports import import_readings, guess_format, FORMATS
+from building.models import Building
+
+
+class Command(BaseCommand):
+    help = "Imports the readings of the apartments' counters of a building from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('building', type=int, help="Id of the building.")
+        parser.add_argument('path', help="Path of the readings file.")
+        parser.add_argument('--format', choices=FORMATS, help="File format (detected from the extension by default).")
+        parser.add_argument('--period', help="Month of the readings as YYYY-MM (defaults to the current month).")
+
+    def handle(self, *args, **options):
+        try:
+            building = Building.objects.get(id=options['building'])
+        except Building.DoesNotExist:
+            raise CommandError(f"Building {options['building']} does not exist.")
+
+        try:
+            period = datetime.datetime.strptime(options['period'], '%Y-%m').date() if options['period'] else None
+        except ValueError:
+            raise CommandError("The period must be given as YYYY-MM.")
+
+        started = time.perf_counter()
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            report = import_readings(building, stream, options['format'] or guess_format(options['path']), period)
+        elapsed = time.perf_counter() - started
+
+        for line, message in report.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(f"{report} in {elapsed:.2f}s."))
@@ -0,0 +1,73 @@
+import glob
+import json
+import statistics
+from collections import defaultdict
+from django.core.management.base import BaseCommand, CommandError
+from building.management.commands.benchmark_views import percentile
+from building.profiling import profiling_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregates the request profiles written by the profiling middleware into latency percentiles, "
+        "query counts and N+1 occurrences per view."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Path of the profile log (defaults to PROFILING['LOG_FILE']).")
+        parser.add_argument('--rotated', action='store_true', help="Include the rotated log files.")
+        parser.add_argument('--sort', default='p95_ms', choices=('p50_ms', 'p95_ms', 'p99_ms', 'requests', 'queries_max'))
+        parser.add_argument('--output', help="Path of the JSON report.")
+
+    def handle(self, *args, **options):
+        path = options['file'] or profiling_settings()['LOG_FILE']
+        paths = sorted(glob.glob(f'{glob.escape(path)}.*')) + [path] if options['rotated'] else [path]
+
+        profiles = defaultdict(list)
+        for log_path in paths:
+            try:
+                with open(log_path) as log:
+                    for line in log:
+                        if line.strip():
+                            record = json.loads(line)
+                            profiles[record['view'] or record['path']].append(record)
+            except FileNotFoundError:
+                raise CommandError(f"No profile log found at {log_path}.")
+
+        if not profiles:
+            raise CommandError("The profile log is empty.")
+
+        report = {view: self.summarize(records) for view, records in profiles.items()}
+        views = sorted(report, key=lambda view: report[view][options['sort']], reverse=True)
+
+        self.stdout.write(
+            f"{'view':<36}{'requests':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'db p95':>10}"
+            f"{'tpl p95':>10}{'queries':>10}{'n+1':>6}"
+        )
+        for view in views:
+            stats = report[view]
+            self.stdout.write(
+                f"{view:<36}{stats['requests']:>10}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['db_p95_ms']:>10.2f}{stats['template_p95_ms']:>10.2f}"
+                f"{stats['queries_max']:>10}{stats['n_plus_one']:>6}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+    def summarize(self, records):
+        timings = [record['total_ms'] for record in records]
+        queries = [record['queries'] for record in records]
+        return {
+            'requests': len(records),
+            'p50_ms': round(percentile(timings, 0.50), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'db_p95_ms': round(percentile([record['db_ms'] for record in records], 0.95), 3),
+            'template_p95_ms': round(percentile([record['template_ms'] for record in records], 0.95), 3),
+            'queries_max': max(queries),
+            'queries_mean': round(statistics.mean(queries), 2),
+            'n_plus_one': sum(record['n_plus_one'] for record in records),
+        }
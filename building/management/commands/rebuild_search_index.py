@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from building.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the search index of the buildings, apartments and tenants from scratch. "
+        "Run it once after the search index migration and after restoring data written without signals."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        entries = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {entries} entries in {time.perf_counter() - started:.1f}s."))
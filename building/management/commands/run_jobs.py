@@ -0,0 +1,98 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from building.jobs import run_pending_jobs, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the background jobs (provisioning, billing, invoices, imports) with a pool of worker threads. "
+        "Several instances can run side by side, each job is claimed by a single worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker threads.")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls of an empty queue.")
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help="Seconds after which a running job is considered abandoned and requeued.")
+        parser.add_argument('--requeue-interval', type=float, default=60.0,
+                            help="Seconds between two looks for the jobs abandoned by stopped workers.")
+
+    def handle(self, *args, **options):
+        # the jobs invalidate the cached tables of their buildings, which a per-process cache
+        # would only do for this process, leaving the web processes serving stale pages
+        if isinstance(caches['default'], LocMemCache):
+            raise CommandError("The jobs need a cache shared with the web processes, not LocMemCache (see CACHES).")
+
+        self.stopping = threading.Event()
+
+        # SQLite has a single writer and fails transactions that wait for each other's locks,
+        # so its jobs run one at a time (use several workers with a client/server database)
+        self.job_lock = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+        name = f"{socket.gethostname()}:{os.getpid()}"
+
+        # the jobs abandoned by a crashed worker are requeued while this one runs, not only when it starts
+        self.stale_after = options['stale_after']
+        self.requeue_interval = options['requeue_interval']
+        self.requeue_lock = threading.Lock()
+        self.next_requeue = 0
+        self.requeue_abandoned()
+
+        self.stdout.write(f"Worker {name} started with {options['workers']} thread(s).")
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(self.work, f"{name}/{number}", options['once'], options['poll_interval'])
+                for number in range(options['workers'])
+            ]
+            try:
+                total = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                # the running jobs are finished before the threads exit
+                self.stopping.set()
+                total = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(f"Worker {name} stopped after {total} job(s)."))
+
+    def work(self, worker, once, poll_interval):
+        """
+        Claims and runs jobs until the queue is empty (with --once) or the command is stopped.
+        """
+
+        total = 0
+        try:
+            while not self.stopping.is_set():
+                self.requeue_abandoned()
+                with self.job_lock:
+                    count = run_pending_jobs(worker, limit=1)
+                total += count
+                if not count:
+                    if once:
+                        break
+                    self.stopping.wait(poll_interval)
+        finally:
+            # every thread opened its own database connection
+            connection.close()
+        return total
+
+    def requeue_abandoned(self):
+        """
+        Requeues the jobs of stopped workers, at most once per requeue interval across the threads.
+        """
+
+        with self.requeue_lock:
+            if time.monotonic() < self.next_requeue:
+                return
+            self.next_requeue = time.monotonic() + self.requeue_interval
+
+        with self.job_lock:
+            requeued = requeue_stale_jobs(self.stale_after)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} abandoned job(s).")
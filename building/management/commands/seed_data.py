@@ -0,0 +1,151 @@
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from building.billing import billing_period
+from building.cache import touch_buildings
+from building.models import CustomUser, Building, Utility, MainUtil
+from building.provisioning import default_utilities, provision_buildings
+from building.readings import record_readings, record_main_readings, shift_period
+from building.search import index_buildings
+from building.snapshots import refresh_buildings_snapshots
+from building.stats import refresh_buildings_stats
+from apartment.models import Apartment, Tenant, PowerSupply
+
+
+# password of every seeded user
+SEED_PASSWORD = 'seed-password-123'
+
+# readings recorded per batch
+READINGS_CHUNK_SIZE = 5000
+
+# monthly wage of the extra mutual utilities
+MUTUAL_UTILITIES = (
+    ('Cleaning', 150),
+    ('Lighting', 80),
+    ('Maintenance', 300),
+    ('Security', 500),
+)
+
+
+class Command(BaseCommand):
+    help = "Seeds the database with synthetic admins, buildings, utilities, tenants and readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admins', type=int, default=10, help="Number of admins, each with one building.")
+        parser.add_argument('--capacity', type=int, default=40, help="Apartments per building.")
+        parser.add_argument('--utilities', type=int, default=2, choices=range(len(MUTUAL_UTILITIES) + 1),
+                            help="Extra mutual utilities per building.")
+        parser.add_argument('--occupancy', type=float, default=0.8, help="Share of apartments with a tenant.")
+        parser.add_argument('--months', type=int, default=12, help="Months of readings history.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data sets.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        prefix = f"seed{int(time.time())}"
+        password = make_password(SEED_PASSWORD)
+
+        admins = self.create_users(prefix, 'admin', options['admins'], password)
+        buildings = self.create_buildings(admins, options['capacity'], options['utilities'], rng)
+        tenants = self.create_tenants(prefix, buildings, options['occupancy'], password, rng)
+        readings = self.create_readings(buildings, options['months'], rng)
+
+        building_ids = [building.id for building in buildings]
+        refresh_buildings_stats(building_ids)
+        refresh_buildings_snapshots(building_ids)
+        index_buildings(building_ids)
+        touch_buildings(*building_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(admins)} admins, {len(buildings)} buildings, {tenants} tenants and {readings} readings "
+            f"in {time.perf_counter() - started:.1f}s. Users are named {prefix}-admin-N / {prefix}-tenant-N, "
+            f"password '{SEED_PASSWORD}'."
+        ))
+
+    def create_users(self, prefix, role, count, password):
+        CustomUser.objects.bulk_create([
+            CustomUser(username=f"{prefix}-{role}-{number}", password=password, email=f"{role}{number}@example.com")
+            for number in range(count)
+        ])
+        return list(CustomUser.objects.filter(username__startswith=f"{prefix}-{role}-").order_by('id'))
+
+    def create_buildings(self, admins, capacity, utilities, rng):
+        # bulk inserts do not send the post_save signal, the buildings are provisioned together below
+        Building.objects.bulk_create([
+            Building(
+                admin=admin, street_name=f"Seed street {number}", street_number=number + 1, city='Timisoara',
+                county='Timis', postal_code='300000', apartments_capacity=capacity, has_elevator=number % 2 == 0,
+            )
+            for number, admin in enumerate(admins)
+        ])
+        buildings = list(Building.objects.filter(admin__in=admins).order_by('id'))
+
+        # the default utilities with a tariff and the extra mutual utilities
+        extra = []
+        for building in buildings:
+            tariff = rng.randint(2, 9)
+            for util in default_utilities(building):
+                if util.util_type == 'Individual':
+                    util.tax_or_wage = tariff
+                extra.append(util)
+            extra.extend(
+                Utility(name=name, provider='Private', util_type='Mutual', tax_or_wage=wage,
+                        tax_type=rng.random() < 0.5, building=building)
+                for name, wage in MUTUAL_UTILITIES[:utilities]
+            )
+        Utility.objects.bulk_create(extra)
+
+        # main counters, apartments and their links to the utilities
+        provision_buildings(buildings)
+        return buildings
+
+    def create_tenants(self, prefix, buildings, occupancy, password, rng):
+        apartments = [
+            apartment for apartment in Apartment.objects.filter(building__in=buildings).order_by('id')
+            if rng.random() < occupancy
+        ]
+        users = self.create_users(prefix, 'tenant', len(apartments), password)
+
+        Tenant.objects.bulk_create([
+            Tenant(user=user, first_name='Tenant', last_name=str(number), email=user.email,
+                   phone=f"07{number:08d}")
+            for number, user in enumerate(users)
+        ])
+        tenants = Tenant.objects.filter(user__in=users).order_by('user_id')
+
+        for apartment, tenant in zip(apartments, tenants):
+            apartment.tenant = tenant
+            apartment.num_of_persons = rng.randint(1, 5)
+        Apartment.objects.bulk_update(apartments, ['tenant', 'num_of_persons'], batch_size=500)
+        return len(apartments)
+
+    def create_readings(self, buildings, months, rng):
+        supplies = list(PowerSupply.objects.filter(apartment__building__in=buildings).values_list('id', flat=True))
+        counters = list(MainUtil.objects.filter(util__building__in=buildings).values_list('id', flat=True))
+        indexes = dict.fromkeys(supplies, 0)
+        main_indexes = dict.fromkeys(counters, 0)
+
+        current = billing_period()
+        for month in range(months, 0, -1):
+            period = shift_period(current, -month)
+            for supply_id in indexes:
+                indexes[supply_id] += rng.randint(0, 30)
+            for counter_id in main_indexes:
+                main_indexes[counter_id] += rng.randint(100, 1000)
+            items = list(indexes.items())
+            for start in range(0, len(items), READINGS_CHUNK_SIZE):
+                record_readings(items[start:start + READINGS_CHUNK_SIZE], period)
+            record_main_readings(main_indexes.items(), period)
+
+        PowerSupply.objects.bulk_update(
+            [PowerSupply(id=supply_id, index_counter=index) for supply_id, index in indexes.items()],
+            ['index_counter'], batch_size=500,
+        )
+        MainUtil.objects.bulk_update(
+            [MainUtil(id=counter_id, index_counter=index) for counter_id, index in main_indexes.items()],
+            ['index_counter'], batch_size=500,
+        )
+        return len(indexes) * months
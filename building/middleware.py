@@ -0,0 +1,106 @@
+import asyncio
+import random
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.functional import SimpleLazyObject
+from building.cache import get_admin_building
+from building.profiling import (
+    RequestProfile, current_profile, install_profiling, profiling_settings, server_timing, write_record,
+)
+
+
+# session key of the building selected with the building switcher
+SELECTED_BUILDING_KEY = 'selected_building_id'
+
+
+def get_current_building(request):
+    """
+    Returns the building selected by the logged in admin (his first building until he picks one
+    with the building switcher), resolved at most once per request.
+    """
+    if not hasattr(request, '_cached_building'):
+        request._cached_building = get_admin_building(request.user, request.session.get(SELECTED_BUILDING_KEY))
+    return request._cached_building
+
+
+def select_building(request, building):
+    """
+    Makes the given building of the logged in admin the one every admin page is scoped to.
+    """
+    request.session[SELECTED_BUILDING_KEY] = building.id
+    request._cached_building = building
+
+
+class CurrentBuildingMiddleware:
+    """
+    Adds a lazy `request.building` attribute holding the building selected by the logged user.
+    Must be placed after the session and authentication middleware.
+    The middleware supports both the WSGI and the ASGI handlers, so async views are not run through
+    a sync adapter. Async code must resolve the building with `sync_to_async(get_current_building)`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # lets the handler detect the middleware as a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        request.building = SimpleLazyObject(lambda: get_current_building(request))
+        # with an async handler the coroutine of the next middleware is returned to be awaited
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles every request: wall time, template render time, number and duration of the SQL queries
+    and duplicated queries (N+1 patterns). Adds a Server-Timing header to the responses and writes
+    a sample of the requests to a rotating JSON Lines log, summarized by the profile_report command.
+    Opt-in: the middleware is dropped from the chain unless `PROFILING['ENABLED']` is set. It should be
+    placed first, so the time spent in the other middleware is measured too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.options = profiling_settings()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed()
+        install_profiling(self.options)
+
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # lets the handler detect the middleware as a coroutine function
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.profile_async(request)
+
+        profile = RequestProfile(request)
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(profile, response)
+
+    async def profile_async(self, request):
+        profile = RequestProfile(request)
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(profile, response)
+
+    def finish(self, profile, response):
+        record = profile.record(response, self.options)
+        response['Server-Timing'] = server_timing(record)
+        if record['slow_queries'] or random.random() < self.options['SAMPLE_RATE']:
+            write_record(record)
+        return response
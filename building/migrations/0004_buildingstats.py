@@ -0,0 +1,52 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def compute_stats(apps, schema_editor):
+    Building = apps.get_model('building', 'Building')
+    BuildingStats = apps.get_model('building', 'BuildingStats')
+    MainUtil = apps.get_model('building', 'MainUtil')
+    Apartment = apps.get_model('apartment', 'Apartment')
+
+    for building_id in Building.objects.values_list('id', flat=True):
+        totals = Apartment.objects.filter(building_id=building_id).aggregate(
+            apartments=Count('id'),
+            occupied=Count('id', filter=Q(num_of_persons__gt=0)),
+            unpaid=Count('id', filter=Q(payment_status=False)),
+            debt=Sum('debt'),
+        )
+        BuildingStats.objects.create(
+            building_id=building_id,
+            occupied_apts=totals['occupied'],
+            available_apts=totals['apartments'] - totals['occupied'],
+            unpaid_apts=totals['unpaid'],
+            total_debt=totals['debt'] or 0,
+            counters_set=MainUtil.objects.filter(util__building_id=building_id).exclude(index_counter=0).exists(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0003_auto_20210629_1255'),
+        ('apartment', '0002_auto_20210629_1431'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BuildingStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occupied_apts', models.IntegerField(default=0)),
+                ('available_apts', models.IntegerField(default=0)),
+                ('unpaid_apts', models.IntegerField(default=0)),
+                ('total_debt', models.FloatField(default=0)),
+                ('counters_set', models.BooleanField(default=False)),
+                ('building', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='building.building')),
+            ],
+        ),
+        migrations.RunPython(compute_stats, migrations.RunPython.noop),
+    ]
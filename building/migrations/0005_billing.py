@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0004_buildingstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='billed_period',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mainutil',
+            name='billed_counter',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0005_billing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MainMeterReading',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('index_counter', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('counter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='building.mainutil')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='mainmeterreading',
+            index=models.Index(fields=['counter', 'period'], name='building_ma_counter_925efd_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0006_meter_readings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utility',
+            index=models.Index(fields=['building', 'util_type'], name='building_ut_buildin_1dc979_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mainutil',
+            constraint=models.UniqueConstraint(fields=('util',), name='unique_main_counter_per_utility'),
+        ),
+    ]
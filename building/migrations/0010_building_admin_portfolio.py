@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='building',
+            name='admin',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# SQLite: an FTS5 index over the content of the entries, kept in sync by triggers, with prefix
+# indexes for the short prefixes typed first
+SQLITE_FORWARD = (
+    """
+    CREATE VIRTUAL TABLE building_searchentry_fts USING fts5(
+        content, content='building_searchentry', content_rowid='id', tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER building_searchentry_ai AFTER INSERT ON building_searchentry BEGIN
+        INSERT INTO building_searchentry_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER building_searchentry_ad AFTER DELETE ON building_searchentry BEGIN
+        INSERT INTO building_searchentry_fts(building_searchentry_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER building_searchentry_au AFTER UPDATE ON building_searchentry BEGIN
+        INSERT INTO building_searchentry_fts(building_searchentry_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO building_searchentry_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+)
+
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS building_searchentry_au',
+    'DROP TRIGGER IF EXISTS building_searchentry_ad',
+    'DROP TRIGGER IF EXISTS building_searchentry_ai',
+    'DROP TABLE IF EXISTS building_searchentry_fts',
+)
+
+# Postgres: a GIN index over the text search vector of the content and a trigram index for substrings
+POSTGRES_FORWARD = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX building_searchentry_vector ON building_searchentry USING GIN (to_tsvector('simple', content))",
+    'CREATE INDEX building_searchentry_trigram ON building_searchentry USING GIN (content gin_trgm_ops)',
+)
+
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS building_searchentry_trigram',
+    'DROP INDEX IF EXISTS building_searchentry_vector',
+)
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0010_building_admin_portfolio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('building', 'Building'), ('apartment', 'Apartment'), ('tenant', 'Tenant')], max_length=10)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('content', models.TextField()),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='building.building')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_entry'),
+        ),
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run_statements({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-18 15:20
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def recompute_debts(apps, schema_editor):
+    """
+    Recounts the unpaid apartments and the debt of every building from the ledger balances.
+    """
+    BuildingStats = apps.get_model('building', 'BuildingStats')
+    Apartment = apps.get_model('apartment', 'Apartment')
+
+    totals = {row['building_id']: row for row in Apartment.objects.values('building_id').annotate(
+        unpaid=Count('id', filter=Q(balance__gt=0)),
+        debt=Sum('balance', filter=Q(balance__gt=0)),
+    ).order_by()}
+
+    for stats in BuildingStats.objects.all():
+        row = totals.get(stats.building_id, {'unpaid': 0, 'debt': 0})
+        stats.unpaid_apts, stats.total_debt = row['unpaid'], row['debt'] or 0
+        stats.save(update_fields=['unpaid_apts', 'total_debt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('building', '0012_documents'),
+        ('apartment', '0008_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='buildingstats',
+            name='total_debt',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(recompute_debts, migrations.RunPython.noop),
+    ]
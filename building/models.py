@@ -1,5 +1,7 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -12,10 +14,11 @@ class CustomUser(AbstractUser):
 class Building(models.Model):
     """
     Main app model.
-    Model takes a one to one relationship with a user who has group of administrator.
+    Model belongs to a user who has group of administrator; a property manager administrates
+    a portfolio of many buildings.
     """
 
-    admin               = models.OneToOneField(CustomUser, null=True, blank=True, on_delete=models.CASCADE)
+    admin               = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.CASCADE)
     street_name         = models.CharField(max_length=100, null=True)
     street_number       = models.PositiveIntegerField()
     city                = models.CharField(max_length=100, null=True)
@@ -24,7 +27,9 @@ class Building(models.Model):
     apartments_capacity = models.PositiveIntegerField()
     has_elevator        = models.BooleanField(default=False)
 
-    # TODO add new field for files/documents/pdfs
+    # first day of the last month billed by the billing engine
+    billed_period       = models.DateField(null=True, blank=True)
+    updated_at          = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"<{self.street_name}, {self.street_number}>"
@@ -62,6 +67,12 @@ class Utility(models.Model):
     tax_or_wage     = models.FloatField(default=0, null=True)
     tax_type        = models.BooleanField(null=True, choices=TAX_TYPE)
     building        = models.ForeignKey(Building, on_delete=models.CASCADE)
+    updated_at      = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['building', 'util_type']),
+        ]
 
     def __str__(self):
         return f"{self.name}: {self.building}"
@@ -69,10 +80,207 @@ class Utility(models.Model):
 
 class MainUtil(models.Model):
     """
+    Defines the main counter of an individual utility, measuring the consumption of the whole building.
     """
 
     util = models.ForeignKey(Utility, on_delete=models.CASCADE)
     index_counter = models.PositiveIntegerField(default=0, null=True)
 
+    # index of the main counter at the last billing run
+    billed_counter = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['util'], name='unique_main_counter_per_utility'),
+        ]
+
+    def __str__(self):
+        return f"<{self.util.name}[{self.util.building}]>"
+
+
+class MainMeterReading(models.Model):
+    """
+    Append-only history of the readings of a building's main counter.
+    """
+
+    counter         = models.ForeignKey(MainUtil, on_delete=models.CASCADE)
+    period          = models.DateField()
+    index_counter   = models.PositiveIntegerField()
+    created_at      = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['counter', 'period']),
+        ]
+
+    def __str__(self):
+        return f"<Main reading {self.index_counter}[{self.counter_id}, {self.period}]>"
+
+class BuildingStats(models.Model):
+    """
+    Denormalized summary of a building's apartments and main counters. The row is kept up to date
+    by the signals in `building.signals`, so the dashboard reads it in constant time.
+    """
+
+    building        = models.OneToOneField(Building, on_delete=models.CASCADE, related_name='stats')
+    occupied_apts   = models.IntegerField(default=0)
+    available_apts  = models.IntegerField(default=0)
+    unpaid_apts     = models.IntegerField(default=0)
+    total_debt      = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    counters_set    = models.BooleanField(default=False)
+
     def __str__(self):
-        return f"<{self.util.name}[{self.util.building}]>"
\ No newline at end of file
+        return f"<Stats {self.building}>"
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database and run by the `run_jobs` worker command, so that slow
+    work (provisioning, billing, imports) does not block the web requests.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE    = 'done'
+    FAILED  = 'failed'
+
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    kind        = models.CharField(max_length=50)
+    building    = models.ForeignKey(Building, null=True, blank=True, on_delete=models.CASCADE)
+    payload     = models.JSONField(default=dict, blank=True)
+    status      = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    result      = models.JSONField(null=True, blank=True)
+    error       = models.TextField(blank=True)
+    attempts    = models.PositiveIntegerField(default=0)
+    worker      = models.CharField(max_length=100, blank=True)
+    # a failed job is retried once this time has passed
+    run_after   = models.DateTimeField(default=timezone.now)
+    created_at  = models.DateTimeField(auto_now_add=True)
+    started_at  = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the workers claim the oldest pending job
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['building', 'kind', 'status']),
+        ]
+
+    def __str__(self):
+        return f"<Job {self.kind}[{self.id}, {self.status}]>"
+
+
+class SearchEntry(models.Model):
+    """
+    Row of the search index: the searchable text of a building, an apartment or a tenant, scoped
+    to the building it belongs to. The rows are maintained by `building.search` and matched through
+    the full-text index of the database (see the 0011_search_index migration).
+    """
+
+    BUILDING    = 'building'
+    APARTMENT   = 'apartment'
+    TENANT      = 'tenant'
+
+    KINDS = (
+        (BUILDING, 'Building'),
+        (APARTMENT, 'Apartment'),
+        (TENANT, 'Tenant'),
+    )
+
+    kind        = models.CharField(max_length=10, choices=KINDS)
+    object_id   = models.PositiveIntegerField()
+    building    = models.ForeignKey(Building, on_delete=models.CASCADE)
+    title       = models.CharField(max_length=200)
+    content     = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_entry'),
+        ]
+
+    def __str__(self):
+        return f"<Search entry {self.kind}[{self.object_id}]>"
+
+
+class StoredFile(models.Model):
+    """
+    Content of an uploaded file, stored once under DOCUMENTS_ROOT whatever the number of documents
+    holding the same bytes (looked up by the SHA-256 of the content).
+    """
+
+    sha256          = models.CharField(max_length=64, unique=True)
+    size            = models.PositiveBigIntegerField()
+    content_type    = models.CharField(max_length=100)
+    # relative to DOCUMENTS_ROOT
+    path            = models.CharField(max_length=200)
+    created_at      = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"<File {self.sha256[:12]}[{self.size}]>"
+
+
+class Document(models.Model):
+    """
+    File shared with the tenants of a building, or with the tenant of a single apartment
+    (invoices, contracts...).
+    """
+
+    INVOICE     = 'invoice'
+    CONTRACT    = 'contract'
+    OTHER       = 'other'
+
+    KINDS = (
+        (INVOICE, 'Invoice'),
+        (CONTRACT, 'Contract'),
+        (OTHER, 'Other'),
+    )
+
+    building        = models.ForeignKey(Building, on_delete=models.CASCADE)
+    apartment       = models.ForeignKey('apartment.Apartment', null=True, blank=True, on_delete=models.CASCADE)
+    kind            = models.CharField(max_length=10, choices=KINDS, default=OTHER)
+    name            = models.CharField(max_length=255)
+    file            = models.ForeignKey(StoredFile, on_delete=models.PROTECT)
+    # month an invoice was issued for
+    period          = models.DateField(null=True, blank=True)
+    uploaded_by     = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at      = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['building', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"<Document {self.name}[{self.building_id}]>"
+
+
+class UploadSession(models.Model):
+    """
+    Resumable upload of a document, received in chunks appended to a partial file. The client
+    asks for `received` to resume an interrupted upload; the document is created with the last chunk.
+    """
+
+    token           = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    building        = models.ForeignKey(Building, on_delete=models.CASCADE)
+    apartment       = models.ForeignKey('apartment.Apartment', null=True, blank=True, on_delete=models.CASCADE)
+    kind            = models.CharField(max_length=10, choices=Document.KINDS, default=Document.OTHER)
+    name            = models.CharField(max_length=255)
+    size            = models.PositiveBigIntegerField()
+    received        = models.PositiveBigIntegerField(default=0)
+    # optional SHA-256 announced by the client, checked once the upload is complete
+    sha256          = models.CharField(max_length=64, blank=True)
+    document        = models.ForeignKey(Document, null=True, blank=True, on_delete=models.SET_NULL)
+    uploaded_by     = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at      = models.DateTimeField(auto_now_add=True)
+    updated_at      = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"<Upload {self.name}[{self.received}/{self.size}]>"
+
@@ -0,0 +1,21 @@
+"""
+Monthly periods: readings, rollups and bills are keyed by the first day of their month.
+"""
+
+import datetime
+
+
+def billing_period(date=None):
+    """
+    Returns the first day of the month of the given date (today by default).
+    """
+    date = date or datetime.date.today()
+    return date.replace(day=1)
+
+
+def shift_period(period, months):
+    """
+    Returns the first day of the month `months` away from the given period.
+    """
+    month = period.year * 12 + period.month - 1 + months
+    return period.replace(year=month // 12, month=month % 12 + 1, day=1)
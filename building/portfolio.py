@@ -0,0 +1,36 @@
+from collections import namedtuple
+from django.db.models import Count, Q, Sum
+from apartment.models import Apartment
+
+
+# one row of the portfolio dashboard: a building and the totals of its apartments
+PortfolioRow = namedtuple('PortfolioRow', ['building', 'apartments', 'occupied', 'available', 'unpaid', 'debt'])
+
+
+def portfolio_summary(buildings):
+    """
+    Returns the occupancy, debt and unpaid apartments of each of the given buildings, followed by
+    the totals of the whole portfolio. Every building is summarized by the same grouped query,
+    whatever the size of the portfolio.
+    """
+
+    totals = {row['building']: row for row in Apartment.objects.filter(
+        building__in=[building.id for building in buildings]
+    ).values('building').annotate(
+        apartments=Count('id'),
+        occupied=Count('id', filter=Q(num_of_persons__gt=0)),
+        unpaid=Count('id', filter=Q(balance__gt=0)),
+        debt=Sum('balance', filter=Q(balance__gt=0)),
+    ).order_by()}
+
+    rows = []
+    for building in buildings:
+        # buildings still being provisioned have no apartments yet
+        row = totals.get(building.id, {'apartments': 0, 'occupied': 0, 'unpaid': 0, 'debt': 0})
+        rows.append(PortfolioRow(
+            building, row['apartments'], row['occupied'], row['apartments'] - row['occupied'],
+            row['unpaid'], row['debt'] or 0,
+        ))
+
+    total = PortfolioRow(None, *(sum(getattr(row, field) for row in rows) for field in PortfolioRow._fields[1:]))
+    return rows, total
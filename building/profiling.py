@@ -0,0 +1,189 @@
+"""
+Per request profiling, enabled with `PROFILING['ENABLED']` (see `ProfilingMiddleware`).
+
+While a request is profiled, its `RequestProfile` is kept in a context variable, which `sync_to_async`
+copies to its worker threads. Every database connection gets an execute wrapper that times the
+queries of the current profile, including the ones run concurrently by the async views on the
+connections of other threads, and the template engine times the outermost template render.
+Nothing is recorded outside a profiled request.
+
+Queries are grouped by their SQL text (parameters are sent apart), so a statement repeated within
+a request, typically an N+1 pattern in a loop, is reported as a duplicate.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+from collections import Counter
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from django.utils import timezone
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    # share of the requests written to the log (requests with slow queries are always written)
+    'SAMPLE_RATE': 1.0,
+    'LOG_FILE': 'profile.jsonl',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+    # queries slower than this are written with their SQL
+    'SLOW_QUERY_MS': 100,
+    # a statement run this many times in one request is reported as an N+1 pattern
+    'DUPLICATE_QUERIES': 3,
+}
+
+# longest SQL text kept in a record
+MAX_SQL_LENGTH = 300
+
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+logger = logging.getLogger('building.profiling')
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+class RequestProfile:
+    """
+    Timings collected while a request is served. Durations are in seconds.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.started = time.perf_counter()
+        self.queries = []
+        self.template_time = 0
+        self.rendering = False
+
+    def add_query(self, sql, duration):
+        self.queries.append((sql, duration))
+
+    def record(self, response, options):
+        """
+        Returns the JSON serializable summary of the profiled request.
+        """
+
+        total = time.perf_counter() - self.started
+        counts = Counter(sql for sql, _ in self.queries)
+        duplicates = [(sql, count) for sql, count in counts.most_common() if count > 1]
+        slow = [
+            {'sql': sql[:MAX_SQL_LENGTH], 'ms': round(duration * 1000, 3)}
+            for sql, duration in self.queries if duration * 1000 >= options['SLOW_QUERY_MS']
+        ]
+        match = self.request.resolver_match
+
+        return {
+            'time': timezone.now().isoformat(),
+            'method': self.request.method,
+            'path': self.request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'db_ms': round(sum(duration for _, duration in self.queries) * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'queries': len(self.queries),
+            'duplicate_queries': sum(count - 1 for _, count in duplicates),
+            'n_plus_one': bool(duplicates) and duplicates[0][1] >= options['DUPLICATE_QUERIES'],
+            'duplicates': [{'sql': sql[:MAX_SQL_LENGTH], 'count': count} for sql, count in duplicates[:5]],
+            'slow_queries': slow,
+        }
+
+
+def server_timing(record):
+    """
+    Returns the Server-Timing header value of a profiled request, shown by the browsers' dev tools.
+    """
+    return ', '.join((
+        f'db;dur={record["db_ms"]};desc="{record["queries"]} queries, {record["duplicate_queries"]} duplicated"',
+        f'tpl;dur={record["template_ms"]};desc="Templates"',
+        f'total;dur={record["total_ms"]};desc="Total"',
+    ))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing the queries of the profiled request, if any.
+    """
+
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_template_timer():
+    """
+    Wraps the template render method so the outermost render of a profiled request is timed
+    (included templates are part of it).
+    """
+
+    if getattr(Template.render, 'profiled', False):
+        return
+    render = Template.render
+
+    @wraps(render)
+    def timed_render(self, context):
+        profile = current_profile.get()
+        if profile is None or profile.rendering:
+            return render(self, context)
+
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_time += time.perf_counter() - started
+            profile.rendering = False
+
+    timed_render.profiled = True
+    Template.render = timed_render
+
+
+def install_profiling(options):
+    """
+    Installs the query and template instrumentation and the rotating JSON Lines log.
+    Called once, when the profiling middleware is loaded.
+    """
+
+    # connections opened later by any thread, and the ones already open in this thread
+    connection_created.connect(install_query_recorder, dispatch_uid='building.profiling')
+    for connection in connections.all():
+        install_query_recorder(connection=connection)
+    install_template_timer()
+
+    # the log file may change between the loads of the middleware (e.g. in the tests)
+    path = os.path.abspath(options['LOG_FILE'])
+    for handler in list(logger.handlers):
+        if handler.baseFilename != path:
+            logger.removeHandler(handler)
+            handler.close()
+
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=options['MAX_BYTES'], backupCount=options['BACKUP_COUNT'])
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def write_record(record):
+    logger.info(json.dumps(record))
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from building.models import Utility, MainUtil
+from building.cache import touch_buildings
+from building.search import index_buildings
+from building.snapshots import refresh_buildings_snapshots
+from building.stats import refresh_building_stats, refresh_buildings_stats
+from apartment.models import Apartment, PowerSupply, MutualUtility, MeterReading, MonthlyConsumption
+
+
+# default utils used independently by each building: (name, provider, util_type)
+DEFAULT_UTILITIES = (
+    ('Cold Water', 'City', 'Individual'),
+    ('Hot Water', 'City', 'Individual'),
+    ('Gas Power', 'City', 'Individual'),
+    ('Heating Power', 'City', 'Individual'),
+)
+
+# individual utility that is switched on for every new apartment
+ACTIVE_BY_DEFAULT = 'Cold Water'
+
+
+def default_utilities(building):
+    """
+    Returns the unsaved utility objects every new building starts with.
+    """
+    utilities = [
+        Utility(name=name, provider=provider, util_type=util_type, building=building)
+        for name, provider, util_type in DEFAULT_UTILITIES
+    ]
+    if building.has_elevator:
+        utilities.append(Utility(name='Elevator', provider='Private', building=building, util_type='Mutual'))
+    return utilities
+
+
+def link_apartments(apartment_ids, utilities):
+    """
+    Creates the missing power supplies (individual utilities) and mutual utilities for the given
+    apartments. Pairs that are already linked are skipped, so the function can be called repeatedly.
+    Runs a fixed number of queries regardless of the number of apartments.
+
+    `apartment_ids` may be a list or a `values_list` queryset; a queryset is used as a sub-select
+    so large buildings do not hit the database's limit on query parameters.
+    """
+
+    lookup          = apartment_ids
+    apartment_ids   = list(apartment_ids)
+    individual      = [util for util in utilities if util.util_type == 'Individual']
+    mutual          = [util for util in utilities if util.util_type != 'Individual']
+
+    if not apartment_ids or not utilities:
+        return
+
+    linked_supplies = set(PowerSupply.objects.filter(
+        apartment_id__in=lookup, utility__in=individual
+    ).values_list('apartment_id', 'utility_id')) if individual else set()
+
+    linked_mutuals = set(MutualUtility.objects.filter(
+        apartment_id__in=lookup, utility__in=mutual
+    ).values_list('apartment_id', 'utility_id')) if mutual else set()
+
+    PowerSupply.objects.bulk_create([
+        PowerSupply(apartment_id=apt_id, utility=util, status=util.name == ACTIVE_BY_DEFAULT)
+        for apt_id in apartment_ids
+        for util in individual
+        if (apt_id, util.id) not in linked_supplies
+    ])
+
+    MutualUtility.objects.bulk_create([
+        MutualUtility(apartment_id=apt_id, utility=util)
+        for apt_id in apartment_ids
+        for util in mutual
+        if (apt_id, util.id) not in linked_mutuals
+    ])
+
+
+def provision_building(building):
+    """
+    Builds the whole object graph of a building: default utilities, main counters, apartments
+    up to the building's capacity and the per apartment power supplies / mutual utilities.
+
+    Objects that already exist are left untouched, which makes the function safe to call again
+    (e.g. from the admin after raising the apartments capacity).
+    """
+    provision_buildings([building])
+
+
+@transaction.atomic
+def provision_buildings(buildings):
+    """
+    Provisions a batch of buildings together (see `provision_building`).
+
+    Everything is written with bulk inserts inside a single transaction, so the number of queries
+    depends neither on the size nor on the number of the buildings.
+    """
+
+    buildings       = list(buildings)
+    building_ids    = [building.id for building in buildings]
+
+    if not buildings:
+        return
+
+    utilities = defaultdict(list)
+    for util in Utility.objects.filter(building_id__in=building_ids):
+        utilities[util.building_id].append(util)
+
+    missing = [building for building in buildings if not utilities[building.id]]
+    if missing:
+        Utility.objects.bulk_create([util for building in missing for util in default_utilities(building)])
+        for util in Utility.objects.filter(building__in=missing):
+            utilities[util.building_id].append(util)
+
+    # each individual utility gets a main counter for the whole building
+    counted = set(MainUtil.objects.filter(util__building_id__in=building_ids).values_list('util_id', flat=True))
+    MainUtil.objects.bulk_create([
+        MainUtil(util=util) for building_id in building_ids for util in utilities[building_id]
+        if util.util_type == 'Individual' and util.id not in counted
+    ])
+
+    # create the apartments that are missing from the buildings' capacity
+    existing = set(Apartment.objects.filter(building_id__in=building_ids).values_list('building_id', 'number_id'))
+    Apartment.objects.bulk_create([
+        Apartment(number_id=number, building=building)
+        for building in buildings
+        for number in range(1, building.apartments_capacity + 1)
+        if (building.id, number) not in existing
+    ])
+
+    # the apartments and links of the batch are read with sub-selects, so large batches do not hit
+    # the database's limit on query parameters
+    apartments = Apartment.objects.filter(building_id__in=building_ids)
+    linked_supplies = set(PowerSupply.objects.filter(apartment__in=apartments).values_list('apartment_id', 'utility_id'))
+    linked_mutuals = set(MutualUtility.objects.filter(apartment__in=apartments).values_list('apartment_id', 'utility_id'))
+
+    supplies, mutuals = [], []
+    for apt_id, building_id in apartments.values_list('id', 'building_id'):
+        for util in utilities[building_id]:
+            if util.util_type == 'Individual' and (apt_id, util.id) not in linked_supplies:
+                supplies.append(PowerSupply(apartment_id=apt_id, utility=util, status=util.name == ACTIVE_BY_DEFAULT))
+            elif util.util_type != 'Individual' and (apt_id, util.id) not in linked_mutuals:
+                mutuals.append(MutualUtility(apartment_id=apt_id, utility=util))
+    PowerSupply.objects.bulk_create(supplies)
+    MutualUtility.objects.bulk_create(mutuals)
+
+    # bulk inserts bypass the signals that maintain the stats rows, the snapshots, the search index
+    # and the cached tables
+    refresh_buildings_stats(building_ids)
+    refresh_buildings_snapshots(building_ids)
+    index_buildings(building_ids)
+    touch_buildings(*building_ids)
+
+
+def remove_supplies(utility):
+    """
+    Removes the power supplies of a utility together with their readings history, with one DELETE
+    per table. The supplies are deleted with plain SQL: a queryset delete would load every row to send
+    its delete signals, which only rebuild the snapshots and tables that the caller refreshes once.
+    """
+
+    MeterReading.objects.filter(supply__utility=utility).delete()
+    MonthlyConsumption.objects.filter(utility=utility).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {PowerSupply._meta.db_table} WHERE utility_id = %s", [utility.id])
+
+
+@transaction.atomic
+def propagate_utility(utility):
+    """
+    Links a new utility, or one whose type changed, to every apartment of its building: an individual
+    utility gets a power supply per apartment and a main counter, a mutual one a mutual utility row
+    per apartment. The rows of the other type are removed.
+
+    Rows are created and removed with set-based queries, so the number of queries does not depend
+    on the building size, and rows that already exist are left untouched, so the function is idempotent.
+    """
+
+    apartment_ids = Apartment.objects.filter(building_id=utility.building_id).values_list('id', flat=True)
+
+    if utility.util_type == 'Individual':
+        MutualUtility.objects.filter(utility=utility).delete()
+        if not MainUtil.objects.filter(util=utility).exists():
+            MainUtil.objects.bulk_create([MainUtil(util=utility)])
+    else:
+        remove_supplies(utility)
+        MainUtil.objects.filter(util=utility).delete()
+
+    link_apartments(apartment_ids, [utility])
+
+    # bulk writes bypass the signals that maintain the stats row, the snapshots and the cached tables
+    refresh_building_stats(utility.building_id)
+    refresh_buildings_snapshots([utility.building_id])
+    touch_buildings(utility.building_id)
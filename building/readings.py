@@ -0,0 +1,133 @@
+"""
+Meter readings history.
+
+Every reading of an apartment counter is appended to `MeterReading` and rolled up per month into
+`MonthlyConsumption` (last index of the month and consumption since the previous month). Readings
+are written in bulk and the rollup is maintained with a fixed number of queries per batch, so range
+queries such as the consumption of the last 12 months read a handful of rows per apartment.
+"""
+
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from building.models import MainMeterReading
+from building.periods import billing_period, shift_period
+from apartment.models import PowerSupply, MeterReading, MonthlyConsumption
+
+
+# number of rows inserted by a single INSERT statement
+READINGS_BATCH_SIZE = 1000
+
+
+@transaction.atomic
+def record_readings(readings, period=None):
+    """
+    Appends readings of apartment counters to the history and updates the monthly rollup.
+
+    readings:   iterable of (power supply id, index counter); the last reading of a supply wins
+    period:     month of the readings (current month by default)
+
+    Returns the number of recorded readings.
+    """
+
+    period = billing_period(period)
+    readings = dict(readings)
+    if not readings:
+        return 0
+
+    MeterReading.objects.bulk_create([
+        MeterReading(supply_id=supply_id, period=period, index_counter=index)
+        for supply_id, index in readings.items()
+    ], batch_size=READINGS_BATCH_SIZE)
+
+    update_rollups(readings, period)
+    return len(readings)
+
+
+def update_rollups(readings, period):
+    """
+    Writes the monthly rollup of the given readings. The consumption is computed against the
+    last index of the previous rolled up month; when a past month is corrected, the consumption
+    of the month that follows it is recomputed too.
+    """
+
+    previous = MonthlyConsumption.objects.filter(
+        supply_id=OuterRef('id'), period__lt=period
+    ).order_by('-period').values('index_counter')[:1]
+
+    following = MonthlyConsumption.objects.filter(
+        supply_id=OuterRef('id'), period__gt=period
+    ).order_by('period').values('id')[:1]
+
+    supplies = PowerSupply.objects.filter(id__in=list(readings)).annotate(
+        previous_index=Subquery(previous), following_id=Subquery(following)
+    ).values_list('id', 'apartment_id', 'utility_id', 'previous_index', 'following_id')
+
+    existing = {
+        rollup.supply_id: rollup
+        for rollup in MonthlyConsumption.objects.filter(supply_id__in=list(readings), period=period)
+    }
+
+    to_create, to_update, followers = [], [], {}
+    for supply_id, apartment_id, utility_id, previous_index, following_id in supplies:
+        index = readings[supply_id]
+        consumption = max(index - previous_index, 0) if previous_index is not None else 0
+
+        rollup = existing.get(supply_id)
+        if rollup is None:
+            to_create.append(MonthlyConsumption(
+                supply_id=supply_id, apartment_id=apartment_id, utility_id=utility_id,
+                period=period, index_counter=index, consumption=consumption,
+            ))
+        else:
+            rollup.index_counter, rollup.consumption = index, consumption
+            to_update.append(rollup)
+
+        if following_id is not None:
+            followers[following_id] = index
+
+    MonthlyConsumption.objects.bulk_create(to_create, batch_size=READINGS_BATCH_SIZE)
+    MonthlyConsumption.objects.bulk_update(to_update, ['index_counter', 'consumption'], batch_size=READINGS_BATCH_SIZE)
+
+    if followers:
+        corrected = list(MonthlyConsumption.objects.filter(id__in=list(followers)))
+        for rollup in corrected:
+            rollup.consumption = max(rollup.index_counter - followers[rollup.id], 0)
+        MonthlyConsumption.objects.bulk_update(corrected, ['consumption'], batch_size=READINGS_BATCH_SIZE)
+
+
+def record_main_readings(readings, period=None):
+    """
+    Appends readings of building main counters to the history.
+
+    readings:   iterable of (main util id, index counter)
+    """
+
+    period = billing_period(period)
+    created = MainMeterReading.objects.bulk_create([
+        MainMeterReading(counter_id=counter_id, period=period, index_counter=index)
+        for counter_id, index in readings
+    ], batch_size=READINGS_BATCH_SIZE)
+    return len(created)
+
+
+def consumption_history(apartment_ids, months=12, until=None):
+    """
+    Returns the monthly consumption of the given apartments over the last `months` months
+    (up to and including the month of `until`), read from the monthly rollup.
+
+    Result: dict of apartment id -> list of (period, utility id, consumption), ordered by period.
+    """
+
+    until = billing_period(until)
+    since = shift_period(until, -months)
+
+    history = defaultdict(list)
+    for apartment_id, period, utility_id, consumption in MonthlyConsumption.objects.filter(
+        apartment_id__in=apartment_ids, period__gt=since, period__lte=until
+    ).order_by('apartment_id', 'period', 'utility_id').values_list(
+        'apartment_id', 'period', 'utility_id', 'consumption'
+    ):
+        history[apartment_id].append((period, utility_id, consumption))
+
+    return history
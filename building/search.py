@@ -0,0 +1,248 @@
+"""
+Search over the buildings, apartments and tenants of a portfolio.
+
+Every searchable object is stored as a `SearchEntry` row holding its display title and its searchable
+text, scoped to its building. The rows are rewritten by the signals whenever one of the indexed fields
+changes, and by the bulk services (provisioning, seeding) after they bypass the signals.
+
+The entries are matched through the full-text index of the database, created by the 0011_search_index
+migration: an FTS5 table kept in sync by triggers on SQLite, a GIN index over the text search vector
+(and a trigram index for substrings) on Postgres. Every term of the query is matched as a prefix.
+Note that SQLite drops the triggers whenever a migration rebuilds the `building_searchentry` table:
+such a migration has to create them again.
+
+Results are ordered by relevance and paginated by keyset on (rank, id), so a page costs the same
+whatever its position.
+"""
+
+import math
+import re
+from django.db import connection, transaction
+from building.api import ApiError, decode_cursor, encode_cursor, is_integer
+from building.models import Building, SearchEntry
+from apartment.models import Apartment, Tenant
+
+
+# terms of a query beyond this are ignored
+MAX_QUERY_TERMS = 8
+
+# results per page when the client does not ask for a limit
+SEARCH_PAGE_SIZE = 20
+
+# entries written per INSERT when (re)indexing many objects
+INDEX_BATCH_SIZE = 500
+
+# buildings reindexed at a time by `rebuild_search_index`
+REBUILD_CHUNK_SIZE = 100
+
+ADDRESS_FIELDS = ('street_name', 'street_number', 'city', 'county', 'postal_code')
+
+# fields of the models whose change rewrites their entries (tenants are rewritten on every save)
+INDEXED_FIELDS = {
+    Building: ADDRESS_FIELDS,
+    Apartment: ('number_id', 'tenant_id'),
+}
+
+
+def indexed_values(instance):
+    """
+    Returns the indexed fields of a building or an apartment, None for the deferred ones.
+    """
+    return tuple(instance.__dict__.get(field) for field in INDEXED_FIELDS[type(instance)])
+
+
+def address(values, prefix=''):
+    return f"{values[f'{prefix}street_name']} {values[f'{prefix}street_number']}, {values[f'{prefix}city']}"
+
+
+def searchable(*parts):
+    return ' '.join(str(part) for part in parts if part not in (None, ''))
+
+
+def building_entry(values):
+    return SearchEntry(
+        kind=SearchEntry.BUILDING, object_id=values['id'], building_id=values['id'],
+        title=address(values),
+        content=searchable(*(values[field] for field in ADDRESS_FIELDS)),
+    )
+
+
+def apartment_entry(values):
+    return SearchEntry(
+        kind=SearchEntry.APARTMENT, object_id=values['id'], building_id=values['building_id'],
+        title=f"Apartment {values['number_id']}, {address(values, 'building__')}",
+        content=searchable(
+            'apartment', values['number_id'], values['tenant__first_name'], values['tenant__last_name'],
+            *(values[f'building__{field}'] for field in ADDRESS_FIELDS),
+        ),
+    )
+
+
+def tenant_entry(values):
+    return SearchEntry(
+        kind=SearchEntry.TENANT, object_id=values['id'], building_id=values['apartment__building_id'],
+        title=searchable(
+            values['first_name'], values['last_name'],
+            f"- apartment {values['apartment__number_id']}, {address(values, 'apartment__building__')}",
+        ),
+        content=searchable(
+            values['first_name'], values['last_name'], values['email'], values['phone'],
+            'apartment', values['apartment__number_id'],
+        ),
+    )
+
+
+APARTMENT_VALUES = (
+    'id', 'building_id', 'number_id', 'tenant__first_name', 'tenant__last_name',
+    *(f'building__{field}' for field in ADDRESS_FIELDS),
+)
+
+TENANT_VALUES = (
+    'id', 'first_name', 'last_name', 'email', 'phone', 'apartment__building_id', 'apartment__number_id',
+    *(f'apartment__building__{field}' for field in ADDRESS_FIELDS),
+)
+
+
+def replace_entries(kind, object_ids, entries):
+    """
+    Replaces the entries of the given objects: one DELETE, then batched INSERTs.
+    """
+    SearchEntry.objects.filter(kind=kind, object_id__in=object_ids).delete()
+    SearchEntry.objects.bulk_create(entries, batch_size=INDEX_BATCH_SIZE)
+
+
+@transaction.atomic
+def index_tenants(tenant_ids):
+    """
+    Rewrites the entries of the given tenants. Tenants without an apartment belong to no building
+    and are left out of the index.
+    """
+
+    tenant_ids = {tenant_id for tenant_id in tenant_ids if tenant_id is not None}
+    if not tenant_ids:
+        return
+    tenants = Tenant.objects.filter(id__in=tenant_ids, apartment__isnull=False).values(*TENANT_VALUES)
+    replace_entries(SearchEntry.TENANT, tenant_ids, [tenant_entry(values) for values in tenants])
+
+
+@transaction.atomic
+def index_apartments(apartment_ids):
+    """
+    Rewrites the entries of the given apartments and of their tenants.
+    """
+
+    apartment_ids = {apartment_id for apartment_id in apartment_ids if apartment_id is not None}
+    if not apartment_ids:
+        return
+    apartments = list(Apartment.objects.filter(id__in=apartment_ids).values(*APARTMENT_VALUES, 'tenant_id'))
+    replace_entries(SearchEntry.APARTMENT, apartment_ids, [apartment_entry(values) for values in apartments])
+    index_tenants(values['tenant_id'] for values in apartments)
+
+
+@transaction.atomic
+def index_buildings(building_ids):
+    """
+    Rewrites the entries of the given buildings, of their apartments and of their tenants,
+    with one query per kind.
+    """
+
+    building_ids = list(building_ids)
+    buildings = Building.objects.filter(id__in=building_ids).values('id', *ADDRESS_FIELDS)
+    apartments = Apartment.objects.filter(building_id__in=building_ids).values(*APARTMENT_VALUES)
+    tenants = Tenant.objects.filter(apartment__building_id__in=building_ids).values(*TENANT_VALUES)
+
+    # the entries of tenants that moved out of these buildings go too
+    SearchEntry.objects.filter(building_id__in=building_ids).delete()
+    SearchEntry.objects.bulk_create([
+        *(building_entry(values) for values in buildings),
+        *(apartment_entry(values) for values in apartments),
+    ], batch_size=INDEX_BATCH_SIZE)
+    tenants = list(tenants)
+    replace_entries(SearchEntry.TENANT, [values['id'] for values in tenants], [tenant_entry(values) for values in tenants])
+
+
+def rebuild_search_index():
+    """
+    Indexes every building from scratch, a chunk of buildings at a time. Returns the number of entries.
+    """
+
+    SearchEntry.objects.all().delete()
+    building_ids = list(Building.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(building_ids), REBUILD_CHUNK_SIZE):
+        index_buildings(building_ids[start:start + REBUILD_CHUNK_SIZE])
+    return SearchEntry.objects.count()
+
+
+def query_terms(text):
+    terms = re.findall(r'\w+', (text or '').lower())[:MAX_QUERY_TERMS]
+    if not terms:
+        raise ApiError("The search query must contain at least one word or number.")
+    return terms
+
+
+# rows after the (rank, id) of the cursor, in the ranking order
+AFTER_CURSOR = '(ranked.rank < %s OR (ranked.rank = %s AND ranked.id > %s))'
+
+# the matches are ranked by the FTS table alone, the entries are only read for the rows in scope
+SQLITE_SEARCH = """
+    SELECT entry.id, entry.kind, entry.object_id, entry.building_id, entry.title, ranked.rank
+    FROM (
+        SELECT rowid AS id, -bm25(building_searchentry_fts) AS rank
+        FROM building_searchentry_fts
+        WHERE building_searchentry_fts MATCH %s
+    ) ranked
+    JOIN building_searchentry entry ON entry.id = ranked.id
+    WHERE entry.building_id IN ({scope}) AND {after}
+    ORDER BY ranked.rank DESC, ranked.id
+    LIMIT %s
+"""
+
+POSTGRES_SEARCH = """
+    SELECT * FROM (
+        SELECT entry.id, entry.kind, entry.object_id, entry.building_id, entry.title,
+               ts_rank(to_tsvector('simple', entry.content), query) + similarity(entry.content, %s) AS rank
+        FROM building_searchentry entry, to_tsquery('simple', %s) query
+        WHERE entry.building_id IN ({scope})
+          AND (to_tsvector('simple', entry.content) @@ query OR entry.content ILIKE %s)
+    ) ranked
+    WHERE {after}
+    ORDER BY rank DESC, id
+    LIMIT %s
+"""
+
+
+def search_entries(building_ids, text, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Returns one page of the entries of the given buildings matching the text, most relevant first,
+    with their `rank`, and the cursor of the next page (None on the last page).
+    """
+
+    building_ids = list(building_ids)
+    terms = query_terms(text)
+    if not building_ids:
+        return [], None
+
+    after, after_params = '1 = 1', []
+    if cursor:
+        rank, entry_id = decode_cursor(cursor, 2)
+        # the values are bound to the raw query as they were sent
+        if not is_integer(entry_id) or isinstance(rank, bool) or not isinstance(rank, (int, float)) \
+                or not math.isfinite(rank):
+            raise ApiError("Invalid cursor.")
+        after, after_params = AFTER_CURSOR, [rank, rank, entry_id]
+
+    scope = ', '.join(['%s'] * len(building_ids))
+    if connection.vendor == 'postgresql':
+        raw_text = ' '.join(terms)
+        sql = POSTGRES_SEARCH.format(scope=scope, after=after)
+        params = [raw_text, ' & '.join(f'{term}:*' for term in terms), *building_ids, f'%{raw_text}%']
+    else:
+        sql = SQLITE_SEARCH.format(scope=scope, after=after)
+        params = [' '.join(f'"{term}"*' for term in terms), *building_ids]
+
+    entries = list(SearchEntry.objects.raw(sql, [*params, *after_params, limit + 1]))
+    if len(entries) <= limit:
+        return entries, None
+
+    entries = entries[:limit]
+    return entries, encode_cursor([entries[-1].rank, entries[-1].id])
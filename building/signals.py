@@ -1,66 +1,279 @@
-from django.db.models.signals import post_save
-from building.models import Building, Utility, MainUtil
-from apartment.models import Apartment, PowerSupply, MutualUtility
-
-
-def initialize_utilities(instance):
-    utils_to_create = [
-        Utility(name='Cold Water', provider='City', building=instance, util_type='Individual'),
-        Utility(name='Hot Water', provider='City', building=instance, util_type='Individual'),
-        Utility(name='Gas Power', provider='City', building=instance, util_type='Individual'),
-        Utility(name='Heating Power', provider='City', building=instance, util_type='Individual'),
-    ]
-    Utility.objects.bulk_create(utils_to_create)
+from django.db.models.signals import post_init, post_save, post_delete
+from building.models import Building, Utility, MainUtil, SearchEntry
+from building.cache import forget_admin_buildings, touch_buildings
+from building.provisioning import provision_building, link_apartments, propagate_utility
+from building.readings import record_readings, record_main_readings
+from building.search import indexed_values, index_buildings, index_apartments, index_tenants
+from building.snapshots import refresh_apartment_snapshots
+from building.stats import apartment_state, apply_apartment_change, apply_counter_change, refresh_building_stats
+from apartment.models import Apartment, ApartmentSnapshot, PowerSupply, Tenant
 
 
 def initialize_building(sender, instance, created, **kwargs):
     """
     Signal listens for a new building instance being created.
-    When new instance was created, the signal triggers function and creates a given number of apartments
-    that was set with the building instance.
+    When new instance was created, the signal provisions the default utilities, the main counters
+    and the given number of apartments that was set with the building instance.
+    Buildings saved with `defer_provisioning` set are provisioned by a background job instead.
     """
 
+    if created and not getattr(instance, 'defer_provisioning', False):
+        provision_building(instance)
+
+
+def initialize_apartment(sender, instance, created, **kwargs):
+    """
+    Signal listens for a new apartment instance being created one by one (e.g. from the admin).
+    When new instance was created, the signal links the building's utilities to the apartment.
+    Apartments created in bulk by the provisioning service do not trigger this signal.
+    """
     if created:
+        utilities = list(Utility.objects.filter(building=instance.building_id))
+        link_apartments([instance.id], utilities)
 
-        # default utils used independently by each building.
-        initialize_utilities(instance)
 
-        # apartment capacity set by the building instance when created
-        apartments_to_create = instance.apartments_capacity
+def remember_util_type(sender, instance, **kwargs):
+    """
+    Keeps the type a utility was loaded with, so a changed type can be propagated to the apartments.
+    """
+    instance._loaded_util_type = instance.__dict__.get('util_type')
 
-        # list of utility objects created above filtered by the instance of the sender(newly created object)
-        utilities = Utility.objects.filter(building=instance)
 
-        for util in utilities:
-            MainUtil.objects.create(util=util)
+def propagate_utility_change(sender, instance, created, **kwargs):
+    """
+    Signal listens for utilities being created one by one (e.g. from the settings page) or having
+    their type changed, and links them to every apartment of the building.
+    Utilities created in bulk by the provisioning service do not trigger this signal.
+    """
+    if created or instance.util_type != instance._loaded_util_type:
+        propagate_utility(instance)
+    instance._loaded_util_type = instance.util_type
 
-        if instance.has_elevator:
-            Utility.objects.create(name='Elevator', provider='Private', building=instance, util_type='Mutual')
 
-        # create new apartment objects
-        for number in range(1, apartments_to_create+1):
-            Apartment.objects.create(number_id=number, building=instance)
+def remember_building_admin(sender, instance, **kwargs):
+    """
+    Keeps the admin a building was loaded with, so the cache of a replaced admin is dropped too.
+    """
+    instance._loaded_admin_id = instance.__dict__.get('admin_id')
 
 
-def initialize_apartment(sender, instance, created, **kwargs):
+def forget_building(sender, instance, **kwargs):
     """
-    Signal listens for a new apartment instance being created.
-    When new instance was created, the signal triggers function and creates a given number power supplies.
+    Signal listens for buildings being saved or deleted and invalidates the cached admin buildings.
     """
-    if created:
-        # default utils used independently by each apartment in the building.
-        utilities = Utility.objects.filter(building=instance.building)
+    forget_admin_buildings(instance.admin_id, instance._loaded_admin_id)
+    instance._loaded_admin_id = instance.admin_id
+
+
+def remember_apartment_state(sender, instance, **kwargs):
+    """
+    Keeps the summarized values an apartment was loaded with, so that the building stats
+    can be updated with the difference when the apartment is saved.
+    """
+    instance._stats_state = apartment_state(instance) if instance.pk else None
+
+
+def update_apartment_stats(sender, instance, created, **kwargs):
+    """
+    Signal listens for apartments being saved and applies the change to the building stats.
+    Apartments loaded without the summarized fields are recounted from the database.
+    """
+    new_state = apartment_state(instance)
+    if new_state is None or (not created and instance._stats_state is None):
+        refresh_building_stats(instance.building_id)
+    else:
+        apply_apartment_change(instance.building_id, None if created else instance._stats_state, new_state)
+    instance._stats_state = new_state
 
-        # for each created apartment, add an individual utility
-        for util in utilities:
-            if util.util_type == 'Individual':
-                if util.name == "Cold Water":
-                    PowerSupply.objects.create(apartment=instance, utility=util, status=True)
-                else:
-                    PowerSupply.objects.create(apartment=instance, utility=util)
-            else:
-                MutualUtility.objects.create(apartment=instance, utility=util)
+
+def remove_apartment_stats(sender, instance, **kwargs):
+    """
+    Signal listens for apartments being deleted and removes them from the building stats.
+    """
+    if instance._stats_state is not None:
+        apply_apartment_change(instance.building_id, instance._stats_state, None)
+
+
+def update_counter_stats(sender, instance, **kwargs):
+    """
+    Signal listens for main counters being saved and refreshes the building's counters flag.
+    """
+    apply_counter_change(instance.util.building_id, instance)
+
+
+def remove_counter_stats(sender, instance, **kwargs):
+    """
+    Signal listens for main counters being deleted and refreshes the building's counters flag.
+    """
+    apply_counter_change(instance.util.building_id, None)
+
+
+def remember_index_counter(sender, instance, **kwargs):
+    """
+    Keeps the index a counter was loaded with, so a changed index can be recorded in the history.
+    """
+    instance._loaded_index = instance.__dict__.get('index_counter')
+
+
+def record_supply_reading(sender, instance, created, **kwargs):
+    """
+    Signal listens for apartment counters being saved and appends a changed index to the readings history.
+    """
+    if not created and instance.index_counter != instance._loaded_index:
+        record_readings([(instance.id, instance.index_counter)])
+    instance._loaded_index = instance.index_counter
+
+
+def record_main_reading(sender, instance, created, **kwargs):
+    """
+    Signal listens for main counters being saved and appends a changed index to the readings history.
+    """
+    if not created and instance.index_counter != instance._loaded_index:
+        record_main_readings([(instance.id, instance.index_counter)])
+    instance._loaded_index = instance.index_counter
+
+
+def building_of(instance):
+    """
+    Returns the id of the building the rendered tables of an instance belong to, or None when
+    the parent row was already deleted (its own signal then invalidates the tables).
+    """
+
+    if isinstance(instance, Building):
+        return instance.id
+    if isinstance(instance, (Apartment, Utility)):
+        return instance.building_id
+
+    if isinstance(instance, PowerSupply):
+        parent_model, parent_field, lookup = Apartment, 'apartment', {'id': instance.apartment_id}
+    elif isinstance(instance, MainUtil):
+        parent_model, parent_field, lookup = Utility, 'util', {'id': instance.util_id}
+    else:
+        parent_model, parent_field, lookup = Apartment, None, {'tenant': instance}
+
+    # reuse the parent when it was loaded with the instance
+    if parent_field and instance._meta.get_field(parent_field).is_cached(instance):
+        return getattr(instance, parent_field).building_id
+    return parent_model.objects.filter(**lookup).values_list('building_id', flat=True).first()
+
+
+def invalidate_tables(sender, instance, **kwargs):
+    """
+    Signal listens for changes of the models shown in the building tables and invalidates
+    the cached table fragments of the building.
+    """
+    touch_buildings(building_of(instance))
+
+
+def snapshot_apartments(instance):
+    """
+    Returns the ids of the apartments whose snapshot shows the given instance.
+    """
+
+    if isinstance(instance, Apartment):
+        return [instance.id]
+    if isinstance(instance, PowerSupply):
+        return [instance.apartment_id]
+    if isinstance(instance, Tenant):
+        # a deleted tenant was already detached from its apartment, find it through the snapshot
+        return ApartmentSnapshot.objects.filter(user_id=instance.user_id).values_list('apartment_id', flat=True)
+    return Apartment.objects.filter(building_id=building_of(instance)).values_list('id', flat=True)
+
+
+def refresh_snapshots(sender, instance, created=False, **kwargs):
+    """
+    Signal listens for changes of the models shown on the tenant dashboard and rebuilds the snapshots
+    of the apartments involved. New buildings and utilities are left to the provisioning service.
+    """
+
+    if created and isinstance(instance, (Building, Utility)):
+        return
+    refresh_apartment_snapshots(snapshot_apartments(instance), create=kwargs['signal'] is post_save)
+
+
+def remember_indexed_values(sender, instance, **kwargs):
+    """
+    Keeps the indexed fields a building or an apartment was loaded with, so their search entries
+    are only rewritten when one of them changes.
+    """
+    instance._indexed_values = indexed_values(instance)
+
+
+def update_search_index(sender, instance, created, **kwargs):
+    """
+    Signal listens for buildings, apartments and tenants being saved and rewrites their search entries.
+    A building also rewrites the entries of its apartments and tenants (they show its address), an apartment
+    the entries of its current and previous tenant, and a tenant the entry of his apartment.
+    """
+
+    if isinstance(instance, Tenant):
+        apartment_ids = list(Apartment.objects.filter(tenant_id=instance.id).values_list('id', flat=True))
+        if apartment_ids:
+            index_apartments(apartment_ids)
+        else:
+            index_tenants([instance.id])
+        return
+
+    loaded, current = getattr(instance, '_indexed_values', None), indexed_values(instance)
+    if not created and loaded == current:
+        return
+    if isinstance(instance, Building):
+        index_buildings([instance.id])
+    else:
+        index_apartments([instance.id])
+        index_tenants([loaded[1]] if loaded and loaded[1] != instance.tenant_id else [])
+    instance._indexed_values = current
+
+
+def remove_search_entries(sender, instance, **kwargs):
+    """
+    Signal listens for apartments and tenants being deleted and removes their search entries.
+    The entries of a deleted building go with it (cascade).
+    """
+
+    if isinstance(instance, Apartment):
+        SearchEntry.objects.filter(kind=SearchEntry.APARTMENT, object_id=instance.id).delete()
+        index_tenants([instance.tenant_id])
+    else:
+        SearchEntry.objects.filter(kind=SearchEntry.TENANT, object_id=instance.id).delete()
+        # the apartment of a deleted tenant is detached without a signal, find it through the snapshot
+        index_apartments(snapshot_apartments(instance))
 
 
 post_save.connect(initialize_building, sender=Building)
-post_save.connect(initialize_apartment, sender=Apartment)
\ No newline at end of file
+post_save.connect(initialize_apartment, sender=Apartment)
+
+post_init.connect(remember_util_type, sender=Utility)
+post_save.connect(propagate_utility_change, sender=Utility)
+
+post_init.connect(remember_building_admin, sender=Building)
+post_save.connect(forget_building, sender=Building)
+post_delete.connect(forget_building, sender=Building)
+
+post_init.connect(remember_apartment_state, sender=Apartment)
+post_save.connect(update_apartment_stats, sender=Apartment)
+post_delete.connect(remove_apartment_stats, sender=Apartment)
+post_save.connect(update_counter_stats, sender=MainUtil)
+post_delete.connect(remove_counter_stats, sender=MainUtil)
+
+post_init.connect(remember_index_counter, sender=PowerSupply)
+post_init.connect(remember_index_counter, sender=MainUtil)
+post_save.connect(record_supply_reading, sender=PowerSupply)
+post_save.connect(record_main_reading, sender=MainUtil)
+
+for model in (Building, Apartment):
+    post_init.connect(remember_indexed_values, sender=model)
+for model in (Building, Apartment, Tenant):
+    post_save.connect(update_search_index, sender=model)
+post_delete.connect(remove_search_entries, sender=Apartment)
+post_delete.connect(remove_search_entries, sender=Tenant)
+
+for model in (Building, Apartment, Tenant, Utility, PowerSupply, MainUtil):
+    post_save.connect(invalidate_tables, sender=model)
+    post_delete.connect(invalidate_tables, sender=model)
+
+# connected last, so the snapshots see the supplies linked and the readings recorded by the handlers above
+for model in (Building, Apartment, Tenant, Utility, PowerSupply):
+    post_save.connect(refresh_snapshots, sender=model)
+post_delete.connect(refresh_snapshots, sender=PowerSupply)
+post_delete.connect(refresh_snapshots, sender=Tenant)
@@ -0,0 +1,121 @@
+"""
+Per-apartment snapshots served to the tenants.
+
+The tenant dashboard needs the apartment, its building, its tenant, its power supplies with their
+utilities and the latest monthly readings. Instead of walking those relations on every page view,
+the data is precomputed into one `ApartmentSnapshot` row per apartment, looked up by the tenant's
+user id. Snapshots are rebuilt for whole batches of apartments with one query per table.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.utils import timezone
+from building.periods import billing_period, shift_period
+from apartment.models import Apartment, ApartmentSnapshot, PowerSupply, MonthlyConsumption
+
+
+# number of months of readings kept in a snapshot
+SNAPSHOT_MONTHS = 3
+
+BUILDING_FIELDS = ('street_name', 'street_number', 'city', 'county', 'postal_code')
+
+TENANT_FIELDS = ('first_name', 'last_name', 'email', 'phone')
+
+
+def refresh_apartment_snapshots(apartment_ids, create=True):
+    """
+    Rebuilds the snapshots of the given apartments and returns them. Missing snapshots are created
+    unless `create` is False (used while rows are being deleted).
+    """
+
+    apartment_ids = {apartment_id for apartment_id in apartment_ids if apartment_id is not None}
+    if not apartment_ids:
+        return []
+
+    apartments = Apartment.objects.filter(id__in=apartment_ids).values(
+        'id', 'number_id', 'surface_area', 'num_of_persons', 'charge', 'balance',
+        'tenant__user_id',
+        *(f'building__{field}' for field in BUILDING_FIELDS),
+        *(f'tenant__{field}' for field in TENANT_FIELDS),
+    )
+
+    # latest monthly readings of every power supply, newest first
+    since = shift_period(billing_period(), -SNAPSHOT_MONTHS)
+    readings = defaultdict(list)
+    for supply_id, period, index_counter, consumption in MonthlyConsumption.objects.filter(
+        apartment_id__in=apartment_ids, period__gt=since
+    ).order_by('supply_id', '-period').values_list('supply_id', 'period', 'index_counter', 'consumption'):
+        readings[supply_id].append({
+            'period': period.strftime('%Y-%m'), 'index_counter': index_counter, 'consumption': consumption,
+        })
+
+    supplies = defaultdict(list)
+    for supply_id, apartment_id, utility, status, index_counter in PowerSupply.objects.filter(
+        apartment_id__in=apartment_ids
+    ).order_by('utility_id').values_list('id', 'apartment_id', 'utility__name', 'status', 'index_counter'):
+        supplies[apartment_id].append({
+            'utility': utility, 'status': bool(status), 'index_counter': index_counter or 0,
+            'readings': readings[supply_id],
+        })
+
+    existing = {snapshot.apartment_id: snapshot for snapshot in ApartmentSnapshot.objects.filter(
+        apartment_id__in=apartment_ids
+    ).only('id', 'apartment_id')}
+
+    now = timezone.now()
+    refreshed = []
+    for apartment in apartments:
+        snapshot = existing.get(apartment['id'])
+        if snapshot is None:
+            if not create:
+                continue
+            snapshot = ApartmentSnapshot(apartment_id=apartment['id'])
+
+        snapshot.user_id = apartment['tenant__user_id']
+        snapshot.updated_at = now
+        snapshot.data = {
+            'number_id': apartment['number_id'],
+            'surface_area': apartment['surface_area'],
+            'num_of_persons': apartment['num_of_persons'],
+            # amounts are kept as strings, JSON numbers would turn them back into floats
+            'charge': str(apartment['charge']),
+            'balance': str(apartment['balance']),
+            'debt': str(max(apartment['balance'], Decimal('0.00'))),
+            'payment_status': apartment['balance'] <= 0,
+            'building': {field: apartment[f'building__{field}'] for field in BUILDING_FIELDS},
+            'tenant': {field: apartment[f'tenant__{field}'] for field in TENANT_FIELDS}
+            if apartment['tenant__user_id'] else None,
+            'supplies': supplies[apartment['id']],
+        }
+        refreshed.append(snapshot)
+
+    ApartmentSnapshot.objects.bulk_update([snapshot for snapshot in refreshed if snapshot.pk],
+                                          ['user', 'data', 'updated_at'])
+    ApartmentSnapshot.objects.bulk_create([snapshot for snapshot in refreshed if not snapshot.pk])
+    return refreshed
+
+
+def refresh_buildings_snapshots(building_ids):
+    """
+    Rebuilds the snapshots of every apartment of the given buildings. Used after bulk writes,
+    which do not send the signals that keep the snapshots up to date.
+    """
+    return refresh_apartment_snapshots(
+        Apartment.objects.filter(building_id__in=building_ids).values_list('id', flat=True)
+    )
+
+
+def tenant_snapshot(user_id):
+    """
+    Returns the snapshot data of the apartment of the given tenant user, or None when the user
+    has no apartment. A missing snapshot (e.g. of an apartment created before snapshots existed)
+    is built on the fly.
+    """
+
+    data = ApartmentSnapshot.objects.filter(user_id=user_id).values_list('data', flat=True).first()
+    if data is None:
+        snapshots = refresh_apartment_snapshots(
+            Apartment.objects.filter(tenant__user_id=user_id).values_list('id', flat=True)
+        )
+        data = snapshots[0].data if snapshots else None
+    return data
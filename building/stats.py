@@ -0,0 +1,110 @@
+from django.db.models import Count, Q, Sum, F
+from building.models import BuildingStats, MainUtil
+from apartment.models import Apartment
+
+
+# apartment fields summarized by the building stats
+STATS_FIELDS = {'num_of_persons', 'balance'}
+
+# columns of the stats row rewritten by a refresh
+STATS_COLUMNS = ['occupied_apts', 'available_apts', 'unpaid_apts', 'total_debt', 'counters_set']
+
+
+def apartment_state(apartment):
+    """
+    Returns the part of an apartment that is summarized by the building stats:
+    (is occupied, is unpaid, debt), or None when the apartment was loaded without those fields.
+    """
+    if STATS_FIELDS & apartment.get_deferred_fields():
+        return None
+    return apartment.num_of_persons > 0, not apartment.payment_status, apartment.debt
+
+
+def refresh_buildings_stats(building_ids):
+    """
+    Recomputes the stats rows of the given buildings from scratch with one grouped query per table.
+    Used after bulk writes, which do not send the signals that keep the rows up to date.
+    """
+
+    building_ids = list(building_ids)
+
+    totals = {row['building_id']: row for row in Apartment.objects.filter(
+        building_id__in=building_ids
+    ).values('building_id').annotate(
+        apartments=Count('id'),
+        occupied=Count('id', filter=Q(num_of_persons__gt=0)),
+        unpaid=Count('id', filter=Q(balance__gt=0)),
+        debt=Sum('balance', filter=Q(balance__gt=0)),
+    ).order_by()}
+
+    counted = set(MainUtil.objects.filter(
+        util__building_id__in=building_ids
+    ).exclude(index_counter=0).values_list('util__building_id', flat=True))
+
+    existing = {stats.building_id: stats for stats in BuildingStats.objects.filter(building_id__in=building_ids)}
+
+    refreshed = []
+    for building_id in building_ids:
+        row = totals.get(building_id, {'apartments': 0, 'occupied': 0, 'unpaid': 0, 'debt': 0})
+        stats = existing.get(building_id) or BuildingStats(building_id=building_id)
+        stats.occupied_apts     = row['occupied']
+        stats.available_apts    = row['apartments'] - row['occupied']
+        stats.unpaid_apts       = row['unpaid']
+        stats.total_debt        = row['debt'] or 0
+        stats.counters_set      = building_id in counted
+        refreshed.append(stats)
+
+    BuildingStats.objects.bulk_update([stats for stats in refreshed if stats.pk], STATS_COLUMNS)
+    BuildingStats.objects.bulk_create([stats for stats in refreshed if not stats.pk])
+    return refreshed
+
+
+def refresh_building_stats(building_id):
+    """
+    Recomputes the stats row of a single building and returns it.
+    """
+    return refresh_buildings_stats([building_id])[0]
+
+
+def apply_apartment_change(building_id, old_state, new_state):
+    """
+    Applies the difference between two apartment states to the building stats with a single
+    UPDATE. A state of None stands for a missing apartment (created or deleted).
+    """
+
+    old_occupied, old_unpaid, old_debt = old_state or (False, False, 0)
+    new_occupied, new_unpaid, new_debt = new_state or (False, False, 0)
+
+    occupied    = int(new_occupied) - int(old_occupied)
+    apartments  = int(new_state is not None) - int(old_state is not None)
+    unpaid      = int(new_unpaid) - int(old_unpaid)
+    debt        = new_debt - old_debt
+
+    if not (occupied or apartments or unpaid or debt):
+        return
+
+    updated = BuildingStats.objects.filter(building_id=building_id).update(
+        occupied_apts=F('occupied_apts') + occupied,
+        available_apts=F('available_apts') + apartments - occupied,
+        unpaid_apts=F('unpaid_apts') + unpaid,
+        total_debt=F('total_debt') + debt,
+    )
+
+    # buildings created before the stats table existed get their row on the first save
+    if not updated and new_state is not None:
+        refresh_building_stats(building_id)
+
+
+def apply_counter_change(building_id, counter):
+    """
+    Updates the 'main counters are set' flag after a main counter was saved or deleted.
+    """
+
+    if counter is not None and counter.index_counter:
+        counters_set = True
+    else:
+        counters_set = MainUtil.objects.filter(util__building_id=building_id).exclude(index_counter=0).exists()
+
+    updated = BuildingStats.objects.filter(building_id=building_id).update(counters_set=counters_set)
+    if not updated and counter is not None:
+        refresh_building_stats(building_id)
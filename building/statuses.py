@@ -0,0 +1,55 @@
+"""
+Batched saving of the power supplies statuses edited on the status grid.
+
+The grid holds one `status` checkbox per power supply, valued with the supply id. The submitted
+statuses are compared with the loaded ones and only the changed supplies are written, with a single
+`bulk_update`, so toggling the statuses of a whole building takes a constant number of queries.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from building.cache import touch_buildings
+from building.snapshots import refresh_apartment_snapshots
+from apartment.models import PowerSupply
+
+
+def submitted_statuses(data):
+    """
+    Returns the ids of the power supplies checked as active in the submitted form data.
+    """
+    return {int(value) for value in data.getlist('status') if value.isdigit()}
+
+
+def changed_supplies(supplies, active_ids):
+    """
+    Returns the supplies whose status differs from the submitted one, with the new status set.
+    """
+
+    changed = []
+    for supply in supplies:
+        status = supply.id in active_ids
+        if bool(supply.status) != status:
+            supply.status = status
+            changed.append(supply)
+    return changed
+
+
+@transaction.atomic
+def save_statuses(building_id, supplies):
+    """
+    Writes the statuses of the given supplies of a building and returns their number.
+    """
+
+    if not supplies:
+        return 0
+
+    # bulk updates do not set the auto_now timestamps
+    now = timezone.now()
+    for supply in supplies:
+        supply.updated_at = now
+    PowerSupply.objects.bulk_update(supplies, ['status', 'updated_at'])
+
+    # bulk updates bypass the signals that maintain the snapshots and invalidate the cached tables
+    refresh_apartment_snapshots({supply.apartment_id for supply in supplies})
+    touch_buildings(building_id)
+    return len(supplies)
@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import menu, auth, create, update
+from .views import menu, auth, create, update, export, jobs, api, health, documents
+from .api import BUILDINGS, APARTMENTS, LEDGER, UTILITIES, SUPPLIES, MAIN_COUNTERS
 
 app_name = 'building'
 
@@ -11,6 +12,8 @@ urlpatterns = [
     path("apartments/", menu.ApartmentsPage, name="admin_apartments"),
     path("payments/", menu.PaymentsPage, name="admin_payments"),
     path("documents/", menu.DocumentsPage, name="admin_documents"),
+    path("portfolio/", menu.PortfolioPage, name="admin_portfolio"),
+    path("portfolio/switch/", menu.SwitchBuilding, name="switch_building"),
 
     # user authentication urls
     path('register/', auth.RegisterPage, name='register'),
@@ -24,4 +27,36 @@ urlpatterns = [
     # crud operations: UPDATE
     path('main-utils/<int:pk>/update-index/', update.UpdateMainCounters, name='update_main_utils-index'),
     path('main-utils/<int:pk>/update-status/', update.UpdateUtilityStatus, name='update_main_utils-status'),
+    path('supplies/update-status/', update.UpdateSupplyStatuses, name='update_supplies-status'),
+    path('readings/import/', update.ImportReadings, name='import_readings'),
+
+    # exports
+    path('apartments/export/', export.ExportApartments, name='export_apartments'),
+
+    # documents
+    path('documents/<int:pk>/', documents.DownloadDocument, name='download_document'),
+    path('documents/<int:pk>/thumbnail/', documents.DocumentThumbnail, name='document_thumbnail'),
+    path('api/uploads/', documents.StartUpload, name='start_upload'),
+    path('api/uploads/<uuid:token>/', documents.UploadChunk, name='upload_chunk'),
+
+    # background jobs
+    path('jobs/<int:pk>/', jobs.JobStatus, name='job_status'),
+
+    # monitoring
+    path('health/', health.HealthCheck, name='health'),
+
+    # json api
+    path('api/buildings/', api.ResourceList, {'resource': BUILDINGS}, name='api_buildings'),
+    path('api/buildings/<int:pk>/', api.ResourceDetail, {'resource': BUILDINGS}, name='api_building'),
+    path('api/apartments/', api.ResourceList, {'resource': APARTMENTS}, name='api_apartments'),
+    path('api/apartments/<int:pk>/', api.ResourceDetail, {'resource': APARTMENTS}, name='api_apartment'),
+    path('api/apartments/<int:pk>/payments/', api.ApartmentPayments, name='api_apartment_payments'),
+    path('api/ledger/', api.ResourceList, {'resource': LEDGER}, name='api_ledger'),
+    path('api/utilities/', api.ResourceList, {'resource': UTILITIES}, name='api_utilities'),
+    path('api/utilities/<int:pk>/', api.ResourceDetail, {'resource': UTILITIES}, name='api_utility'),
+    path('api/supplies/', api.ResourceList, {'resource': SUPPLIES}, name='api_supplies'),
+    path('api/supplies/<int:pk>/', api.ResourceDetail, {'resource': SUPPLIES}, name='api_supply'),
+    path('api/main-counters/', api.ResourceList, {'resource': MAIN_COUNTERS}, name='api_main_counters'),
+    path('api/main-counters/<int:pk>/', api.ResourceDetail, {'resource': MAIN_COUNTERS}, name='api_main_counter'),
+    path('api/search/', api.Search, name='api_search'),
 ]
\ No newline at end of file
@@ -0,0 +1,211 @@
+import json
+from decimal import InvalidOperation
+from django.forms import modelform_factory
+from django.http import JsonResponse, HttpResponseNotModified
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+from building.api import (
+    ApiError, APARTMENTS, LEDGER, SUPPLIES, MAIN_COUNTERS, etag_for, page_size, paginate, parse_period,
+    bulk_update_supplies, bulk_update_main_counters,
+)
+from building.cache import get_admin_buildings
+from building.ledger import record_payment, to_amount
+from building.middleware import get_current_building
+from building.search import SEARCH_PAGE_SIZE, search_entries
+
+
+# bulk PATCH handlers of the collections that accept them
+BULK_UPDATES = {
+    SUPPLIES.name: bulk_update_supplies,
+    MAIN_COUNTERS.name: bulk_update_main_counters,
+}
+
+
+def api_error(message, status=400, errors=None):
+    return JsonResponse({'detail': message, 'errors': errors}, status=status)
+
+
+def read_json(request):
+    try:
+        return json.loads(request.body or b'null')
+    except ValueError:
+        raise ApiError("The request body is not valid JSON.")
+
+
+def api_scope(request):
+    """
+    Returns the ids of the buildings the logged user can reach through the API: the building
+    selected with the building switcher, like the admin pages.
+    """
+    building = get_current_building(request)
+    return [building.id] if building else []
+
+
+def not_modified(request, etag):
+    """
+    Returns a 304 response when the client already holds the given ETag, else None.
+    """
+
+    if etag not in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+@require_http_methods(['GET', 'PATCH'])
+def ResourceList(request, resource):
+    """
+    Defined view that lists the rows of an API resource, one page at a time.
+    GET accepts `?fields=` (sparse fieldset), `?limit=` and the `?cursor=` of the previous page.
+    PATCH updates many rows of the supplies and main counters in one request; the body holds
+    `{"items": [{"id": ..., "index_counter": ..., "status": ...}], "period": "YYYY-MM"}`
+    and is applied entirely or not at all.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    building_ids = api_scope(request)
+
+    try:
+        if request.method == 'PATCH':
+            if resource.name not in BULK_UPDATES:
+                return api_error("This collection does not accept bulk updates.", status=405)
+            body = read_json(request)
+            if not isinstance(body, dict):
+                raise ApiError("Expected an object with the list of items.")
+            updated = BULK_UPDATES[resource.name](building_ids, body.get('items'), parse_period(body.get('period')))
+            return JsonResponse({'updated': updated})
+
+        # unchanged buildings are answered from the ETag, without reading the rows
+        etag = etag_for(request, building_ids)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+        selected = resource.select_fields(request.GET.get('fields'))
+        queryset = resource.only(resource.queryset(building_ids), selected)
+        rows, cursor = paginate(resource, queryset, request.GET.get('cursor'), page_size(request.GET.get('limit')))
+    except ApiError as error:
+        return api_error(str(error), errors=error.errors)
+
+    next_page = None
+    if cursor:
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        next_page = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+    response = JsonResponse({
+        'results': [resource.serialize(row, selected) for row in rows],
+        'next': next_page,
+    })
+    response['ETag'] = etag
+    return response
+
+
+@require_http_methods(['GET', 'PATCH'])
+def ResourceDetail(request, resource, pk):
+    """
+    Defined view that returns one row of an API resource, or updates its writable fields with PATCH.
+    Updates go through a model form and the model's save(), so the signals keeping the stats,
+    readings history and snapshots up to date are sent.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    building_ids = api_scope(request)
+    instance = get_object_or_404(resource.queryset(building_ids), pk=pk)
+
+    if request.method == 'PATCH':
+        try:
+            changes = read_json(request)
+            if not isinstance(changes, dict):
+                raise ApiError("Expected an object with the changed fields.")
+            unknown = [field for field in changes if field not in resource.writable]
+            if unknown:
+                raise ApiError(f"Fields that cannot be changed: {', '.join(unknown)}.")
+        except ApiError as error:
+            return api_error(str(error), errors=error.errors)
+
+        # the form validates only the changed fields, the others keep their current values
+        data = {resource.fields[field]: value for field, value in changes.items()}
+        ResourceForm = modelform_factory(resource.model, fields=list(data))
+        form = ResourceForm(data, instance=instance)
+        if not form.is_valid():
+            return api_error("Invalid fields.", errors=form.errors.get_json_data())
+        instance = form.save()
+    else:
+        etag = etag_for(request, building_ids)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+
+    response = JsonResponse(resource.serialize(instance, list(resource.fields)))
+    if request.method == 'GET':
+        response['ETag'] = etag
+    return response
+
+
+@require_http_methods(['POST'])
+def ApartmentPayments(request, pk):
+    """
+    Defined view that records a payment collected from an apartment. The body holds
+    `{"amount": "12.50", "note": ...}` (a string keeps the cents of the amount exact); the response
+    holds the ledger entry and the new balance of the apartment.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    apartment = get_object_or_404(APARTMENTS.queryset(api_scope(request)), pk=pk)
+
+    try:
+        body = read_json(request)
+        if not isinstance(body, dict) or not isinstance(body.get('amount'), (int, float, str)) \
+                or isinstance(body['amount'], bool):
+            raise ApiError("Expected an object with the amount of the payment.")
+        try:
+            amount = to_amount(body['amount'])
+        except InvalidOperation:
+            raise ApiError("The amount must be a number.")
+        entry = record_payment(apartment, amount, request.user, str(body.get('note') or '')[:200])
+    except (ApiError, ValueError) as error:
+        return api_error(str(error), errors=getattr(error, 'errors', None))
+
+    return JsonResponse({
+        'entry': LEDGER.serialize(entry, list(LEDGER.fields)),
+        'balance': apartment.balance,
+    }, status=201)
+
+
+@require_http_methods(['GET'])
+def Search(request):
+    """
+    Defined view that searches the buildings, apartments and tenants of every building administrated
+    by the logged user. `?q=` holds the words to look for (each one matched as a prefix); the results
+    come most relevant first, one page at a time, followed with the `?cursor=` of the previous page.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    building_ids = [building.id for building in get_admin_buildings(request.user)]
+
+    try:
+        limit = page_size(request.GET['limit']) if request.GET.get('limit') else SEARCH_PAGE_SIZE
+        entries, cursor = search_entries(building_ids, request.GET.get('q'), request.GET.get('cursor'), limit)
+    except ApiError as error:
+        return api_error(str(error), errors=error.errors)
+
+    next_page = None
+    if cursor:
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        next_page = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+    return JsonResponse({
+        'results': [
+            {'kind': entry.kind, 'id': entry.object_id, 'building': entry.building_id, 'title': entry.title,
+             'rank': entry.rank}
+            for entry in entries
+        ],
+        'next': next_page,
+    })
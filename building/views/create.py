@@ -1,5 +1,8 @@
+from django.db import transaction
 from django.shortcuts import render, redirect
 from building.forms import *
+from building.jobs import enqueue
+from building.middleware import select_building
 from building.views.menu import get_logged_user
 from django.contrib.auth.decorators import login_required
 
@@ -9,7 +12,9 @@ def CreateResidentialBuilding(request):
     """
     Defined View that handles residential building creation.
     When a new user with admin privileges is registered, he's redirected to a form that handles
-    creation of a new custom building object.
+    creation of a new custom building object; an admin may register many buildings, the new one
+    becomes the selected building. The apartments, utilities and counters of the building
+    are created by a background job, so the admin is redirected right away.
     """
 
     form = ResidentialRegistrationForm()
@@ -18,7 +23,13 @@ def CreateResidentialBuilding(request):
         if form.is_valid():
             new_residential = form.save(commit=False)
             new_residential.admin = request.user
-            new_residential.save()
+            new_residential.defer_provisioning = True
+
+            # the building is never saved without the job that provisions it
+            with transaction.atomic():
+                new_residential.save()
+                enqueue('provision_building', building=new_residential)
+            select_building(request, new_residential)
             return redirect('building:admin_dashboard')
 
     context = {'form': form}
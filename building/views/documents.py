@@ -0,0 +1,183 @@
+import re
+from urllib.parse import quote
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+from building.api import ApiError, is_integer
+from building.documents import (
+    INLINE_CONTENT_TYPES, UploadError, accessible_documents, documents_path, parse_range, placeholder_thumbnail,
+    read_range, receive_chunk, start_upload, thumbnail_path,
+)
+from building.models import Document, UploadSession
+from building.views.api import api_error, not_modified, read_json
+from building.views.menu import get_logged_user
+
+
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+def content_disposition(name, download):
+    return f"{'attachment' if download else 'inline'}; filename*=utf-8''{quote(name)}"
+
+
+def protect_document(response):
+    # a document that is opened anyway (e.g. by a browser ignoring the attachment) runs in a sandbox,
+    # without scripts nor access to the site's origin
+    response['Content-Security-Policy'] = 'sandbox'
+    return response
+
+
+def document_data(request, document):
+    return {
+        'id': document.id,
+        'name': document.name,
+        'kind': document.kind,
+        'apartment': document.apartment_id,
+        'size': document.file.size,
+        'url': request.build_absolute_uri(reverse('building:download_document', args=[document.id])),
+    }
+
+
+def upload_data(request, session):
+    return {
+        'upload': request.build_absolute_uri(reverse('building:upload_chunk', args=[session.token])),
+        'size': session.size,
+        'received': session.received,
+        'document': document_data(request, session.document) if session.document_id else None,
+    }
+
+
+@require_http_methods(['POST'])
+def StartUpload(request):
+    """
+    Defined view that opens a resumable upload of a document of the current building. The body holds
+    `{"name": ..., "size": ..., "kind": ..., "apartment": ..., "sha256": ...}` (apartment and sha256
+    are optional). Content that is stored already is not uploaded again when its sha256 is given:
+    the document is created right away.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    _, current_building = get_logged_user(request)
+
+    try:
+        body = read_json(request)
+        if not isinstance(body, dict) or not isinstance(body.get('name'), str) or not body['name'] \
+                or not is_integer(body.get('size')):
+            raise ApiError("Expected an object with the name and the size of the file.")
+        kind = body.get('kind') or Document.OTHER
+        if not isinstance(kind, str) or kind not in dict(Document.KINDS):
+            raise ApiError(f"Unknown kind {kind!r}.")
+        sha256 = body.get('sha256') or ''
+        if sha256 and (not isinstance(sha256, str) or not SHA256_PATTERN.fullmatch(sha256.lower())):
+            raise ApiError("The sha256 must be 64 hexadecimal digits.")
+
+        apartment = None
+        if body.get('apartment') is not None:
+            if is_integer(body['apartment']):
+                apartment = current_building.apartment_set.filter(id=body['apartment']).first()
+            if apartment is None:
+                raise ApiError("Unknown apartment.")
+
+        created = start_upload(
+            current_building, body['name'][:255], body['size'], kind, apartment, sha256.lower(), request.user,
+        )
+    except (ApiError, UploadError) as error:
+        return api_error(str(error), status=getattr(error, 'status', 400))
+
+    if isinstance(created, Document):
+        return JsonResponse({'upload': None, 'document': document_data(request, created)}, status=201)
+    return JsonResponse(upload_data(request, created), status=201)
+
+
+@require_http_methods(['GET', 'PUT'])
+def UploadChunk(request, token):
+    """
+    Defined view of an upload session. GET tells how many bytes were received, so an interrupted
+    upload is resumed from there. PUT appends the chunk in the body, described by a
+    `Content-Range: bytes first-last/size` header; the last chunk creates the document.
+    """
+
+    if not request.user.is_authenticated:
+        return api_error("Authentication required.", status=401)
+    _, current_building = get_logged_user(request)
+    session = get_object_or_404(UploadSession.objects.select_related('document__file'), token=token, building=current_building)
+
+    if request.method == 'PUT':
+        try:
+            session = receive_chunk(session.id, request.headers.get('Content-Range', ''), request)
+        except UploadError as error:
+            return api_error(str(error), status=error.status)
+
+    return JsonResponse(upload_data(request, session))
+
+
+@login_required(login_url='building:login')
+def DownloadDocument(request, pk):
+    """
+    Defined view that streams a document to the admin of its building or to its tenants.
+    Single byte ranges are answered with 206 Partial Content, so downloads can be resumed and
+    PDF viewers can fetch the pages they show. Only PDFs and images are shown inline, the other
+    files are downloaded as `application/octet-stream`.
+    """
+
+    document = get_object_or_404(accessible_documents(request.user).select_related('file'), pk=pk)
+    stored = document.file
+    etag = f'"{stored.sha256}"'
+
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    # a range is only served from the version of the file the client already holds part of
+    if_range = request.headers.get('If-Range')
+    try:
+        span = parse_range(request.headers.get('Range'), stored.size) if if_range in (None, etag) else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stored.size}'
+        return response
+
+    # the content type was guessed from the name the uploader chose
+    viewable = stored.content_type in INLINE_CONTENT_TYPES
+    content_type = stored.content_type if viewable else 'application/octet-stream'
+
+    path = documents_path(stored.path)
+    if span is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Content-Length'] = stored.size
+    else:
+        first, last = span
+        response = StreamingHttpResponse(read_range(path, first, last), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{stored.size}'
+        response['Content-Length'] = last - first + 1
+
+    response['Content-Disposition'] = content_disposition(document.name, 'download' in request.GET or not viewable)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private'
+    return protect_document(response)
+
+
+@login_required(login_url='building:login')
+def DocumentThumbnail(request, pk):
+    """
+    Defined view that returns the thumbnail of the first page of a PDF document, rendered on first
+    request and kept on disk, or a placeholder for the other files.
+    """
+
+    document = get_object_or_404(accessible_documents(request.user).select_related('file'), pk=pk)
+    etag = f'"{document.file.sha256}-thumbnail"'
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+
+    path = thumbnail_path(document.file)
+    if path is None:
+        response = HttpResponse(placeholder_thumbnail(document), content_type='image/svg+xml')
+    else:
+        response = FileResponse(open(path, 'rb'), content_type='image/png')
+        response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return protect_document(response)
@@ -0,0 +1,56 @@
+import csv
+from django.http import StreamingHttpResponse
+from building.ledger import ZERO
+from building.views.menu import get_logged_user
+
+
+# number of rows fetched from the database cursor at a time
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = (
+    'Apartment', 'Number Of Persons', 'Payment Amount', 'Payment Status', 'Debt',
+    'Tenant First Name', 'Tenant Last Name', 'Tenant Email', 'Tenant Phone',
+)
+
+
+class Echo:
+    """
+    File-like object that returns what is written instead of storing it,
+    so the csv writer can produce the rows of a streamed response.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_apartments(apartments):
+    """
+    Yields the CSV lines of the given apartments queryset, reading it in chunks from the database.
+    Tenant columns are read through the same query (outer join), as plain tuples instead of model instances.
+    """
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+
+    rows = apartments.values_list(
+        'number_id', 'num_of_persons', 'charge', 'balance',
+        'tenant__first_name', 'tenant__last_name', 'tenant__email', 'tenant__phone',
+    )
+    for number_id, persons, charge, balance, *tenant in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # the payment status and the debt are derived from the ledger balance, as `Apartment` does
+        paid = balance <= 0
+        yield writer.writerow([number_id, persons, charge, 'Paid' if paid else 'Unpaid', ZERO if paid else balance, *tenant])
+
+
+def ExportApartments(request):
+    """
+    Defined view that exports the current month expenses of the building's apartments as a CSV file.
+    The file is streamed while the rows are read, so memory stays flat whatever the building size.
+    """
+
+    _, current_building = get_logged_user(request)
+    apartments = current_building.apartment_set.order_by('number_id')
+
+    response = StreamingHttpResponse(stream_apartments(apartments), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="apartments-{current_building.id}.csv"'
+    return response
@@ -0,0 +1,17 @@
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+
+def HealthCheck(request):
+    """
+    Defined view that tells load balancers and uptime checks whether the application
+    can reach its database.
+    """
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        return JsonResponse({'status': 'unavailable', 'database': connection.vendor}, status=503)
+
+    return JsonResponse({'status': 'ok', 'database': connection.vendor})
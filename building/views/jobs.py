@@ -0,0 +1,23 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from building.models import Job
+from building.views.menu import get_logged_user
+
+
+def JobStatus(request, pk):
+    """
+    Defined view that returns the status of a background job of the current building as JSON,
+    polled by the pages waiting for the job to finish.
+    """
+
+    _, current_building = get_logged_user(request)
+    job = get_object_or_404(Job, id=pk, building=current_building)
+
+    return JsonResponse({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'result': job.result,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    })
@@ -1,60 +1,157 @@
+from collections import namedtuple
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch, Q, Sum
+from django.http import Http404
 from django.shortcuts import render, redirect
-from building.models import CustomUser, Building, MainUtil, Utility
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from building.cache import get_admin_buildings, tables_cache_state
+from building.concurrency import gather_queries
+from building.conditional import conditional_page
+from building.documents import create_document, store_upload
+from building.api import ApiError, decode_cursor, encode_cursor
+from building.forms import RecordPaymentForm, UploadDocumentForm
+from building.jobs import pending_job
+from building.ledger import record_payment
+from building.middleware import get_current_building, select_building
+from building.models import Building, BuildingStats, MainUtil, Utility
+from building.portfolio import portfolio_summary
+from building.stats import refresh_building_stats
+from apartment.models import LedgerEntry, PowerSupply
+
+
+# one row of the apartments page: the apartment (with its tenant) and its power supplies
+# aligned with the building's individual utilities, shared by all the apartment tables
+ApartmentRow = namedtuple('ApartmentRow', ['apartment', 'supplies'])
 
 
 def get_logged_user(request):
-    logged_user = CustomUser.objects.get(username=request.user.username)
-    building    = Building.objects.get(admin=logged_user)
-    return logged_user, building
+    """
+    Returns the logged user (already loaded by the auth middleware) and the building
+    selected with the building switcher, resolved once per request by the current building middleware.
+    """
+    building = get_current_building(request)
+    if building is None:
+        raise Building.DoesNotExist('The logged user has no building under administration.')
+    return request.user, building
 
 
-def DashboardPage(request):
+class ApartmentTable:
     """
-    Defined view function that handles the rendering of the data required by the
-    dashboard.
+    Rows shared by the apartments tables. The rows are loaded lazily, on first access from
+    the templates, so nothing is queried when the tables are served from the fragment cache.
+    The table can be restricted to a single apartment (e.g. to edit its supplies).
     """
 
-    # retrieve currently logged user with admin privileges
-    current_user = request.user
+    def __init__(self, building, apartment_id=None):
+        self.building = building
+        self.apartment_id = apartment_id
 
-    # check if this user has already a building under administration
-    try:
-        building = Building.objects.get(admin=current_user)
-    except Building.DoesNotExist:
+    @cached_property
+    def utilities(self):
+        """
+        Individual utilities of the building, one table column each.
+        """
+        return list(self.building.utility_set.filter(util_type='Individual').order_by('id'))
+
+    @cached_property
+    def apartments(self):
+        """
+        Every apartment of the building together with its tenant and power supplies,
+        loaded with a fixed number of queries.
+        """
+        apartments = self.building.apartment_set.select_related('tenant').prefetch_related(
+            Prefetch('powersupply_set', queryset=PowerSupply.objects.order_by('utility_id'))
+        ).order_by('number_id')
+        if self.apartment_id is not None:
+            apartments = apartments.filter(id=self.apartment_id)
+        return list(apartments)
+
+    @cached_property
+    def rows(self):
+        rows = []
+        for apartment in self.apartments:
+            supplies = {supply.utility_id: supply for supply in apartment.powersupply_set.all()}
+            rows.append(ApartmentRow(apartment, [supplies.get(util.id) for util in self.utilities]))
+        return rows
+
+    @cached_property
+    def supplies(self):
+        """
+        Power supplies shown in the table, the cells of the status grid.
+        """
+        return [supply for row in self.rows for supply in row.supplies if supply is not None]
+
+
+def load_dashboard_stats(building):
+    """
+    Returns the stats row of the building and its pending provisioning job. The row is missing
+    until the building is provisioned by its background job.
+    """
+
+    stats = BuildingStats.objects.filter(building=building).first()
+    provisioning_job = None
+    if stats is None:
+        provisioning_job = pending_job(building, 'provision_building')
+        stats = BuildingStats(building=building) if provisioning_job else refresh_building_stats(building.id)
+    return stats, provisioning_job
+
+
+@conditional_page
+async def DashboardPage(request):
+    """
+    Defined view function that handles the rendering of the data required by the
+    dashboard. The stats and the apartments (unless their table is cached) are queried concurrently.
+    """
+
+    # check if the logged user has already a building under administration
+    building = await sync_to_async(get_current_building)(request)
+    if building is None:
         return redirect('building:create-residential')
 
-    # define context data to render inside the template
-    apartment_list  = building.apartment_set.all()
-    available_apts  = len(apartment_list) - len(apartment_list.filter(num_of_persons__gt=0))
-    main_utils      = MainUtil.objects.filter(util__building=building)
-    utils_are_empty = True
+    tables_context, table_is_cached = await sync_to_async(tables_cache_state)('dashboard_table', building)
+    apartment_list = building.apartment_set.all()
 
-    for util in main_utils:
-        if util.index_counter == 0:
-            continue
-        else:
-            utils_are_empty = False
-            break
+    # occupancy & counters summary maintained by the building signals
+    loaders = [partial(load_dashboard_stats, building)]
+    if not table_is_cached:
+        loaders.append(partial(list, apartment_list))
+    (stats, provisioning_job), *apartments = await gather_queries(*loaders)
 
+    # define context data to render inside the template
+    available_apts  = stats.available_apts
+    main_utils      = MainUtil.objects.filter(util__building=building)
+    utils_are_empty = not stats.counters_set
 
     context = {
         'building': building,
-        'apartment_list': apartment_list,
+        'apartment_list': apartments[0] if apartments else apartment_list,
         'available_apts': available_apts,
         'utils_are_empty': utils_are_empty,
-        'main_utils': main_utils
+        'main_utils': main_utils,
+        'stats': stats,
+        'provisioning_job': provisioning_job,
+        **tables_context,
     }
 
-    return render(request, 'building/menu/admin_dashboard.html', context)
+    return await sync_to_async(render)(request, 'building/menu/admin_dashboard.html', context)
 
 
-def SettingsPage(request):
+@conditional_page
+async def SettingsPage(request):
     """
     Defined view that renders data for the building settings page.
     """
 
     # retrieve building that has as admin the currently logged user
-    _, current_building = get_logged_user(request)
+    _, current_building = await sync_to_async(get_logged_user)(request)
+    tables_context, tables_are_cached = await sync_to_async(tables_cache_state)('settings_tables', current_building)
 
     # retrieve queryset for mutual utilities & facilities
     mutual_utils = current_building.utility_set.filter(util_type="Mutual")
@@ -62,28 +159,195 @@ def SettingsPage(request):
     # retrieve queryset for individual utilities & power supplies
     power_supplies = current_building.utility_set.filter(util_type='Individual')
 
+    # both tables are loaded concurrently, unless they are served from the cache
+    if not tables_are_cached:
+        mutual_utils, power_supplies = await gather_queries(partial(list, mutual_utils), partial(list, power_supplies))
+
     context = {
+        "building": current_building,
         "mutual_utils": mutual_utils,
         "power_supplies": power_supplies,
+        **tables_context,
     }
 
-    return render(request, 'building/menu/admin_settings.html', context)
+    return await sync_to_async(render)(request, 'building/menu/admin_settings.html', context)
 
 
-def ApartmentsPage(request):
+@conditional_page
+async def ApartmentsPage(request):
     """
     Defined view that renders all apartments and allows handling of tenant assignment through the template.
     """
 
-    _, current_building = get_logged_user(request)
-    context = {"building": current_building}
+    _, current_building = await sync_to_async(get_logged_user)(request)
+    tables_context, tables_are_cached = await sync_to_async(tables_cache_state)('apartments_tables', current_building)
+    apartments_table = ApartmentTable(current_building)
+
+    # the table columns and rows are loaded concurrently, unless they are served from the cache
+    if not tables_are_cached:
+        await gather_queries(lambda: apartments_table.utilities, lambda: apartments_table.apartments)
 
-    return render(request, 'building/menu/admin_apartments.html', context)
+    context = {
+        "building": current_building,
+        "apartments_table": apartments_table,
+        **tables_context,
+    }
 
+    return await sync_to_async(render)(request, 'building/menu/admin_apartments.html', context)
+
+
+@login_required(login_url='building:login')
+def PortfolioPage(request):
+    """
+    Defined view that renders the occupancy, debt and unpaid apartments of every building
+    administrated by the logged user, together with the totals of the portfolio.
+    """
+
+    buildings = get_admin_buildings(request.user)
+    if not buildings:
+        return redirect('building:create-residential')
+
+    rows, total = portfolio_summary(buildings)
+    context = {
+        'building': get_current_building(request),
+        'rows': rows,
+        'total': total,
+    }
 
+    return render(request, 'building/menu/admin_portfolio.html', context)
+
+
+@login_required(login_url='building:login')
+@require_POST
+def SwitchBuilding(request):
+    """
+    Defined view that selects the building every admin page is scoped to, then goes back to the
+    page the switcher was used from.
+    """
+
+    buildings = {building.id: building for building in get_admin_buildings(request.user)}
+    try:
+        building = buildings[int(request.POST.get('building', ''))]
+    except (KeyError, ValueError):
+        raise Http404('No such building under administration.')
+    select_building(request, building)
+
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+        next_url = 'building:admin_dashboard'
+    return redirect(next_url)
+
+
+# apartments listed per page of the payments page
+PAYMENTS_PAGE_SIZE = 50
+
+# apartments shown by the payments page for each value of ?status=
+PAYMENT_FILTERS = {
+    'unpaid': Q(balance__gt=0),
+    'paid': Q(balance__lte=0),
+    'all': Q(),
+}
+
+PAYMENT_STATUS_CHOICES = (('unpaid', 'Unpaid'), ('paid', 'Paid'), ('all', 'All'))
+
+
+@login_required(login_url='building:login')
 def PaymentsPage(request):
-    return render(request, 'building/menu/admin_payments.html')
+    """
+    Defined view that lists the apartments of the building by balance, largest debt first (only the
+    unpaid ones unless `?status=` asks for the paid or all of them), and records the payments
+    collected with its form.
+    """
+
+    _, current_building = get_logged_user(request)
+    status = request.GET.get('status') if request.GET.get('status') in PAYMENT_FILTERS else 'unpaid'
+
+    form = RecordPaymentForm(current_building)
+    if request.method == 'POST':
+        form = RecordPaymentForm(current_building, request.POST)
+        if form.is_valid():
+            record_payment(
+                form.cleaned_data['apartment'], form.cleaned_data['amount'], request.user, form.cleaned_data['note'],
+            )
+            return redirect(f"{reverse('building:admin_payments')}?status={status}")
+
+    # keyset pagination over the (building, balance, id) index: ?after= holds the balance and id of
+    # the last apartment of the previous page
+    apartments = current_building.apartment_set.filter(PAYMENT_FILTERS[status]).select_related('tenant')
+    try:
+        balance, apartment_id = decode_cursor(request.GET['after'], 2) if request.GET.get('after') else (None, None)
+        if balance is not None:
+            apartments = apartments.filter(Q(balance__lt=balance) | Q(balance=balance, id__gt=apartment_id))
+    except (ApiError, ValidationError, ValueError, TypeError):
+        # a malformed cursor shows the first page
+        pass
+    apartments = list(apartments.order_by('-balance', 'id')[:PAYMENTS_PAGE_SIZE + 1])
+
+    next_after = None
+    if len(apartments) > PAYMENTS_PAGE_SIZE:
+        apartments = apartments[:PAYMENTS_PAGE_SIZE]
+        next_after = encode_cursor([str(apartments[-1].balance), apartments[-1].id])
+
+    stats, _ = load_dashboard_stats(current_building)
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    charged = Q(kind=LedgerEntry.CHARGE, period=current_building.billed_period)
+    collected = Q(kind=LedgerEntry.PAYMENT, created_at__gte=month_start)
+    ledger = LedgerEntry.objects.filter(charged | collected, apartment__building=current_building).aggregate(
+        charged=Sum('amount', filter=charged), collected=Sum('amount', filter=collected),
+    )
+
+    context = {
+        'building': current_building,
+        'form': form,
+        'status': status,
+        'status_choices': PAYMENT_STATUS_CHOICES,
+        'apartments': apartments,
+        'next_after': next_after,
+        'stats': stats,
+        'apartments_count': stats.occupied_apts + stats.available_apts,
+        'paid_apts': stats.occupied_apts + stats.available_apts - stats.unpaid_apts,
+        'charged': ledger['charged'] or 0,
+        'collected': -(ledger['collected'] or 0),
+    }
+
+    return render(request, 'building/menu/admin_payments.html', context)
+
 
+# documents listed per page of the documents page
+DOCUMENTS_PAGE_SIZE = 50
 
+
+@login_required(login_url='building:login')
 def DocumentsPage(request):
-    return render(request, 'building/menu/admin_documents.html')
\ No newline at end of file
+    """
+    Defined view that lists the documents of the building, newest first, and stores the documents
+    uploaded with its form (large files go through the resumable uploads API instead).
+    """
+
+    _, current_building = get_logged_user(request)
+
+    form = UploadDocumentForm(current_building)
+    if request.method == 'POST':
+        form = UploadDocumentForm(current_building, request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            create_document(
+                current_building, store_upload(upload), upload.name, form.cleaned_data['kind'],
+                form.cleaned_data['apartment'], user=request.user,
+            )
+            return redirect('building:admin_documents')
+
+    # keyset pagination on the id: ?before= holds the last id of the previous page
+    documents = current_building.document_set.select_related('apartment', 'file').order_by('-id')
+    if request.GET.get('before', '').isdigit():
+        documents = documents.filter(id__lt=request.GET['before'])
+    documents = list(documents[:DOCUMENTS_PAGE_SIZE + 1])
+
+    context = {
+        'building': current_building,
+        'form': form,
+        'documents': documents[:DOCUMENTS_PAGE_SIZE],
+        'next_before': documents[DOCUMENTS_PAGE_SIZE - 1].id if len(documents) > DOCUMENTS_PAGE_SIZE else None,
+    }
+
+    return render(request, 'building/menu/admin_documents.html', context)
\ No newline at end of file
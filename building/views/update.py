@@ -1,15 +1,27 @@
-from django.shortcuts import render, redirect
-from django.forms import inlineformset_factory
-from building.views.menu import get_logged_user
-from building.models import Utility, MainUtil
-from building.forms import UpdateMainUtil
-from apartment.models import Apartment, PowerSupply
+from django.http import Http404
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.db.models import OuterRef, Subquery
+from building.views.menu import get_logged_user, ApartmentTable
+from building.billing import billing_period
+from building.models import Utility, MainUtil, MainMeterReading, Job
+from building.forms import UpdateMainUtil, ImportReadingsForm
+from building.imports import ImportReport, guess_format, import_storage
+from building.jobs import enqueue
+from building.statuses import submitted_statuses, changed_supplies, save_statuses
 
 
 def UpdateMainCounters(request, pk):
     _, current_building = get_logged_user(request)
-    utility = MainUtil.objects.get(util__building=current_building, id=pk)
-    counters = MainUtil.objects.filter(util__building=current_building)
+    utility = MainUtil.objects.select_related('util').get(util__building=current_building, id=pk)
+
+    # index of each counter at the end of the previous month, from the readings history
+    last_index = MainMeterReading.objects.filter(
+        counter=OuterRef('id'), period__lt=billing_period()
+    ).order_by('-period', '-created_at').values('index_counter')[:1]
+    counters = MainUtil.objects.filter(util__building=current_building).select_related('util').annotate(
+        last_index=Subquery(last_index)
+    )
 
     form = UpdateMainUtil(instance=utility)
     if request.method == 'POST':
@@ -30,36 +42,85 @@ def UpdateMainCounters(request, pk):
 def UpdateUtilityStatus(request, pk):
     """
     Defined view that handles the update of selected apartment's utility status
-    through a formset.
+    through the status grid, restricted to the apartment.
     """
 
     # retrieve currently logged user and the building he's managing
     _, current_building = get_logged_user(request)
 
-    # defined the formset that takes the apartment model as the parent argument
-    # and the individual utility model as the child argument
-    UtilStatusFormset = inlineformset_factory(
-        parent_model=Apartment, model=PowerSupply, fields=('status', ), extra=0
-    )
+    # the grid columns are the building's individual utilities, its single row the selected apartment
+    apartments_table = ApartmentTable(current_building, apartment_id=pk)
+    if not apartments_table.rows:
+        raise Http404("No apartment matches the given query.")
+
+    # only the changed statuses are written, with one query
+    if request.method == 'POST':
+        save_statuses(current_building.id, changed_supplies(apartments_table.supplies, submitted_statuses(request.POST)))
+        return redirect('building:admin_settings')
+
+    context = {
+        'apartment': apartments_table.rows[0].apartment,
+        'apartments_table': apartments_table,
+    }
 
-    # select apartment by accessing its primary key
-    apartment = current_building.apartment_set.get(id=pk)
+    return render(request, 'building/forms/update_supply_status.html', context)
+
+
+def UpdateSupplyStatuses(request):
+    """
+    Defined view that handles the update of every apartment's utility status on a single grid
+    (apartments x individual utilities). Only the changed statuses are written, with one query.
+    """
+
+    _, current_building = get_logged_user(request)
+    apartments_table = ApartmentTable(current_building)
 
-    # define formset by passing the queried apartment object
-    formset = UtilStatusFormset(instance=apartment)
     if request.method == 'POST':
-        formset = UtilStatusFormset(request.POST, instance=apartment)
-        if formset.is_valid():
-            formset.save()
-            return redirect('building:admin_settings')
+        save_statuses(current_building.id, changed_supplies(apartments_table.supplies, submitted_statuses(request.POST)))
+        return redirect('building:admin_apartments')
 
-    # define context data to render into the template
-    supply_name = ['Cold Water', 'Hot Water', 'Gas Power', 'Heating Power']
-    form_data = zip(supply_name, formset)
     context = {
-        'apartment': apartment,
-        'form_data': form_data,
-        'formset': formset
+        'apartment': None,
+        'apartments_table': apartments_table,
     }
 
     return render(request, 'building/forms/update_supply_status.html', context)
+
+
+def ImportReadings(request):
+    """
+    Defined view that handles the upload of a CSV/JSON Lines file with the readings of the
+    apartments' counters. The file is stored and imported by a background job; the page polls
+    the job and renders the import report once it finished.
+    """
+
+    _, current_building = get_logged_user(request)
+
+    form = ImportReadingsForm()
+    if request.method == 'POST':
+        form = ImportReadingsForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            period = form.cleaned_data['period']
+            path = import_storage().save(f'{current_building.id}/{upload.name}', upload)
+            job = enqueue(
+                'import_readings', building=current_building, path=path,
+                file_format=form.cleaned_data['file_format'] or guess_format(upload.name),
+                period=period.isoformat() if period else None,
+            )
+            return redirect(f"{reverse('building:import_readings')}?job={job.id}")
+
+    # import job started by a previous upload
+    job, report = None, None
+    if request.GET.get('job', '').isdigit():
+        job = get_object_or_404(Job, id=request.GET['job'], building=current_building, kind='import_readings')
+        if job.status == Job.DONE:
+            report = ImportReport.from_dict(job.result)
+
+    context = {
+        'form': form,
+        'job': job,
+        'report': report,
+    }
+
+    return render(request, 'building/forms/import_readings.html', context)
@@ -3,6 +3,16 @@ ASGI config for residential_cms project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The dashboard, settings, apartments and tenant dashboard pages are async views. Served through
+this module they run natively on the event loop of an ASGI server, e.g. with uvicorn:
+
+    pip install uvicorn
+    uvicorn residential_cms.asgi:application --host 0.0.0.0 --port 8000 --workers 4
+
+Static files are not served by the ASGI handler, collect them and serve them from the proxy.
+The WSGI mode (residential_cms/wsgi.py, runserver) keeps working: every async view is then run
+in an event loop of its own, per request. `manage.py benchmark_asgi` compares both modes.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
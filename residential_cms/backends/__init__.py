@@ -0,0 +1,31 @@
+"""
+Database backends selected by `residential_cms.database`: the stock Django backends plus
+connection health checks (Postgres), an in-process connection pool (Postgres) and pragmas
+for single-node SQLite installs.
+"""
+
+
+class HealthCheckMixin:
+    """
+    Checks a persistent connection the first time a request uses it, when the database settings
+    enable `CONN_HEALTH_CHECKS`. A connection that does not answer is replaced by a new one.
+    """
+
+    health_check_done = False
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        if (self.connection is not None and self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.health_check_done and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # called when a request starts and ends, the next request checks the connection again
+        self.health_check_done = False
@@ -0,0 +1,8 @@
+from django.db.backends.postgresql import base
+from residential_cms.backends import HealthCheckMixin
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    """
+    Postgres backend with connection health checks.
+    """
@@ -0,0 +1,90 @@
+import threading
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2.pool import ThreadedConnectionPool
+from residential_cms.backends import HealthCheckMixin
+
+
+# one pool per database (alias and connection parameters), shared by the threads of the process
+pools = {}
+pools_lock = threading.Lock()
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    Thread-safe pool whose `getconn` waits up to `timeout` seconds for a connection handed back by
+    another thread when all `maxconn` connections are in use, instead of failing right away with a
+    `PoolError`. A wait that times out raises an `OperationalError`, which Django turns into its own
+    `OperationalError` (a `DatabaseError`) like any other failed connection attempt.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                f"No database connection was handed back within {self.timeout}s, all {self.maxconn} connections "
+                f"of the pool are in use (see pool_max / pool_timeout in residential_cms.database)."
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        # the slot is freed even when the pool refuses the connection (e.g. closed meanwhile),
+        # otherwise it would be lost for good
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    """
+    Postgres backend taking its connections from an in-process pool (`POOL_MIN` to `POOL_MAX`
+    connections per process, a thread waits up to `POOL_TIMEOUT` seconds when all of them are in use).
+    Closing a connection, e.g. at the end of a request with CONN_MAX_AGE = 0, hands it back to the pool,
+    which rolls back an unfinished transaction.
+    """
+
+    pool = None
+
+    def get_pool(self, conn_params):
+        # the parameters are part of the key, so the test database does not reuse the pool of the main one
+        key = (self.alias, tuple(sorted(conn_params.items())))
+        with pools_lock:
+            if key not in pools:
+                pools[key] = BlockingConnectionPool(
+                    self.settings_dict['POOL_MIN'], self.settings_dict['POOL_MAX'], self.settings_dict['POOL_TIMEOUT'],
+                    **conn_params
+                )
+            return pools[key]
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+
+        # same session setup as the stock backend, which cannot be given a pooled connection
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection, close=bool(self.connection.closed))
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 
 from pathlib import Path
 import os
+from residential_cms.database import database_settings
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,11 +45,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'building.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'building.middleware.CurrentBuildingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +69,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'building.context_processors.buildings',
             ],
         },
     },
@@ -76,15 +80,44 @@ WSGI_APPLICATION = 'residential_cms.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
+# Read from the DATABASE_URL, DB_CONN_MAX_AGE and DB_HEALTH_CHECKS environment variables,
+# see residential_cms/database.py. Defaults to SQLite in the project directory.
 
-DATABASES = {
+DATABASES = database_settings(os.environ, BASE_DIR)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Shared by the web processes and the run_jobs workers, which invalidate the cached tables of the
+# buildings their jobs change, so it cannot be a per-process backend (LocMemCache, refused by run_jobs).
+# The file cache is shared by the processes of one host; set the CACHE_BACKEND and CACHE_LOCATION
+# environment variables to use memcached when running on several hosts.
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        # the file cache culls its entries past 300 by default, too few for a table per building
+        'OPTIONS': {'MAX_ENTRIES': 10000} if CACHE_BACKEND.endswith('FileBasedCache') else {},
     }
 }
 
 
+# Profiling
+# Per request timings (Server-Timing header and a rotating JSON Lines log, summarized by the
+# profile_report command). Opt-in: set the PROFILING environment variable to 1 to enable it.
+
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING') == '1',
+    'SAMPLE_RATE': 1.0,
+    'LOG_FILE': os.path.join(BASE_DIR, 'logs', 'profile.jsonl'),
+    'SLOW_QUERY_MS': 100,
+    'DUPLICATE_QUERIES': 3,
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -129,4 +162,8 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# uploaded documents, kept apart from MEDIA_ROOT (which lies within the static files) so they are
+# only served by the download view, after its permission check
+DOCUMENTS_ROOT = os.environ.get('DOCUMENTS_ROOT', os.path.join(BASE_DIR, 'documents'))
+
 AUTH_USER_MODEL = 'building.CustomUser'
\ No newline at end of file
@@ -27,4 +27,21 @@ function setActive() {
     }
 }
 
-linkColor.forEach(l => l.addEventListener('click', setActive))
\ No newline at end of file
+linkColor.forEach(l => l.addEventListener('click', setActive))
+// BACKGROUND JOBS: reload the page once the job of a [data-job-url] element finished
+const jobElements = document.querySelectorAll('[data-job-url]')
+
+jobElements.forEach(el => {
+    const poll = () => {
+        fetch(el.dataset.jobUrl, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'done' || job.status === 'failed') {
+                    window.location.reload()
+                } else {
+                    setTimeout(poll, 2000)
+                }
+            })
+    }
+    setTimeout(poll, 2000)
+})